@@ -1,6 +1,7 @@
-from flask import Flask, send_from_directory, request, abort
+from flask import Flask, send_file, request, abort
 from flask_cors import CORS
 import os
+import threading
 from pathlib import Path
 
 # --- Import all the route Blueprints ---
@@ -12,48 +13,79 @@ from routes.admin import admin_bp
 from routes.submissions import submissions_bp
 from routes.courses import courses_bp
 from routes.image_processing_evaluation import image_processing_bp # Make sure this is imported
+from routes.uploads import uploads_bp
+from utils.kernels import prewarm
+from utils.workspace import start_periodic_gc
+from utils.lazy import preload
+from utils import metrics, media, compression
+from utils import question_counts  # noqa: F401 - registers the questions.json write hook
 
 # --- Initialize Flask App ---
 app = Flask(__name__, static_folder="../frontend/dist", static_url_path="")
 app.config['JSON_SORT_KEYS'] = False
 app.config['JSON_AS_ASCII'] = False
 CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}})
+metrics.init_app(app)  # per-route request timings for /api/admin/metrics
+compression.init_app(app)  # gzip/brotli for large JSON responses
 PORT = 3007
 
 
 # <<< START: NEW CODE FOR SERVING IMAGES >>>
 
-# IMPORTANT SECURITY: Define the single, safe directory where all your datasets are stored.
-# This prevents users from requesting files from anywhere else on your server.
-# The path should be the absolute path to the 'datasets' folder on your server.
+# IMPORTANT SECURITY: utils/media.py only serves files inside data/datasets
+# (SAFE_MEDIA_DIRECTORY). This prevents users from requesting files from anywhere else on your server.
 BASE_DIR = Path(__file__).parent
-SAFE_MEDIA_DIRECTORY = (BASE_DIR / "data" / "datasets").resolve()
+# Dataset files only change when an admin re-uploads them, so browsers may reuse them for a day
+# without asking; after that a conditional GET with the ETag usually gets a 304.
+MEDIA_MAX_AGE_SECONDS = int(os.environ.get("MEDIA_MAX_AGE_SECONDS", "86400"))
+# A URL carrying the file's ETag as ?v= names one exact version and never changes.
+MEDIA_IMMUTABLE_MAX_AGE_SECONDS = 365 * 24 * 3600
 
 @app.route("/api/media")
 def serve_media():
-    """Securely serves a file from the SAFE_MEDIA_DIRECTORY."""
+    """
+    Securely serves a file from the datasets directory, with a strong ETag (sha256 of the
+    content), Cache-Control, If-None-Match / If-Modified-Since (304) and Range requests
+    (206, for seeking in wav files). Images can be requested as thumbnails with ?w=.
+    """
     # Get the requested file path from the query parameter
     requested_path_str = request.args.get('path')
     if not requested_path_str:
         abort(400, "Missing 'path' parameter.")
 
-    # Create a Path object from the user's request
-    requested_path = Path(requested_path_str).resolve()
-
-    # --- SECURITY CHECK ---
-    # Check if the resolved requested path is a sub-path of our safe directory.
-    # This is the most important step to prevent Path Traversal attacks.
-    if SAFE_MEDIA_DIRECTORY not in requested_path.parents:
-        abort(403, "Forbidden: Access to this path is not allowed.")
-
     try:
-        # send_from_directory needs the directory and the filename separately
-        directory = requested_path.parent
-        filename = requested_path.name
-        return send_from_directory(directory, filename)
+        media_file = media.lookup(requested_path_str)
+    except PermissionError:
+        abort(403, "Forbidden: Access to this path is not allowed.")
     except FileNotFoundError:
         abort(404, "File not found.")
 
+    # ?w=<pixels> asks for a preview: a WebP (or JPEG, for browsers that don't accept WebP) thumbnail
+    thumbnail = None
+    width = request.args.get('w', type=int)
+    if width and width > 0:
+        fmt = request.args.get('format') or ("webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg")
+        try:
+            thumbnail = media.thumbnail(media_file, width, fmt)
+        except Exception as e:
+            print(f"Warning: Could not create a thumbnail of {media_file['path']}: {e}")
+
+    served = thumbnail or media_file
+    immutable = request.args.get('v') == media_file["etag"]
+    response = send_file(
+        served["path"],
+        mimetype=served.get("mimetype"),
+        conditional=True,
+        etag=served["etag"],
+        last_modified=served["mtime"],
+        max_age=MEDIA_IMMUTABLE_MAX_AGE_SECONDS if immutable else MEDIA_MAX_AGE_SECONDS,
+    )
+    if immutable:
+        response.cache_control.immutable = True
+    if width and not request.args.get('format'):
+        response.vary.add("Accept")
+    return response
+
 # <<< END: NEW CODE FOR SERVING IMAGES >>>
 
 
@@ -63,6 +95,7 @@ app.register_blueprint(questions_bp, url_prefix="/api/questions")
 app.register_blueprint(evaluation_bp, url_prefix='/api/evaluate')
 app.register_blueprint(users_bp, url_prefix="/api/users")
 app.register_blueprint(admin_bp, url_prefix="/api/admin")
+app.register_blueprint(uploads_bp, url_prefix="/api/admin/uploads")
 app.register_blueprint(submissions_bp, url_prefix="/api/submissions")
 app.register_blueprint(courses_bp, url_prefix="/api/courses")
 app.register_blueprint(image_processing_bp, url_prefix="/api/evaluate/image-processing")
@@ -71,4 +104,8 @@ app.register_blueprint(image_processing_bp, url_prefix="/api/evaluate/image-proc
 # ... (rest of your app.py file)
 if __name__ == "__main__":
     print(f"✅ Backend server running on http://localhost:{PORT}")
+    prewarm()  # boot the warm kernel pool so the first exam sessions start instantly
+    start_periodic_gc()  # clean up old files in data/user_generated
+    # pandas, cv2, ... are imported lazily; load them off the startup path so the first grading request doesn't wait
+    threading.Thread(target=preload, name="lazy-preload", daemon=True).start()
     app.run(host="0.0.0.0", port=PORT, debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,267 @@
+# backend/benchmarks/grading.py
+"""
+Micro-benchmarks for the grading primitives, with stored baselines.
+
+    cd backend
+    python benchmarks/grading.py                    # run everything, print a table
+    python benchmarks/grading.py --check            # fail (exit 1) on a regression
+    python benchmarks/grading.py --save             # record the current numbers as baseline
+    python benchmarks/grading.py --only ssim --only parse_ml
+
+Cases: compare_csvs on the real MFCC and ML solution files (against a copy with every
+number scaled by 1%, so each cell goes through the numeric comparison),
+compare_images_ssim and the SSIM matrix + Hungarian pairing on the imageprocessing
+datasets, _handle_text_similarity and _handle_numerical_evaluation on long outputs,
+_simplify_python_error on a deep traceback, and the question-bank parsers on generated
+sheets. The parsers get an already-loaded DataFrame (read_sheet() accepts one): reading
+the .xlsx is openpyxl's time, and its noise would hide changes in the parsing itself.
+
+Each case runs until one repeat takes at least MIN_REPEAT_SECONDS, --repeat times; the
+median time per call is compared with benchmarks/baselines/grading.json. A case regresses
+when it is slower than baseline * (1 + threshold); the threshold is per case in the
+baseline file (default --threshold; the parser cases allow 100%, since pandas'
+allocation-heavy work swings by more than half between runs on a shared machine).
+Baselines are machine-specific: re-record them with --save on the exam server.
+"""
+import argparse
+import datetime
+import gc
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import cv2  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from routes.evaluate import (  # noqa: E402
+    compare_csvs, _handle_text_similarity, _handle_numerical_evaluation, _simplify_python_error,
+)
+from routes.image_processing_evaluation import compare_images_ssim, pair_images  # noqa: E402
+from utils.question_parser import (  # noqa: E402
+    parse_ml_questions, parse_nlp_questions, parse_ds_questions, parse_speech_recognition_questions,
+)
+
+DATASETS_PATH = BACKEND_DIR / "data" / "datasets"
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "grading.json"
+DEFAULT_THRESHOLD = 0.35
+MIN_REPEAT_SECONDS = 0.2
+
+CSV_SOLUTIONS = {
+    "mfcc_output": DATASETS_PATH / "Speech-Recognition" / "solution" / "mfcc_output.csv",
+    "mfcc_contrast": DATASETS_PATH / "Speech-Recognition" / "solution" / "mfcc_contrast_output.csv",
+    "mel_spectrogram": DATASETS_PATH / "Speech-Recognition" / "solution" / "mel_spectrogram_output.csv",
+    "ml_M_001": DATASETS_PATH / "ml" / "level_1" / "M_001" / "solution.csv",
+    "ml_M_002": DATASETS_PATH / "ml" / "level_1" / "M_002" / "solution.csv",
+}
+IMAGE_QUESTIONS = ["I_002", "I_007", "I_020"]
+SHEET_QUESTIONS = 200
+
+
+# --- Cases (each returns a zero-argument function to time) ---
+
+def _csv_cases(tmp):
+    for label, solution in CSV_SOLUTIONS.items():
+        df = pd.read_csv(solution)
+        numeric = df.select_dtypes("number").columns
+        df[numeric] = df[numeric] * 1.01
+        student = tmp / f"{label}.csv"
+        df.to_csv(student, index=False)
+        yield f"compare_csvs[{label}]", lambda student=student, solution=solution: compare_csvs(student, solution)
+
+
+def _image_cases():
+    for qid in IMAGE_QUESTIONS:
+        folder = DATASETS_PATH / "imageprocessing" / "level_1" / qid
+        solutions = [str(p) for p in sorted(folder.glob("output*"))]
+        # Student images in reverse order, as if produced in a different sequence.
+        students = [cv2.imread(p) for p in reversed(solutions)]
+        yield f"compare_images_ssim[{qid}]", lambda s=students[-1], p=solutions[0]: compare_images_ssim(s, p)
+        yield f"pair_images[{qid}x{len(solutions)}]", lambda s=students, p=solutions: pair_images(s, p, 0.9)
+
+
+def _output_cases():
+    words = [f"keyword{i}" for i in range(40)]
+    log = "\n".join(f"Epoch {i}: loss=0.{i:04d} val_loss=0.{i + 7:04d} " + " ".join(words[i % 40:i % 40 + 3])
+                    for i in range(2000))
+    text_part = {"expected_text": " ".join(words), "similarity_threshold": 0.8}
+    numeric_part = {"evaluation_label": "Accuracy:", "expected_value": 0.9123, "tolerance": 0.01}
+    numeric_output = log + "\nAccuracy: 0.9125\n"
+    frames = "".join(f'  File "/home/student/work/module_{i}.py", line {i}, in step_{i}\n'
+                     f"    \x1b[0;31mresult = step_{i + 1}(data)\x1b[0m\n" for i in range(2000))
+    traceback = "Traceback (most recent call last):\n" + frames + "RecursionError: maximum recursion depth exceeded\n"
+    yield "_handle_text_similarity[2000 lines]", lambda: _handle_text_similarity(text_part, log)
+    yield "_handle_numerical_evaluation[2000 lines]", lambda: _handle_numerical_evaluation(numeric_part, numeric_output)
+    yield "_simplify_python_error[2000 frames]", lambda: _simplify_python_error(traceback)
+
+
+def _parser_cases():
+    n = SHEET_QUESTIONS
+    ml = pd.DataFrame([{
+        "id": f"M_{q:03d}", "title": f"Question {q}", "description": "Train and evaluate a model.",
+        "train_dataset": f"/data/ml/M_{q:03d}/train.csv", "test_dataset": f"/data/ml/M_{q:03d}/test.csv",
+        "part_id": f"M_{q:03d}_{p}", "type": ["csv_similarity", "text_similarity", "numerical_evaluation"][p],
+        "part_description": f"Part {p}", "expected_text": "accuracy precision" if p == 1 else None,
+        "evaluation_label": "Accuracy:" if p == 2 else None, "expected_value": 0.9 if p == 2 else None,
+        "tolerance": 0.01 if p == 2 else None, "similarity_threshold": 0.8,
+        "solution_file": f"/data/ml/M_{q:03d}/solution.csv" if p == 0 else None,
+    } for q in range(n) for p in range(3)])
+    nlp = pd.DataFrame([dict({"id": f"N_{q:03d}", "title": f"Question {q}", "description": "Tokenize the text."},
+                             **{f"t{t}_{k}": f"case {t} {k} of {q}" for t in range(1, 6) for k in ("input", "output")})
+                        for q in range(n)])
+    ds = pd.DataFrame([{"id": f"D_{q:03d}", "title": f"Question {q}", "description": "Compute the mean.",
+                        "input": f"{q} {t}", "output": str(q + t)} for q in range(n) for t in range(5)])
+    speech = pd.DataFrame([{"S.No": q, "Scenario": f"Scenario {q}", "Task": "Extract MFCC features.",
+                            "Input File": "audio.wav", "Output File": "mfcc_output.csv, mfcc_raw.csv"}
+                           for q in range(n)])
+    parsers = [
+        ("parse_ml_questions", ml, parse_ml_questions),
+        ("parse_nlp_questions", nlp, parse_nlp_questions),
+        ("parse_ds_questions", ds, parse_ds_questions),
+        ("parse_speech_recognition_questions", speech, lambda df: parse_speech_recognition_questions(df, DATASETS_PATH)),
+    ]
+    for name, df, parser in parsers:
+        yield f"{name}[{len(df)} rows]", lambda parser=parser, df=df: parser(df)
+
+
+def all_cases(tmp):
+    yield from _csv_cases(tmp)
+    yield from _image_cases()
+    yield from _output_cases()
+    yield from _parser_cases()
+
+
+# --- Timing ---
+
+def measure(fn, repeat):
+    """
+    Median and min seconds per call over `repeat` repeats of at least MIN_REPEAT_SECONDS.
+    The garbage collector is off while timing (as in timeit): the parsers allocate
+    enough objects that when a collection happens to run would dominate their numbers.
+    """
+    fn()  # warm-up: imports, file cache
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        return _measure(fn, repeat)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _measure(fn, repeat):
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_REPEAT_SECONDS:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(MIN_REPEAT_SECONDS / elapsed) + 1))
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - started) / number)
+    return {"median_ms": round(statistics.median(timings) * 1000, 4), "min_ms": round(min(timings) * 1000, 4),
+            "calls_per_repeat": number}
+
+
+# --- Baselines ---
+
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"cases": {}}
+
+
+def save_baseline(path, results, previous, threshold):
+    cases = {}
+    for name, stats in results.items():
+        kept = previous.get("cases", {}).get(name, {}).get("threshold", threshold)
+        cases[name] = {"median_ms": stats["median_ms"], "threshold": kept}
+    baseline = {
+        "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "cases": dict(previous.get("cases", {}), **cases),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold):
+    """Adds baseline, change and status to each result; returns the names that regressed."""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            stats["status"] = "new"
+            continue
+        limit = base.get("threshold", threshold)
+        stats["baseline_ms"] = base["median_ms"]
+        stats["change"] = round(stats["median_ms"] / base["median_ms"] - 1, 3) if base["median_ms"] else 0.0
+        stats["status"] = "REGRESSED" if stats["change"] > limit else "ok"
+        if stats["status"] == "REGRESSED":
+            regressions.append(name)
+    return regressions
+
+
+# --- Main ---
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", action="append", default=[], help="run cases whose name contains this (repeatable)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown for cases without their own threshold (0.35 = 35%%)")
+    parser.add_argument("--save", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if a case regressed")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="grading-bench-") as tmp:
+        for name, fn in all_cases(Path(tmp)):
+            if args.only and not any(part in name for part in args.only):
+                continue
+            results[name] = measure(fn, args.repeat)
+            if not args.json:
+                print(f"  {name:<45} {results[name]['median_ms']:>12.3f} ms", flush=True)
+
+    baseline = load_baseline(args.baseline)
+    regressions = compare(results, baseline, args.threshold)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"\n{'case':<45}{'median ms':>12}{'baseline':>12}{'change':>9}  status")
+        for name, stats in results.items():
+            base = f"{stats['baseline_ms']:.3f}" if "baseline_ms" in stats else "-"
+            change = f"{stats['change']:+.0%}" if "change" in stats else "-"
+            print(f"{name:<45}{stats['median_ms']:>12.3f}{base:>12}{change:>9}  {stats['status']}")
+    if args.save:
+        save_baseline(args.baseline, results, baseline, args.threshold)
+        print(f"\nBaseline written to {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than their baseline allows: {', '.join(regressions)}",
+              file=sys.stderr if args.json else sys.stdout)
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+# backend/benchmarks/loadgen.py
+"""
+Exam-cohort load generator. Replays the traffic of a class sitting an exam against a
+running backend on this machine and reports how the server held up.
+
+    cd backend
+    python serve.py &                       # or python app.py
+    python benchmarks/loadgen.py --students 30 --create-users --cleanup
+    python benchmarks/loadgen.py --students 100 --iterations 5 --output results.json
+
+Every simulated student:
+  1. logs in (all students at the same moment: the login storm),
+  2. starts a kernel session,
+  3. --iterations times: /run and /validate a question that has a reference solution
+     (data/datasets/**/<question id>/solution.py), one part at a time,
+  4. starts an image-processing session and validates an image question (skip with
+     --no-image),
+  5. submits when the exam timer runs out (again all at once) and polls the submission
+     until its background phase has finished.
+
+Reported per endpoint: requests, errors, throughput and p50/p95/p99/max latency, plus
+the resident (RSS) and proportional (PSS) memory of the kernel processes on this
+machine, sampled during the run. Student accounts must exist (see --create-users);
+they all use --password.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.storage import read_json  # noqa: E402
+from utils.dataset_cache import localize_data_paths, resolve_data_path  # noqa: E402
+
+DATA_PATH = BACKEND_DIR / "data"
+QUESTIONS_PATH = DATA_PATH / "questions"
+DATASETS_PATH = DATA_PATH / "datasets"
+IMAGE_SUBJECT = "ImageProcessing"
+SUBMISSION_POLL_SECONDS = 0.5
+SUBMISSION_TIMEOUT_SECONDS = 300
+MEMORY_SAMPLE_SECONDS = 0.5
+# Processes counted as kernels: plain ipykernel launches and fork-server kernels.
+KERNEL_CMDLINE_MARKERS = ("ipykernel", "fork_kernel_server")
+
+
+# --- Exam content ---
+
+def _question_banks():
+    for questions_file in sorted(QUESTIONS_PATH.glob("*/level*/questions.json")):
+        try:
+            questions = read_json(questions_file, default=[])
+        except json.JSONDecodeError:
+            continue
+        subject, level = questions_file.parent.parent.name, questions_file.parent.name[len("level"):]
+        for question in questions if isinstance(questions, list) else []:
+            yield subject, level, question
+
+
+def reference_questions():
+    """[(subject, level, question, solution code)] for every question with a solution.py."""
+    solutions = {path.parent.name: path for path in DATASETS_PATH.glob("**/solution.py")}
+    found = []
+    for subject, level, question in _question_banks():
+        path = solutions.get(str(question.get("id")))
+        if path and subject != IMAGE_SUBJECT:
+            found.append((subject, level, question, localize_data_paths(path.read_text(encoding="utf-8"))))
+    return found
+
+
+def image_question():
+    """(level, question, code) for an image question whose expected outputs exist, or None."""
+    for subject, level, question in _question_banks():
+        if subject != IMAGE_SUBJECT:
+            continue
+        try:
+            outputs = [resolve_data_path(question[f"output_{i}"]) for i in range(1, int(question["No_of_outputs"]) + 1)]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if outputs and all(p.is_file() for p in outputs):
+            # Showing the expected images themselves passes validation by construction.
+            code = "from PIL import Image\n" + "\n".join(f"Image.open({str(p)!r}).show()" for p in outputs)
+            return level, question, code
+    return None
+
+
+# --- HTTP ---
+
+class Client:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        """Returns (status, parsed JSON or None). Connection errors raise."""
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                status, raw = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        try:
+            return status, json.loads(raw or b"null")
+        except ValueError:
+            return status, None
+
+
+class Recorder:
+    """Latency samples per endpoint, shared by all student threads."""
+
+    def __init__(self):
+        self._samples = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def call(self, endpoint, fn, ok=lambda status, body: 200 <= status < 300):
+        started = time.perf_counter()
+        try:
+            status, body = fn()
+            success = ok(status, body)
+        except Exception as e:
+            status, body, success = None, {"error": str(e)}, False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._samples.setdefault(endpoint, []).append(elapsed)
+            if not success:
+                self._errors.setdefault(endpoint, []).append(status)
+        return status, body, success
+
+    def add(self, endpoint, seconds, success=True):
+        with self._lock:
+            self._samples.setdefault(endpoint, []).append(seconds)
+            if not success:
+                self._errors.setdefault(endpoint, []).append(None)
+
+    def summary(self, duration):
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self._samples.items()}
+            errors = {k: list(v) for k, v in self._errors.items()}
+        report = {}
+        for endpoint, values in samples.items():
+            report[endpoint] = {
+                "requests": len(values),
+                "errors": len(errors.get(endpoint, [])),
+                "error_statuses": sorted({str(s) for s in errors.get(endpoint, [])}),
+                "throughput_rps": round(len(values) / duration, 2) if duration else 0.0,
+                "p50_ms": _percentile_ms(values, 50),
+                "p95_ms": _percentile_ms(values, 95),
+                "p99_ms": _percentile_ms(values, 99),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+        return report
+
+
+def _percentile_ms(sorted_values, p):
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return round(sorted_values[index] * 1000, 1)
+
+
+# --- Kernel memory ---
+
+class MemorySampler(threading.Thread):
+    """Samples the summed RSS/PSS of all kernel processes until stopped; keeps the peak."""
+
+    def __init__(self):
+        super().__init__(name="memory-sampler", daemon=True)
+        self.peak = {"kernels": 0, "rss_mb": 0.0, "pss_mb": 0.0}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            sample = kernel_memory()
+            if sample["rss_mb"] > self.peak["rss_mb"]:
+                self.peak = sample
+            self._stop_event.wait(MEMORY_SAMPLE_SECONDS)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        peak = dict(self.peak)
+        peak["rss_mb_per_kernel"] = round(peak["rss_mb"] / peak["kernels"], 1) if peak["kernels"] else 0.0
+        peak["pss_mb_per_kernel"] = round(peak["pss_mb"] / peak["kernels"], 1) if peak["kernels"] else 0.0
+        return peak
+
+
+def _status_kb(pid, field, filename="status"):
+    try:
+        with open(f"/proc/{pid}/{filename}") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def kernel_memory():
+    """{"kernels", "rss_mb", "pss_mb"} over every kernel process visible in /proc."""
+    kernels, rss_kb, pss_kb = 0, 0, 0
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().decode("utf-8", "replace")
+        except OSError:
+            continue
+        if any(marker in cmdline for marker in KERNEL_CMDLINE_MARKERS):
+            kernels += 1
+            rss_kb += _status_kb(entry, "VmRSS")
+            pss_kb += _status_kb(entry, "Pss", "smaps_rollup")
+    return {"kernels": kernels, "rss_mb": round(rss_kb / 1024, 1), "pss_mb": round(pss_kb / 1024, 1)}
+
+
+# --- Simulated students ---
+
+class Student(threading.Thread):
+    def __init__(self, index, args, client, recorder, barriers, exam):
+        super().__init__(name=f"student-{index}", daemon=True)
+        self.username = f"{args.user_prefix}{index}"
+        self.session_id = f"loadgen-{index}-{int(time.time())}"
+        self.args, self.client, self.recorder = args, client, recorder
+        self.login_barrier, self.submit_barrier = barriers
+        self.exam = exam
+        self.random = random.Random(index)
+
+    def _think(self):
+        if self.args.think_time > 0:
+            time.sleep(self.random.uniform(0, self.args.think_time))
+
+    def _post(self, endpoint, path, body, ok=None):
+        call = lambda: self.client.request("POST", path, body)
+        return self.recorder.call(endpoint, call, ok) if ok else self.recorder.call(endpoint, call)
+
+    def run(self):
+        answers = []
+        try:
+            _wait(self.login_barrier)
+            _, _, logged_in = self._post("login", "/api/auth/login",
+                                         {"username": self.username, "password": self.args.password})
+            if logged_in:
+                answers = self._exam()
+        finally:
+            _wait(self.submit_barrier)
+        self._submit(answers)
+
+    def _exam(self):
+        _, _, started = self._post("session_start", "/api/evaluate/session/start", {"sessionId": self.session_id})
+        if not started:
+            return []
+        subject, level, question, code = self.random.choice(self.exam["reference"])
+        parts = question.get("parts") or [{}]
+        passed = True
+        for iteration in range(self.args.iterations):
+            self._think()
+            self._post("run", "/api/evaluate/run", {
+                "sessionId": self.session_id, "username": self.username, "subject": subject,
+                "cellCode": code, "userInput": "",
+            })
+            self._think()
+            part = parts[iteration % len(parts)]
+            _, body, ok = self._post("validate", "/api/evaluate/validate", {
+                "sessionId": self.session_id, "username": self.username, "subject": subject, "level": level,
+                "questionId": question["id"], "partId": part.get("part_id"), "cellCode": code,
+            })
+            passed = passed and ok and all((body or {}).get("test_results") or [False])
+        answers = [{"questionId": question["id"], "code": code, "passed": passed}]
+
+        if self.exam["image"]:
+            image_level, image_q, image_code = self.exam["image"]
+            image_session = f"{self.session_id}-image"
+            self._think()
+            _, _, started = self._post("image_session_start", "/api/evaluate/image-processing/session/start",
+                                       {"sessionId": image_session})
+            if started:
+                self._post("image_validate", "/api/evaluate/image-processing/validate", {
+                    "sessionId": image_session, "username": self.username, "subject": IMAGE_SUBJECT,
+                    "level": image_level, "questionId": image_q["id"], "cellCode": image_code,
+                })
+        return answers
+
+    def _submit(self, answers):
+        subject, level = (self.exam["reference"][0][0], self.exam["reference"][0][1])
+        submitted_at = time.perf_counter()
+        _, body, ok = self._post("submit", "/api/evaluate/submit", {
+            "sessionId": self.session_id, "username": self.username, "subject": subject, "level": level,
+            "answers": answers,
+        })
+        if not ok or not (body or {}).get("statusUrl"):
+            return
+        # The background phase (performance runs, kernel hand-off) finishing.
+        deadline = time.monotonic() + SUBMISSION_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(SUBMISSION_POLL_SECONDS)
+            status, status_body = self.client.request("GET", body["statusUrl"])
+            state = (status_body or {}).get("status")
+            if status == 200 and state in ("completed", "failed"):
+                self.recorder.add("submit_complete", time.perf_counter() - submitted_at, state == "completed")
+                return
+        self.recorder.add("submit_complete", time.perf_counter() - submitted_at, False)
+
+
+def _wait(barrier):
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+
+
+# --- Accounts ---
+
+def create_users(client, args):
+    created = 0
+    for index in range(args.students):
+        status, body = client.request("POST", "/api/users/", {
+            "username": f"{args.user_prefix}{index}", "password": args.password, "role": "student"})
+        if status == 201:
+            created += 1
+        elif status != 409:
+            raise RuntimeError(f"Could not create {args.user_prefix}{index}: {status} {body}")
+    return created
+
+
+def cleanup_users(client, args):
+    """Deletes the load-test accounts and the submissions and workspaces they left behind."""
+    for index in range(args.students):
+        username = f"{args.user_prefix}{index}"
+        client.request("DELETE", f"/api/users/{username}")
+        submissions_file = DATA_PATH / "submissions" / f"{username}.json"
+        if submissions_file.exists():
+            submissions_file.unlink()
+        shutil.rmtree(DATA_PATH / "user_generated" / username, ignore_errors=True)
+
+
+# --- Main ---
+
+def _print_report(report):
+    print(f"\n{report['students']} students, {report['duration_seconds']} s")
+    print(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<22}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>8}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    memory = report["kernel_memory_peak"]
+    print(f"\nKernel memory at peak: {memory['kernels']} kernels, RSS {memory['rss_mb']} MB "
+          f"({memory['rss_mb_per_kernel']} MB/kernel), PSS {memory['pss_mb']} MB ({memory['pss_mb_per_kernel']} MB/kernel)")
+
+
+ENDPOINT_ORDER = ["login", "session_start", "run", "validate", "image_session_start", "image_validate",
+                  "submit", "submit_complete"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.environ.get("LOADGEN_URL", "http://127.0.0.1:3007"))
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=3, help="/run + /validate rounds per student")
+    parser.add_argument("--think-time", type=float, default=2.0, help="max random pause between steps (s)")
+    parser.add_argument("--no-image", action="store_true", help="skip the image-processing validation")
+    parser.add_argument("--user-prefix", default="loadgen_student_")
+    parser.add_argument("--password", default="loadgen-password")
+    parser.add_argument("--create-users", action="store_true", help="create the student accounts first")
+    parser.add_argument("--cleanup", action="store_true", help="delete the accounts and their files afterwards")
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout (s)")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    exam = {"reference": reference_questions(), "image": None if args.no_image else image_question()}
+    if not exam["reference"]:
+        sys.exit("No question with a reference solution (data/datasets/**/<question id>/solution.py) was found.")
+    client = Client(args.url, args.timeout)
+    if args.create_users:
+        print(f"Created {create_users(client, args)} student account(s)")
+
+    recorder = Recorder()
+    barriers = (threading.Barrier(args.students), threading.Barrier(args.students))
+    students = [Student(i, args, client, recorder, barriers, exam) for i in range(args.students)]
+    sampler = MemorySampler()
+    sampler.start()
+    started = time.perf_counter()
+    for student in students:
+        student.start()
+    for student in students:
+        student.join()
+    duration = time.perf_counter() - started
+    memory = sampler.stop()
+
+    endpoints = recorder.summary(duration)
+    report = {
+        "url": args.url,
+        "students": args.students,
+        "iterations": args.iterations,
+        "questions": sorted({f"{s}/level{l}/{q['id']}" for s, l, q, _c in exam["reference"]}),
+        "image_question": exam["image"][1]["id"] if exam["image"] else None,
+        "duration_seconds": round(duration, 1),
+        "endpoints": {name: endpoints[name] for name in ENDPOINT_ORDER if name in endpoints},
+        "kernel_memory_peak": memory,
+    }
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.cleanup:
+        cleanup_users(client, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# backend/benchmarks/startup.py
+"""
+Startup-time benchmark for the backend.
+
+Each run starts a fresh interpreter and measures how long `import app` takes, how long
+the first request after that takes (a cheap one and, optionally, one that needs the
+deferred grading dependencies), and which heavy modules were imported along the way.
+
+    cd backend
+    python benchmarks/startup.py                 # 5 runs
+    python benchmarks/startup.py --runs 10 --grading
+    EAGER_IMPORTS=1 python benchmarks/startup.py # compare with everything imported eagerly
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["pandas", "numpy", "cv2", "skimage", "scipy", "jupyter_client", "PIL", "bcrypt"]
+
+# Runs inside the fresh interpreter; prints one JSON line.
+_PROBE = """
+import json, sys, time
+heavy = {heavy!r}
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+result = {{"import_seconds": imported - started,
+           "heavy_modules_at_import": [m for m in heavy if m in sys.modules]}}
+status = app.app.test_client().get({path!r}).status_code
+result["first_request_seconds"] = time.perf_counter() - imported
+result["first_request_status"] = status
+result["heavy_modules_after_request"] = [m for m in heavy if m in sys.modules]
+if {grading!r}:
+    from utils.lazy import preload
+    grading_started = time.perf_counter()
+    preload()
+    result["grading_imports_seconds"] = time.perf_counter() - grading_started
+print(json.dumps(result))
+"""
+
+
+def run_once(path, grading):
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(heavy=HEAVY_MODULES, path=path, grading=grading)],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Probe failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _summary(values):
+    return {
+        "median_ms": round(statistics.median(values) * 1000, 1),
+        "min_ms": round(min(values) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/api/courses/", help="request made right after startup")
+    parser.add_argument("--grading", action="store_true", help="also time importing the deferred grading dependencies")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="exit non-zero if the median import exceeds this")
+    args = parser.parse_args()
+
+    # One untimed run so the .pyc files exist, as they do on a real restart.
+    run_once(args.path, False)
+    results = [run_once(args.path, args.grading) for _ in range(args.runs)]
+
+    report = {
+        "runs": args.runs,
+        "eager_imports": os.environ.get("EAGER_IMPORTS", "0") == "1",
+        "import_app": _summary([r["import_seconds"] for r in results]),
+        "first_request": dict(_summary([r["first_request_seconds"] for r in results]),
+                              path=args.path, status=results[-1]["first_request_status"]),
+        "heavy_modules_at_import": results[-1]["heavy_modules_at_import"],
+        "heavy_modules_after_first_request": results[-1]["heavy_modules_after_request"],
+    }
+    if args.grading:
+        report["grading_imports"] = _summary([r["grading_imports_seconds"] for r in results])
+    print(json.dumps(report, indent=2))
+
+    if report["import_app"]["median_ms"] > args.budget_ms:
+        print(f"❌ Median startup {report['import_app']['median_ms']} ms is over the {args.budget_ms} ms budget.")
+        sys.exit(1)
+    print(f"✅ Median startup {report['import_app']['median_ms']} ms (budget {args.budget_ms} ms).")
+
+
+if __name__ == "__main__":
+    main()
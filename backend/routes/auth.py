@@ -1,7 +1,10 @@
-import json
-import bcrypt
+import threading
+import time
 from pathlib import Path
 from flask import Blueprint, request, jsonify
+from utils.storage import read_json, update_json
+from utils.password_pool import verify_password, needs_rehash, hash_password_async
+from utils.progressHelper import load_course_config, expand_progress, apply_progress_updates, user_for_response
 
 # --- Flask Blueprint Setup ---
 auth_bp = Blueprint('auth_api', __name__)
@@ -10,6 +13,77 @@ auth_bp = Blueprint('auth_api', __name__)
 BASE_DIR = Path(__file__).parent.parent
 USERS_FILE_PATH = BASE_DIR / "data" / "users.json"
 
+# --- Helper Functions ---
+
+# Re-hashed passwords are stored by one writer thread, so a login storm after raising
+# BCRYPT_ROUNDS turns into a few batched users.json writes rather than one per login,
+# and no file I/O runs on the hashing pool's result thread.
+REHASH_FLUSH_INTERVAL_SECONDS = 0.5
+
+# (username, new_hash, old_hash) waiting to be written.
+_pending_rehashes = []
+_pending_rehashes_lock = threading.Lock()
+_rehash_flush_needed = threading.Event()
+_rehash_writer_thread = None
+
+
+def _flush_pending_rehashes():
+    with _pending_rehashes_lock:
+        batch = _pending_rehashes[:]
+        del _pending_rehashes[:]
+    if not batch:
+        return
+    stored = []
+    with update_json(USERS_FILE_PATH) as doc:
+        users_by_name = {u['username']: u for u in doc.data.get("users", [])}
+        for username, new_hash, old_hash in batch:
+            user = users_by_name.get(username)
+            # Only replace the hash the login checked; skip it if the password changed since.
+            if user is not None and user.get('password') == old_hash:
+                user['password'] = new_hash
+                stored.append(username)
+    if stored:
+        print(f"Re-hashed passwords for {len(stored)} user(s) with the current cost factor.")
+
+
+def _rehash_writer_loop():
+    while True:
+        _rehash_flush_needed.wait()
+        # Let other logins' re-hashes join the same users.json write.
+        time.sleep(REHASH_FLUSH_INTERVAL_SECONDS)
+        _rehash_flush_needed.clear()
+        try:
+            _flush_pending_rehashes()
+        except Exception as e:
+            # Dropped re-hashes are harmless: the next login of those users tries again.
+            print(f"Warning: Could not store re-hashed passwords: {e}")
+
+
+def _rehash_in_background(username, password, old_hash):
+    """
+    Re-hashes a password whose stored hash uses a lower bcrypt cost factor than BCRYPT_ROUNDS.
+    The hash is computed on the hashing pool after the login response has been sent and
+    stored by the re-hash writer thread.
+    """
+    global _rehash_writer_thread
+
+    def _queue(future):
+        # Runs on the pool's result thread: only hand the hash over to the writer.
+        try:
+            new_hash = future.result()
+        except Exception as e:
+            print(f"Warning: Could not re-hash password for user '{username}': {e}")
+            return
+        with _pending_rehashes_lock:
+            _pending_rehashes.append((username, new_hash, old_hash))
+        _rehash_flush_needed.set()
+
+    with _pending_rehashes_lock:
+        if _rehash_writer_thread is None:
+            _rehash_writer_thread = threading.Thread(target=_rehash_writer_loop, name="rehash-writer", daemon=True)
+            _rehash_writer_thread.start()
+    hash_password_async(password).add_done_callback(_queue)
+
 # --- Routes ---
 
 @auth_bp.route('/login', methods=['POST'])
@@ -29,8 +103,7 @@ def login():
         return jsonify({'message': 'Username and password are required.'}), 400
 
     try:
-        with open(USERS_FILE_PATH, 'r', encoding='utf-8') as f:
-            users_data = json.load(f)
+        users_data = read_json(USERS_FILE_PATH)
         
         users_list = users_data.get("users", [])
         user = next((u for u in users_list if u['username'] == username), None)
@@ -38,41 +111,37 @@ def login():
         if not user:
             return jsonify({'message': 'Invalid credentials.'}), 401
         
-        is_match = bcrypt.checkpw(
-            password.encode('utf-8'), 
-            user['password'].encode('utf-8')
-        )
+        # bcrypt runs on the hashing pool so a login storm can't occupy every request thread
+        is_match = verify_password(password, user['password'])
 
         if not is_match:
             return jsonify({'message': 'Invalid credentials.'}), 401
 
+        if needs_rehash(user['password']):
+            _rehash_in_background(username, password, user['password'])
+
         # --- NEW LOGIC: Synchronize User Progress ---
         # This section will "self-heal" the user's progress data on every successful login.
-        progress_was_updated = False
-        if "progress" in user and isinstance(user["progress"], dict):
-            for subject, levels in user["progress"].items():
-                # Check if level1 exists and is not already completed
-                if "level1" not in levels or levels.get("level1") == "locked":
-                    # If level1 is missing or locked, unlock it.
-                    print(f"Auto-unlocking level 1 for user '{username}' in subject '{subject}'.")
-                    user["progress"][subject]["level1"] = "unlocked"
-                    progress_was_updated = True
+        course_config = load_course_config()
+        unlock_updates = []
+        for subject, levels in expand_progress(user.get("progress"), course_config).items():
+            # If level1 is locked, unlock it.
+            if levels.get("level1") == "locked":
+                print(f"Auto-unlocking level 1 for user '{username}' in subject '{subject}'.")
+                unlock_updates.append((username, subject, "level1", "unlocked"))
         
         # If we made any changes, we must save them back to the users.json file.
-        if progress_was_updated:
-            # Find the user's index to update the correct entry in the list
-            user_index = next((i for i, u in enumerate(users_list) if u['username'] == username), None)
-            if user_index is not None:
-                users_list[user_index] = user
-                users_data["users"] = users_list
-                with open(USERS_FILE_PATH, 'w', encoding='utf-8') as f:
-                    json.dump(users_data, f, indent=2)
-                print(f"Saved updated progress for user '{username}' to users.json.")
+        # The file is re-read under the writer lock so concurrent logins don't overwrite each other.
+        if unlock_updates:
+            with update_json(USERS_FILE_PATH) as doc:
+                users_list = doc.data.get("users", [])
+                apply_progress_updates(users_list, unlock_updates, course_config)
+                user = next((u for u in users_list if u['username'] == username), user)
+            print(f"Saved updated progress for user '{username}' to users.json.")
         # --- END OF NEW LOGIC ---
 
-        # Prepare the user object to send back (with updated progress).
-        user_to_return = user.copy()
-        del user_to_return['password']
+        # Prepare the user object to send back (with updated, expanded progress).
+        user_to_return = user_for_response(user, course_config)
         
         return jsonify({'message': 'Login successful!', 'user': user_to_return}), 200
 
@@ -1,8 +1,9 @@
 # File: courses_api.py
 
-import json
 from pathlib import Path
 from flask import Blueprint, jsonify
+from utils.storage import read_json
+from utils.compression import catalog_response
 
 # --- Flask Blueprint Setup ---
 courses_bp = Blueprint("courses", __name__)
@@ -19,19 +20,21 @@ def get_all_courses():
     to guarantee the order is preserved.
     """
     try:
-        with open(COURSE_CONFIG_PATH, 'r', encoding='utf-8') as f:
-            courses_dict = json.load(f)
-
-        # Convert the dictionary into a list of objects to preserve order.
-        # Each object in the list will now contain its original key.
-        courses_list = []
-        for key, value in courses_dict.items():
-            course_item = value.copy()  # Start with the course's data
-            course_item['key'] = key    # Add the original key (e.g., "ds", "ml")
-            courses_list.append(course_item)
+        def build_courses():
+            courses_dict = read_json(COURSE_CONFIG_PATH)
+
+            # Convert the dictionary into a list of objects to preserve order.
+            # Each object in the list will now contain its original key.
+            courses_list = []
+            for key, value in courses_dict.items():
+                course_item = value.copy()  # Start with the course's data
+                course_item['key'] = key    # Add the original key (e.g., "ds", "ml")
+                courses_list.append(course_item)
+            return courses_list
 
         # Return the list. The order of a list is always maintained in JSON.
-        return jsonify(courses_list)
+        # It is rebuilt only when course_config.json changes.
+        return catalog_response(("courses",), [COURSE_CONFIG_PATH], build_courses)
 
     except FileNotFoundError:
         return jsonify({"message": "Course configuration file not found."}), 404
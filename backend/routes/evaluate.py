@@ -3,15 +3,33 @@ import time
 from pathlib import Path
 from datetime import datetime
 from flask import Blueprint, request, jsonify
-from typing import Dict, Tuple, Union
-from jupyter_client.manager import KernelManager, KernelClient
+from typing import Dict, Tuple, Union, TYPE_CHECKING
 from queue import Empty
-import pandas as pd
-import numpy as np
 import re
+import shutil
 import subprocess
 import tempfile
 import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from urllib.parse import quote
+from utils.dataset_cache import link_shared_student_data, localize_data_paths, resolve_data_path
+from utils.workspace import enforce_quota
+from utils.kernels import acquire_kernel, release_kernel, reset_kernel
+from utils.storage import read_json, update_json
+from utils.jobs import start_job
+from utils.question_parser import is_validated
+from utils.progressHelper import load_course_config, expand_progress, apply_progress_updates, user_for_response
+from utils.lazy import lazy_import
+from utils.kernel_registry import SessionKernels, put_state, get_state, get_states, delete_state, pid_alive
+from utils.metrics import span, timed, observe_stage, log_debug, log_error
+
+if TYPE_CHECKING:
+    from jupyter_client.manager import KernelClient
+
+# Heavy dependencies are imported on first use, not when the app starts (see utils/lazy.py)
+pd = lazy_import("pandas")
 
 evaluation_bp = Blueprint('evaluation_api', __name__)
 
@@ -19,7 +37,11 @@ QUESTIONS_BASE_PATH = Path(__file__).parent.parent / "data" / "questions"
 SUBMISSIONS_PATH = Path(__file__).parent.parent / "data" / "submissions"
 USERS_FILE_PATH = Path(__file__).parent.parent / "data" / "users.json"
 USER_GENERATED_PATH = Path(__file__).parent.parent / "data" / "user_generated"
-USER_KERNELS: Dict[str, Tuple[KernelManager, KernelClient]] = {}
+DATASETS_BASE_PATH = Path(__file__).parent.parent / "data" / "datasets"
+# Session ID -> (km, kc), shared by all server workers (see utils/kernel_registry.py)
+USER_KERNELS = SessionKernels("evaluate")
+# Student directories already linked to the shared datasets (MNIST, ...) in this process
+_LINKED_STUDENT_DIRS = set()
 
 
 # --- HELPER FUNCTIONS ---
@@ -44,11 +66,10 @@ def _simplify_python_error(stderr: str) -> str:
     
     return '\n'.join(lines[-2:])
 
-import pandas as pd
-import numpy as np
 from pathlib import Path
 from typing import Union, Tuple
 
+@timed("csv_compare")
 def compare_csvs(student_path: Union[Path, str], solution_path: Union[Path, str], key_columns=None, threshold: float = 0.8, rtol: float = 1e-4, atol: float = 1e-6) -> Tuple[bool, float]:
     """
     Compares two CSV files cell-by-cell based on specific grading criteria.
@@ -64,21 +85,21 @@ def compare_csvs(student_path: Union[Path, str], solution_path: Union[Path, str]
     to adhere to the specified cell-by-cell logic.
     """
     try:
-        print("\n" + "="*80)
-        print("CSV CUSTOM COMPARISON DETAILS (80%-120% Rule)")
-        print("="*80)
-        print(f"  STUDENT FILE  -> {student_path}")
-        print(f"  SOLUTION FILE -> {solution_path}")
-        print(f"  PASS THRESHOLD-> {threshold:.2f} (80% average score required to pass)")
-        print(f"  NOTE: `key_columns`, `rtol`, `atol` are ignored by this grading logic.")
-        print("-"*80)
+        log_debug("\n" + "="*80)
+        log_debug("CSV CUSTOM COMPARISON DETAILS (80%-120% Rule)")
+        log_debug("="*80)
+        log_debug(f"  STUDENT FILE  -> {student_path}")
+        log_debug(f"  SOLUTION FILE -> {solution_path}")
+        log_debug(f"  PASS THRESHOLD-> {threshold:.2f} (80% average score required to pass)")
+        log_debug(f"  NOTE: `key_columns`, `rtol`, `atol` are ignored by this grading logic.")
+        log_debug("-"*80)
 
         student_path, solution_path = Path(student_path), Path(solution_path)
         if not student_path.exists():
-            print(f"DEBUG: Student file does not exist at {student_path}")
+            log_debug(f"DEBUG: Student file does not exist at {student_path}")
             return False, 0.0
         if not solution_path.exists():
-            print(f"DEBUG: Solution file does not exist at {solution_path}")
+            log_debug(f"DEBUG: Solution file does not exist at {solution_path}")
             return False, 0.0
 
         df_student = pd.read_csv(student_path)
@@ -86,16 +107,16 @@ def compare_csvs(student_path: Union[Path, str], solution_path: Union[Path, str]
 
         # 1. Strict Shape Comparison (as requested)
         if df_student.shape != df_solution.shape:
-            print(f"❌ FAILED: Shape Mismatch.")
-            print(f"  - Student Shape:  {df_student.shape} (rows, cols)")
-            print(f"  - Solution Shape: {df_solution.shape} (rows, cols)")
-            print("="*80 + "\n")
+            log_debug(f"❌ FAILED: Shape Mismatch.")
+            log_debug(f"  - Student Shape:  {df_student.shape} (rows, cols)")
+            log_debug(f"  - Solution Shape: {df_solution.shape} (rows, cols)")
+            log_debug("="*80 + "\n")
             return False, 0.0
 
         # Handle case of empty but matching shape dataframes
         if df_solution.empty:
-            print("✅ PASSED: Both CSVs are empty and have matching shapes.")
-            print("="*80 + "\n")
+            log_debug("✅ PASSED: Both CSVs are empty and have matching shapes.")
+            log_debug("="*80 + "\n")
             return True, 1.0
 
         matching_cells = 0
@@ -143,28 +164,28 @@ def compare_csvs(student_path: Union[Path, str], solution_path: Union[Path, str]
         average_score = matching_cells / total_cells if total_cells > 0 else 1.0
         final_pass_status = average_score >= threshold
 
-        print(f"  Student DataFrame Shape: {df_student.shape}")
-        print(f"  Solution DataFrame Shape: {df_solution.shape}")
-        print("-" * 80)
-        print(f"  Total Cells Compared: {total_cells}")
-        print(f"  Matching Cells:       {matching_cells}")
-        print(f"  Average Score:        {average_score:.6f}")
-        print(f"  Threshold Required:   {threshold:.4f}")
-        print(f"  Result: {'✅ PASSED' if final_pass_status else '❌ FAILED'}")
+        log_debug(f"  Student DataFrame Shape: {df_student.shape}")
+        log_debug(f"  Solution DataFrame Shape: {df_solution.shape}")
+        log_debug("-" * 80)
+        log_debug(f"  Total Cells Compared: {total_cells}")
+        log_debug(f"  Matching Cells:       {matching_cells}")
+        log_debug(f"  Average Score:        {average_score:.6f}")
+        log_debug(f"  Threshold Required:   {threshold:.4f}")
+        log_debug(f"  Result: {'✅ PASSED' if final_pass_status else '❌ FAILED'}")
 
         if not final_pass_status and mismatched_examples:
-            print("\n--- CSV COMPARISON FAILED: DEBUG INFO ---")
-            print("First few mismatched cells:")
+            log_debug("\n--- CSV COMPARISON FAILED: DEBUG INFO ---")
+            log_debug("First few mismatched cells:")
             for example in mismatched_examples:
-                print(example)
-            print("--- END OF DEBUG INFO ---")
+                log_debug(example)
+            log_debug("--- END OF DEBUG INFO ---")
 
-        print("="*80 + "\n")
+        log_debug("="*80 + "\n")
 
         return final_pass_status, average_score
 
     except Exception as e:
-        print(f"ERROR during CSV comparison: {e}")
+        log_error(f"ERROR during CSV comparison: {e}")
         import traceback
         traceback.print_exc()
         return False, 0.0
@@ -189,62 +210,63 @@ def _handle_csv_similarity(part_data, student_dir, validation_mode="STUDENT") ->
     atol = float(part_data.get('atol', 1e-6))
     threshold = float(part_data.get('similarity_threshold', 0.8))
     
-    print(f"[VALIDATION {validation_mode}] CSV Similarity Validation")
-    print(f"  Key Columns: {key_cols}")
-    print(f"  Similarity Threshold: {threshold}")
-    print(f"  Tolerance: rtol={rtol}, atol={atol}")
-    print(f"  Student Directory: {student_dir}")
+    log_debug(f"[VALIDATION {validation_mode}] CSV Similarity Validation")
+    log_debug(f"  Key Columns: {key_cols}")
+    log_debug(f"  Similarity Threshold: {threshold}")
+    log_debug(f"  Tolerance: rtol={rtol}, atol={atol}")
+    log_debug(f"  Student Directory: {student_dir}")
     
     if isinstance(solution_files, list):
-        print(f"[VALIDATION {validation_mode}] Comparing {len(solution_files)} file(s)")
+        log_debug(f"[VALIDATION {validation_mode}] Comparing {len(solution_files)} file(s)")
         for idx, sol_path_str in enumerate(solution_files):
             sol_path = Path(sol_path_str)
             student_file_path = student_dir / sol_path.name
             
-            print(f"\n  File {idx+1}/{len(solution_files)}:")
-            print(f"    Student File: {student_file_path}")
-            print(f"    Solution File: {sol_path}")
+            log_debug(f"\n  File {idx+1}/{len(solution_files)}:")
+            log_debug(f"    Student File: {student_file_path}")
+            log_debug(f"    Solution File: {sol_path}")
             
             passed, score = compare_csvs(student_file_path, sol_path, rtol=rtol, atol=atol, key_columns=key_cols, threshold=threshold)
             
-            print(f"    Result: {'✅ PASSED' if passed else '❌ FAILED'} (Similarity Score: {score:.4f}, Required: {threshold:.4f})")
+            log_debug(f"    Result: {'✅ PASSED' if passed else '❌ FAILED'} (Similarity Score: {score:.4f}, Required: {threshold:.4f})")
             
             if not passed: 
                 return False, f"File '{student_file_path.name}' did not match the solution (Score: {score:.4f}, Required: {threshold:.4f})"
-        print(f"[VALIDATION {validation_mode}] ✅ All {len(solution_files)} file(s) passed validation")
+        log_debug(f"[VALIDATION {validation_mode}] ✅ All {len(solution_files)} file(s) passed validation")
         return True, ""
     elif isinstance(solution_files, str):
         sol_path = Path(solution_files)
         student_filename_to_check = part_data.get("placeholder_filename", sol_path.name)
         student_file_path = student_dir / student_filename_to_check
         
-        print(f"\n  Comparing single file:")
-        print(f"    Student File: {student_file_path}")
-        print(f"    Solution File: {sol_path}")
-        print(f"    Expected Filename: {student_filename_to_check}")
+        log_debug(f"\n  Comparing single file:")
+        log_debug(f"    Student File: {student_file_path}")
+        log_debug(f"    Solution File: {sol_path}")
+        log_debug(f"    Expected Filename: {student_filename_to_check}")
         
         passed, score = compare_csvs(student_file_path, sol_path, rtol=rtol, atol=atol, key_columns=key_cols, threshold=threshold)
         
-        print(f"    Result: {'✅ PASSED' if passed else '❌ FAILED'} (Similarity Score: {score:.4f}, Required: {threshold:.4f})")
+        log_debug(f"    Result: {'✅ PASSED' if passed else '❌ FAILED'} (Similarity Score: {score:.4f}, Required: {threshold:.4f})")
         
         return bool(passed), f"Output file did not match the solution (Score: {score:.4f}, Required: {threshold:.4f})" if not passed else ""
-    print(f"[VALIDATION {validation_mode}] ERROR: Invalid 'solution_file' format in question data")
+    log_debug(f"[VALIDATION {validation_mode}] ERROR: Invalid 'solution_file' format in question data")
     return False, "Invalid 'solution_file' format in question data."
 
+@timed("output_parse")
 def _handle_text_similarity(part_data, student_output, validation_mode="STUDENT") -> Tuple[bool, str]:
     keywords_str = part_data.get("expected_text", "")
     threshold = float(part_data.get("similarity_threshold", 0.8))
     student_output_lower = student_output.lower()
     keywords = [kw.strip().lower() for kw in keywords_str.split() if kw.strip()]
     
-    print(f"[VALIDATION {validation_mode}] Text Similarity Validation")
-    print(f"  Expected Keywords: {keywords}")
-    print(f"  Similarity Threshold: {threshold}")
-    print(f"  Student Output Length: {len(student_output)} characters")
-    print(f"  Student Output Preview: {student_output[:200]}...")
+    log_debug(f"[VALIDATION {validation_mode}] Text Similarity Validation")
+    log_debug(f"  Expected Keywords: {keywords}")
+    log_debug(f"  Similarity Threshold: {threshold}")
+    log_debug(f"  Student Output Length: {len(student_output)} characters")
+    log_debug(f"  Student Output Preview: {student_output[:200]}...")
     
     if not keywords: 
-        print(f"[VALIDATION {validation_mode}] ⚠️  No keywords specified for text similarity.")
+        log_debug(f"[VALIDATION {validation_mode}] ⚠️  No keywords specified for text similarity.")
         return True, "No keywords specified for text similarity."
     
     matched_count = sum(1 for kw in keywords if kw in student_output_lower)
@@ -252,70 +274,146 @@ def _handle_text_similarity(part_data, student_output, validation_mode="STUDENT"
     matched_keywords = [kw for kw in keywords if kw in student_output_lower]
     missing_keywords = [kw for kw in keywords if kw not in student_output_lower]
     
-    print(f"  Matched Keywords: {matched_keywords} ({matched_count}/{len(keywords)})")
+    log_debug(f"  Matched Keywords: {matched_keywords} ({matched_count}/{len(keywords)})")
     if missing_keywords:
-        print(f"  Missing Keywords: {missing_keywords}")
-    print(f"  Match Ratio: {match_ratio:.4f} (Required: {threshold:.4f})")
+        log_debug(f"  Missing Keywords: {missing_keywords}")
+    log_debug(f"  Match Ratio: {match_ratio:.4f} (Required: {threshold:.4f})")
     
     if match_ratio >= threshold:
-        print(f"[VALIDATION {validation_mode}] ✅ PASSED text similarity check")
+        log_debug(f"[VALIDATION {validation_mode}] ✅ PASSED text similarity check")
         return True, f"Passed text check ({match_ratio:.0%})"
     else:
-        print(f"[VALIDATION {validation_mode}] ❌ FAILED text similarity check")
+        log_debug(f"[VALIDATION {validation_mode}] ❌ FAILED text similarity check")
         return False, f"Failed text check. Missing keywords: {missing_keywords}"
 
+@timed("output_parse")
 def _handle_numerical_evaluation(part_data, student_output, validation_mode="STUDENT") -> Tuple[bool, str]:
     label = part_data.get("evaluation_label")
     expected_value = float(part_data.get("expected_value", 0))
     tolerance = float(part_data.get("tolerance", 1e-5))
     
-    print(f"[VALIDATION {validation_mode}] Numerical Evaluation Validation")
-    print(f"  Label: {label}")
-    print(f"  Expected Value: {expected_value}")
-    print(f"  Tolerance: ±{tolerance}")
-    print(f"  Student Output Length: {len(student_output)} characters")
-    print(f"  Student Output Preview: {student_output[:300]}...")
+    log_debug(f"[VALIDATION {validation_mode}] Numerical Evaluation Validation")
+    log_debug(f"  Label: {label}")
+    log_debug(f"  Expected Value: {expected_value}")
+    log_debug(f"  Tolerance: ±{tolerance}")
+    log_debug(f"  Student Output Length: {len(student_output)} characters")
+    log_debug(f"  Student Output Preview: {student_output[:300]}...")
     
     try:
         pattern = re.compile(re.escape(label) + r'\s*(-?[\d\.]+)')
         match = pattern.search(student_output)
         if not match: 
-            print(f"[VALIDATION {validation_mode}] ❌ FAILED: Required label '{label}' not found in output")
+            log_debug(f"[VALIDATION {validation_mode}] ❌ FAILED: Required label '{label}' not found in output")
             return False, f"Failed. Required label '{label}' not found in the output."
         
         extracted_string = match.group(1)
         extracted_value = float(extracted_string)
         difference = abs(extracted_value - expected_value)
         
-        print(f"  Extracted Value: {extracted_value:.6f}")
-        print(f"  Difference: {difference:.6f}")
-        print(f"  Within Tolerance: {difference <= tolerance}")
+        log_debug(f"  Extracted Value: {extracted_value:.6f}")
+        log_debug(f"  Difference: {difference:.6f}")
+        log_debug(f"  Within Tolerance: {difference <= tolerance}")
         
         if abs(extracted_value - expected_value) <= tolerance:
-            print(f"[VALIDATION {validation_mode}] ✅ PASSED numerical check")
+            log_debug(f"[VALIDATION {validation_mode}] ✅ PASSED numerical check")
             return True, f"Passed numerical check. Found value {extracted_value:.4f} is within tolerance."
         else:
-            print(f"[VALIDATION {validation_mode}] ❌ FAILED numerical check")
+            log_debug(f"[VALIDATION {validation_mode}] ❌ FAILED numerical check")
             return False, f"Failed numerical check. Found value {extracted_value:.4f}, expected around {expected_value}."
     except (ValueError, TypeError): 
-        print(f"[VALIDATION {validation_mode}] ❌ FAILED: Could not parse number from output")
+        log_debug(f"[VALIDATION {validation_mode}] ❌ FAILED: Could not parse number from output")
         return False, f"Failed. Could not parse number from output for label '{label}'."
     except Exception as e: 
-        print(f"[VALIDATION {validation_mode}] ❌ ERROR during numerical parsing: {e}")
+        log_error(f"[VALIDATION {validation_mode}] ❌ ERROR during numerical parsing: {e}")
         return False, f"An unexpected error occurred during numerical parsing: {e}"
 
-def run_code_on_kernel(kc: KernelClient, code: str, user_input: str = "", working_dir: str = None, timeout: int = 45) -> Tuple[str, str]:
+def _validation_style(subject_lower, level):
+    """
+    How a subject's questions are graded: 'r' (R test cases), 'test_cases' (stdin/stdout
+    test cases on the kernel), 'output' (run once, then check files/output per part) or
+    None if the subject has no validation logic.
+    """
+    if subject_lower == 'rprogramming':
+        return 'r'
+    if subject_lower in ['deeplearning', 'nlp', 'llm'] or (subject_lower == 'ds' and level == '1'):
+        return 'test_cases'
+    if subject_lower in ['ml', 'speechrecognition', 'generativeai', 'ds']:
+        return 'output'
+    return None
+
+def _grade_test_cases(run, test_cases, language, validation_mode="STUDENT"):
+    """
+    Runs the code once per test case through run(user_input) -> (stdout, stderr) and
+    compares the stripped stdout with the expected output.
+    Returns (test_results, last_stdout, last_stderr).
+    """
+    test_results = []
+    stdout, stderr = "", ""
+    for i, case in enumerate(test_cases):
+        user_input = case.get("input", "")
+        expected_output = case.get("output", "")
+        
+        log_debug(f"\n--- TEST CASE {i+1}/{len(test_cases)} ---")
+        log_debug(f"Input: {repr(user_input) if user_input else '(empty)'}")
+        log_debug(f"Expected Output: {repr(expected_output) if expected_output else '(empty)'}")
+        
+        stdout, stderr = run(user_input)
+
+        if stderr:
+            log_debug(f"[VALIDATION {validation_mode}] ❌ {language} ERROR ON TEST CASE {i+1}")
+            log_debug(f"Error: {stderr[:500]}")  # Limit error length
+            test_results.append(False)
+        else:
+            actual_output = stdout.strip()
+            expected_output_stripped = expected_output.strip()
+            passed = actual_output == expected_output_stripped
+            
+            log_debug(f"Actual Output: {repr(actual_output) if actual_output else '(empty)'}")
+            log_debug(f"Result: {'✅ PASSED' if passed else '❌ FAILED'}")
+            if not passed:
+                log_debug(f"  Expected: {repr(expected_output_stripped)}")
+                log_debug(f"  Got:      {repr(actual_output)}")
+            
+            test_results.append(passed)
+    
+    log_debug(f"\n[VALIDATION {validation_mode}] Final Result: {sum(test_results)}/{len(test_cases)} test case(s) passed")
+    return test_results, stdout, stderr
+
+def _grade_part_output(part_data, stdout, student_dir, validation_mode="STUDENT") -> Tuple[bool, str]:
+    """Checks one part of an output-graded question against the code's stdout and files."""
+    validation_type = part_data.get("type", "csv_similarity") # Default to csv
+    passed = False
+    message = "Validation failed."
+
+    log_debug(f"\n[VALIDATION {validation_mode}] Validation Type: {validation_type}")
+
+    if validation_type == 'csv_similarity':
+        passed, message = _handle_csv_similarity(part_data, student_dir, validation_mode)
+    elif validation_type == 'text_similarity':
+        passed, message = _handle_text_similarity(part_data, stdout, validation_mode)
+    elif validation_type == 'numerical_evaluation':
+        passed, message = _handle_numerical_evaluation(part_data, stdout, validation_mode)
+    return passed, message
+
+def run_code_on_kernel(kc: "KernelClient", code: str, user_input: str = "", working_dir: str = None, timeout: int = 45) -> Tuple[str, str]:
     """
     Executes a Python code snippet on a Jupyter kernel, ensuring the working directory is set correctly.
     """
-    print(f"\n[CODE EXECUTION] Starting Python code execution")
+    log_debug(f"\n[CODE EXECUTION] Starting Python code execution")
     if working_dir:
         Path(working_dir).mkdir(parents=True, exist_ok=True)
-        print(f"[CODE EXECUTION] Working Directory: {working_dir}")
+        if str(working_dir) not in _LINKED_STUDENT_DIRS:
+            link_shared_student_data(working_dir)
+            _LINKED_STUDENT_DIRS.add(str(working_dir))
+        quota_error = enforce_quota(working_dir)
+        if quota_error:
+            log_debug(f"[CODE EXECUTION] ❌ Refused: {quota_error}")
+            return "", quota_error
+        log_debug(f"[CODE EXECUTION] Working Directory: {working_dir}")
     if user_input:
-        print(f"[CODE EXECUTION] User Input: {repr(user_input[:100]) if len(user_input) > 100 else repr(user_input)}")
-    print(f"[CODE EXECUTION] Code Length: {len(code)} characters")
-    print(f"[CODE EXECUTION] Timeout: {timeout} seconds")
+        log_debug(f"[CODE EXECUTION] User Input: {repr(user_input[:100]) if len(user_input) > 100 else repr(user_input)}")
+    log_debug(f"[CODE EXECUTION] Code Length: {len(code)} characters")
+    log_debug(f"[CODE EXECUTION] Timeout: {timeout} seconds")
     
     prep_script = ""
     if working_dir:
@@ -346,10 +444,11 @@ builtins.input = _mock_input
 # Student's code to be executed
 {code}
 """
-    print(f"[CODE EXECUTION] Executing code on kernel...")
+    log_debug(f"[CODE EXECUTION] Executing code on kernel...")
     msg_id = kc.execute(full_script)
     stdout, stderr = [], []
     start_time = time.monotonic()
+    busy_since = None  # set when the kernel picks the request up
 
     while time.monotonic() - start_time < timeout:
         try:
@@ -360,7 +459,10 @@ builtins.input = _mock_input
             msg_type = msg['header']['msg_type']
             content = msg.get('content', {})
             
-            if msg_type == 'stream':
+            if msg_type == 'status' and content.get('execution_state') == 'busy' and busy_since is None:
+                busy_since = time.monotonic()
+                observe_stage("kernel_queue_wait", busy_since - start_time)
+            elif msg_type == 'stream':
                 if content['name'] == 'stdout':
                     stdout.append(content['text'])
                 else:
@@ -373,19 +475,20 @@ builtins.input = _mock_input
             pass
     else:
         stderr.append(f"\\n[Kernel Timeout] Execution exceeded {timeout} seconds.")
-        print(f"[CODE EXECUTION] ⚠️  TIMEOUT: Execution exceeded {timeout} seconds")
+        log_debug(f"[CODE EXECUTION] ⚠️  TIMEOUT: Execution exceeded {timeout} seconds")
+    observe_stage("kernel_execute", time.monotonic() - (busy_since or start_time))
 
     final_stdout = "".join(stdout).strip()
     final_stderr = "".join(stderr).strip()
     
     if final_stderr:
-        print(f"[CODE EXECUTION] ❌ ERROR occurred during execution")
-        print(f"[CODE EXECUTION] Error: {final_stderr[:300]}...")
+        log_debug(f"[CODE EXECUTION] ❌ ERROR occurred during execution")
+        log_debug(f"[CODE EXECUTION] Error: {final_stderr[:300]}...")
     else:
-        print(f"[CODE EXECUTION] ✅ Code executed successfully")
-        print(f"[CODE EXECUTION] Stdout length: {len(final_stdout)} characters")
+        log_debug(f"[CODE EXECUTION] ✅ Code executed successfully")
+        log_debug(f"[CODE EXECUTION] Stdout length: {len(final_stdout)} characters")
         if final_stdout:
-            print(f"[CODE EXECUTION] Stdout preview: {final_stdout[:200]}...")
+            log_debug(f"[CODE EXECUTION] Stdout preview: {final_stdout[:200]}...")
 
     return final_stdout, final_stderr
 
@@ -400,11 +503,11 @@ def run_r_script(code: str, user_input: str = "", timeout: int = 20) -> Tuple[st
     Executes an R script using a subprocess, completely suppressing warnings to ensure
     a clean stdout for validation. It also ensures the input stream ends with a newline.
     """
-    print(f"\n[CODE EXECUTION] Starting R script execution")
+    log_debug(f"\n[CODE EXECUTION] Starting R script execution")
     if user_input:
-        print(f"[CODE EXECUTION] User Input: {repr(user_input[:100]) if len(user_input) > 100 else repr(user_input)}")
-    print(f"[CODE EXECUTION] Code Length: {len(code)} characters")
-    print(f"[CODE EXECUTION] Timeout: {timeout} seconds")
+        log_debug(f"[CODE EXECUTION] User Input: {repr(user_input[:100]) if len(user_input) > 100 else repr(user_input)}")
+    log_debug(f"[CODE EXECUTION] Code Length: {len(code)} characters")
+    log_debug(f"[CODE EXECUTION] Timeout: {timeout} seconds")
     
     # --- START OF CORRECTION ---
     # The most reliable way to prevent warnings from contaminating stdout in a non-interactive
@@ -429,25 +532,26 @@ suppressWarnings({{
             user_input += '\n'
         # --- END OF SECONDARY FIX ---
 
-        print(f"[CODE EXECUTION] Executing R script...")
-        process = subprocess.run(
-            ["Rscript", temp_file_path],
-            input=user_input,
-            text=True,
-            capture_output=True,
-            timeout=timeout
-        )
+        log_debug(f"[CODE EXECUTION] Executing R script...")
+        with span("r_execute"):
+            process = subprocess.run(
+                ["Rscript", temp_file_path],
+                input=user_input,
+                text=True,
+                capture_output=True,
+                timeout=timeout
+            )
         stdout = process.stdout.strip()
         stderr = process.stderr.strip()
         
         if stderr:
-            print(f"[CODE EXECUTION] ❌ ERROR occurred during R execution")
-            print(f"[CODE EXECUTION] Error: {stderr[:300]}...")
+            log_debug(f"[CODE EXECUTION] ❌ ERROR occurred during R execution")
+            log_debug(f"[CODE EXECUTION] Error: {stderr[:300]}...")
         else:
-            print(f"[CODE EXECUTION] ✅ R script executed successfully")
-            print(f"[CODE EXECUTION] Stdout length: {len(stdout)} characters")
+            log_debug(f"[CODE EXECUTION] ✅ R script executed successfully")
+            log_debug(f"[CODE EXECUTION] Stdout length: {len(stdout)} characters")
             if stdout:
-                print(f"[CODE EXECUTION] Stdout preview: {stdout[:200]}...")
+                log_debug(f"[CODE EXECUTION] Stdout preview: {stdout[:200]}...")
     except FileNotFoundError:
         return "", "Rscript command not found. Please ensure R is installed and in the system's PATH."
     except subprocess.TimeoutExpired:
@@ -467,12 +571,24 @@ def start_session():
     if not session_id: return jsonify({'error': 'sessionId is required.'}), 400
     if session_id in USER_KERNELS: return jsonify({'message': f'Session {session_id} already exists.'})
     try:
-        km = KernelManager(); km.start_kernel()
-        kc = km.client(); kc.start_channels(); kc.wait_for_ready(timeout=60)
-        USER_KERNELS[session_id] = (km, kc)
+        USER_KERNELS[session_id] = acquire_kernel()
         return jsonify({'message': f'Session {session_id} started successfully.'})
     except Exception as e:
-        if 'km' in locals() and km.is_alive(): km.shutdown_kernel()
+        return jsonify({'error': 'The code execution engine failed to start.', 'details': str(e)}), 500
+
+@evaluation_bp.route('/session/reset', methods=['POST'])
+def reset_session():
+    """Gives the session a clean interpreter (e.g. between questions) without starting a new kernel."""
+    data = request.get_json(); session_id = data.get('sessionId')
+    if session_id not in USER_KERNELS: return jsonify({'error': 'User session not found.'}), 404
+    if reset_kernel(USER_KERNELS[session_id]):
+        return jsonify({'message': f'Session {session_id} reset successfully.'})
+    # The old kernel couldn't be cleaned (e.g. still busy): swap in a fresh one.
+    try:
+        release_kernel(USER_KERNELS.pop(session_id))
+        USER_KERNELS[session_id] = acquire_kernel()
+        return jsonify({'message': f'Session {session_id} restarted with a new kernel.'})
+    except Exception as e:
         return jsonify({'error': 'The code execution engine failed to start.', 'details': str(e)}), 500
 
 @evaluation_bp.route('/validate', methods=['POST'])
@@ -487,7 +603,7 @@ def validate_cell():
     missing_fields = [field for field in required_fields if field not in data or not data.get(field)]
     if missing_fields:
         error_msg = f"Missing or empty required fields in request: {', '.join(missing_fields)}"
-        print(f"[VALIDATION {validation_mode}] DEBUG: 400 Bad Request. {error_msg}")
+        log_debug(f"[VALIDATION {validation_mode}] DEBUG: 400 Bad Request. {error_msg}")
         return jsonify({'error': error_msg}), 400
 
     session_id = data['sessionId']
@@ -499,7 +615,7 @@ def validate_cell():
     username = data['username']
 
     if not code.strip():
-        print(f"[VALIDATION {validation_mode}] DEBUG: Empty code provided")
+        log_debug(f"[VALIDATION {validation_mode}] DEBUG: Empty code provided")
         return jsonify({'error': 'Code cannot be empty.'}), 400
     
     student_dir = USER_GENERATED_PATH / username
@@ -512,38 +628,39 @@ def validate_cell():
     # Only check for a Python kernel if the subject is NOT R Programming.
     if subject_lower != "rprogramming":
         if session_id not in USER_KERNELS:
-            print(f"[VALIDATION {validation_mode}] ERROR: User session '{session_id}' not found")
+            log_debug(f"[VALIDATION {validation_mode}] ERROR: User session '{session_id}' not found")
             return jsonify({'error': 'User session not found or invalid.'}), 404
         _km, kc = USER_KERNELS[session_id]
 
     try:
         q_path = QUESTIONS_BASE_PATH / subject / f"level{level}" / "questions.json"
-        with open(q_path, 'r', encoding='utf-8') as f: all_q = json.load(f)
-        q_data = next((q for q in all_q if q['id'] == q_id), None)
+        with span("question_load"):
+            all_q = read_json(q_path)
+            q_data = next((q for q in all_q if q['id'] == q_id), None)
         if not q_data: 
-            print(f"[VALIDATION {validation_mode}] ERROR: Question ID '{q_id}' not found in {subject}/level{level}")
+            log_debug(f"[VALIDATION {validation_mode}] ERROR: Question ID '{q_id}' not found in {subject}/level{level}")
             return jsonify({'error': f'Question with ID {q_id} not found.'}), 404
         part_data = next((p for p in q_data.get('parts', []) if p['part_id'] == p_id), q_data) if p_id else q_data
         
         # === DETAILED DEBUGGING LOG ===
-        print("\n" + "="*80)
-        print(f"[VALIDATION {validation_mode}] STARTING VALIDATION")
-        print("="*80)
-        print(f"User: {username}")
-        print(f"Subject: {subject} | Level: {level}")
-        print(f"Question ID: {q_id} | Part ID: {p_id if p_id else 'N/A (single question)'}")
-        print(f"Question Title: {q_data.get('title', 'N/A')}")
+        log_debug("\n" + "="*80)
+        log_debug(f"[VALIDATION {validation_mode}] STARTING VALIDATION")
+        log_debug("="*80)
+        log_debug(f"User: {username}")
+        log_debug(f"Subject: {subject} | Level: {level}")
+        log_debug(f"Question ID: {q_id} | Part ID: {p_id if p_id else 'N/A (single question)'}")
+        log_debug(f"Question Title: {q_data.get('title', 'N/A')}")
         if p_id:
-            print(f"Part Description: {part_data.get('description', 'N/A')[:100]}...")
-        print(f"Validation Type: {part_data.get('type', 'test_cases')}")
-        print(f"Working Directory: {student_dir}")
-        print("-"*80)
+            log_debug(f"Part Description: {part_data.get('description', 'N/A')[:100]}...")
+        log_debug(f"Validation Type: {part_data.get('type', 'test_cases')}")
+        log_debug(f"Working Directory: {student_dir}")
+        log_debug("-"*80)
         
     except FileNotFoundError: 
-        print(f"[VALIDATION {validation_mode}] ERROR: Question file not found at path: {q_path}")
+        log_error(f"[VALIDATION {validation_mode}] ERROR: Question file not found at path: {q_path}")
         return jsonify({'error': f"Question file not found at path: {q_path}"}), 500
     except Exception as e: 
-        print(f"[VALIDATION {validation_mode}] ERROR: Could not load question data: {str(e)}")
+        log_error(f"[VALIDATION {validation_mode}] ERROR: Could not load question data: {str(e)}")
         return jsonify({'error': f'Could not load question data: {str(e)}'}), 500
 
     test_results = []
@@ -551,50 +668,24 @@ def validate_cell():
     
     # --- START OF CORRECTION ---
     # Use the lowercased subject variable for all comparisons.
-    if subject_lower == 'rprogramming':
+    style = _validation_style(subject_lower, level)
+    if style == 'r':
     # --- END OF CORRECTION ---
         test_cases = part_data.get("test_cases", [])
         if not test_cases:
-            print(f"[VALIDATION {validation_mode}] ERROR: No test cases found for question {q_id}")
+            log_debug(f"[VALIDATION {validation_mode}] ERROR: No test cases found for question {q_id}")
             return jsonify({'error': f'No test cases found for question {q_id}.'}), 500
 
-        print(f"[VALIDATION {validation_mode}] R Programming validation - {len(test_cases)} test case(s)")
-        
-        for i, case in enumerate(test_cases):
-            user_input = case.get("input", "")
-            expected_output = case.get("output", "")
-            
-            print(f"\n--- TEST CASE {i+1}/{len(test_cases)} ---")
-            print(f"Input: {repr(user_input) if user_input else '(empty)'}")
-            print(f"Expected Output: {repr(expected_output) if expected_output else '(empty)'}")
-            
-            stdout, stderr = run_r_script(code, user_input=user_input)
-
-            if stderr:
-                print(f"[VALIDATION {validation_mode}] ❌ R SCRIPT ERROR ON TEST CASE {i+1}")
-                print(f"Error: {stderr[:500]}")  # Limit error length
-                test_results.append(False)
-            else:
-                actual_output = stdout.strip()
-                expected_output_stripped = expected_output.strip()
-                passed = actual_output == expected_output_stripped
-                
-                print(f"Actual Output: {repr(actual_output) if actual_output else '(empty)'}")
-                print(f"Result: {'✅ PASSED' if passed else '❌ FAILED'}")
-                if not passed:
-                    print(f"  Expected: {repr(expected_output_stripped)}")
-                    print(f"  Got:      {repr(actual_output)}")
-                
-                test_results.append(passed)
-        
-        print(f"\n[VALIDATION {validation_mode}] Final Result: {sum(test_results)}/{len(test_cases)} test case(s) passed")
-        print("="*80 + "\n")
+        log_debug(f"[VALIDATION {validation_mode}] R Programming validation - {len(test_cases)} test case(s)")
+        test_results, stdout, stderr = _grade_test_cases(
+            lambda user_input: run_r_script(code, user_input=user_input), test_cases, "R SCRIPT", validation_mode)
+        log_debug("="*80 + "\n")
                 
         return jsonify({"test_results": test_results, "stdout": stdout, "stderr": stderr})
 
     # --- START OF CORRECTION ---
     # Use the lowercased subject variable for Python-based subjects.
-    elif subject_lower in ['ds', 'deeplearning', 'nlp', 'ml', 'speechrecognition','llm','generativeai']:
+    elif style is not None:
     # --- END OF CORRECTION ---
         
         # Handle subject-specific pre-validation
@@ -605,104 +696,67 @@ def validate_cell():
 
         # Logic for subjects with simple, singular test cases (like DS, etc.)
         # if subject_lower in ['ds', 'deeplearning', 'nlp','llm']:
-        if subject_lower in ['deeplearning', 'nlp','llm'] or (subject_lower == 'ds' and level == '1'):    
+        if style == 'test_cases':
             test_cases = part_data.get("test_cases", [])
             if not test_cases:
-                print(f"[VALIDATION {validation_mode}] ERROR: No test cases found for question {q_id}")
+                log_debug(f"[VALIDATION {validation_mode}] ERROR: No test cases found for question {q_id}")
                 return jsonify({'error': f'No test cases found for question {q_id}.'}), 500
             
-            print(f"[VALIDATION {validation_mode}] Test-case-based validation - {len(test_cases)} test case(s)")
-            
-            for i, case in enumerate(test_cases):
-                test_input = case.get("input", "")
-                expected_output = case.get("output", "")
-                
-                print(f"\n--- TEST CASE {i+1}/{len(test_cases)} ---")
-                print(f"Input: {repr(test_input) if test_input else '(empty)'}")
-                print(f"Expected Output: {repr(expected_output) if expected_output else '(empty)'}")
-                
-                stdout, stderr = run_code_on_kernel(kc, code, user_input=test_input, working_dir=student_dir)
-                
-                if stderr:
-                    print(f"[VALIDATION {validation_mode}] ❌ PYTHON ERROR ON TEST CASE {i+1}")
-                    print(f"Error: {stderr[:500]}")  # Limit error length
-                    test_results.append(False)
-                else:
-                    actual_output = stdout.strip()
-                    expected_output_stripped = expected_output.strip()
-                    passed = actual_output == expected_output_stripped
-                    
-                    print(f"Actual Output: {repr(actual_output) if actual_output else '(empty)'}")
-                    print(f"Result: {'✅ PASSED' if passed else '❌ FAILED'}")
-                    if not passed:
-                        print(f"  Expected: {repr(expected_output_stripped)}")
-                        print(f"  Got:      {repr(actual_output)}")
-                    
-                    test_results.append(passed)
-            
-            print(f"\n[VALIDATION {validation_mode}] Final Result: {sum(test_results)}/{len(test_cases)} test case(s) passed")
-            print("="*80 + "\n")
+            log_debug(f"[VALIDATION {validation_mode}] Test-case-based validation - {len(test_cases)} test case(s)")
+            test_results, stdout, stderr = _grade_test_cases(
+                lambda user_input: run_code_on_kernel(kc, code, user_input=user_input, working_dir=student_dir),
+                test_cases, "PYTHON", validation_mode)
+            log_debug("="*80 + "\n")
             
             return jsonify({"test_results": test_results, "stdout": stdout, "stderr": _simplify_python_error(stderr)})
 
         # --- FIX IS HERE: 'generativeai' is added to this block ---
         # Logic for subjects with file-based or output-parsing validation (like ML)
         # elif subject_lower in ['ml', 'speechrecognition', 'generativeai']:
-        elif subject_lower in ['ml', 'speechrecognition', 'generativeai'] or (subject_lower == 'ds' and level != '1'):
-            print(f"[VALIDATION {validation_mode}] File/output-based validation")
-            print(f"Executing student code...")
+        else:
+            log_debug(f"[VALIDATION {validation_mode}] File/output-based validation")
+            log_debug(f"Executing student code...")
             
             stdout, stderr = run_code_on_kernel(kc, code, working_dir=student_dir)
             
             if stderr:
-                print(f"[VALIDATION {validation_mode}] ❌ CODE EXECUTION ERROR")
-                print(f"Error: {stderr[:500]}")
+                log_debug(f"[VALIDATION {validation_mode}] ❌ CODE EXECUTION ERROR")
+                log_debug(f"Error: {stderr[:500]}")
                 simplified_error = _simplify_python_error(stderr)
-                print("="*80 + "\n")
+                log_debug("="*80 + "\n")
                 return jsonify({"test_results": [False], "stdout": stdout, "stderr": simplified_error})
 
-            print(f"Code executed successfully")
-            print(f"Stdout length: {len(stdout)} characters")
+            log_debug(f"Code executed successfully")
+            log_debug(f"Stdout length: {len(stdout)} characters")
             if stdout:
-                print(f"Stdout preview: {stdout[:200]}...")
-
-            validation_type = part_data.get("type", "csv_similarity") # Default to csv
-            passed = False
-            message = "Validation failed."
+                log_debug(f"Stdout preview: {stdout[:200]}...")
 
-            print(f"\n[VALIDATION {validation_mode}] Validation Type: {validation_type}")
-
-            if validation_type == 'csv_similarity':
-                passed, message = _handle_csv_similarity(part_data, student_dir, validation_mode)
-            elif validation_type == 'text_similarity':
-                passed, message = _handle_text_similarity(part_data, stdout, validation_mode)
-            elif validation_type == 'numerical_evaluation':
-                passed, message = _handle_numerical_evaluation(part_data, stdout, validation_mode)
+            passed, message = _grade_part_output(part_data, stdout, student_dir, validation_mode)
             
             if not passed and not stderr:
                 stderr = message # Provide a reason for the failure if no kernel error occurred
 
-            print(f"\n[VALIDATION {validation_mode}] Final Result: {'✅ PASSED' if passed else '❌ FAILED'}")
+            log_debug(f"\n[VALIDATION {validation_mode}] Final Result: {'✅ PASSED' if passed else '❌ FAILED'}")
             if not passed:
-                print(f"Failure Reason: {message}")
-            print("="*80 + "\n")
+                log_debug(f"Failure Reason: {message}")
+            log_debug("="*80 + "\n")
 
             test_results.append(passed)
     
     else:
-        print(f"[VALIDATION {validation_mode}] ERROR: No validation logic defined for subject: '{subject}'")
-        print("="*80 + "\n")
+        log_debug(f"[VALIDATION {validation_mode}] ERROR: No validation logic defined for subject: '{subject}'")
+        log_debug("="*80 + "\n")
         return jsonify({'error': f"No validation logic defined for subject: '{subject}'"}), 400
 
     final_passed = any(test_results) if test_results else False
-    print(f"\n[VALIDATION {validation_mode}] COMPLETE")
-    print(f"  Final Status: {'✅ PASSED' if final_passed else '❌ FAILED'}")
-    print(f"  Test Results: {test_results}")
+    log_debug(f"\n[VALIDATION {validation_mode}] COMPLETE")
+    log_debug(f"  Final Status: {'✅ PASSED' if final_passed else '❌ FAILED'}")
+    log_debug(f"  Test Results: {test_results}")
     if stdout:
-        print(f"  Stdout: {stdout[:200]}...")
+        log_debug(f"  Stdout: {stdout[:200]}...")
     if stderr:
-        print(f"  Stderr: {stderr[:200]}...")
-    print("="*80 + "\n")
+        log_debug(f"  Stderr: {stderr[:200]}...")
+    log_debug("="*80 + "\n")
     
     return jsonify({"test_results": test_results, "stdout": stdout, "stderr": _simplify_python_error(stderr)})
 
@@ -716,7 +770,7 @@ def run_cell():
     user_input = data.get('userInput', '')
     username = data.get('username')
     subject = data.get('subject')
-    print(f"DEBUG: Received /run request for session '{session_id}', user '{username}', subject '{subject}'")
+    log_debug(f"DEBUG: Received /run request for session '{session_id}', user '{username}', subject '{subject}'")
 
     if not all([session_id, username, subject]):
         return jsonify({'error': 'Session ID, username, and subject are required.'}), 400
@@ -748,28 +802,197 @@ def run_cell():
         except Exception as e: 
             simplified_error = _simplify_python_error(str(e))
             return jsonify({'stdout': '', 'stderr': simplified_error}), 500
-@evaluation_bp.route('/submit', methods=['POST'])
-def submit_answers():
-    data = request.get_json()
-    session_id, username, subject, level = data.get('sessionId'), data.get('username'), data.get('subject'), data.get('level')
-    answers = data.get('answers', [])
-    
-    student_dir = USER_GENERATED_PATH / username
-    performance_metrics = []
+# --- BACKGROUND SUBMISSION PROCESSING ---
+# Exam pages auto-submit when the countdown hits zero, so a whole cohort submits in the
+# same second. /submit therefore only stores the submission and its progress update;
+# the performance re-runs and kernel shutdown happen on a bounded worker pool. Progress
+# updates from concurrent submits are group-committed: each submit waits until the one
+# users.json write that carries its update has succeeded. A completion is also recorded
+# in the shared registry before it is queued and removed once written, so completions a
+# worker had queued when it died are picked up and written by a live worker.
+SUBMIT_WORKERS = int(os.environ.get("SUBMIT_WORKERS", "4"))
+PROGRESS_FLUSH_INTERVAL_SECONDS = 0.25
+PROGRESS_RETRY_SECONDS = 1.0
+PROGRESS_WRITE_TIMEOUT_SECONDS = 15
+PROGRESS_RECOVERY_INTERVAL_SECONDS = 60
+PENDING_COMPLETION_TTL_SECONDS = 7 * 24 * 60 * 60
+SUBMISSION_STATUS_TTL_SECONDS = 60 * 60
+
+_submission_executor = ThreadPoolExecutor(max_workers=SUBMIT_WORKERS, thread_name_prefix="submit")
+_submission_status: Dict[str, dict] = {}
+_submission_status_lock = threading.Lock()
+
+# (submission_id, username, subject, level_name, Future) waiting to be written. Only the
+# writer thread removes entries, once they are in users.json or have failed; submits
+# append at the end.
+_pending_completions = []
+_pending_completions_lock = threading.Lock()
+_progress_flush_needed = threading.Event()
+_progress_writer = None  # (pid, thread): a worker forked from a parent that had one starts its own
+_process_token = None
+
+
+def _completion_updates(user, subject, level_name, course_config):
+    """Progress updates for passing a level: mark it completed and unlock the next one if locked."""
+    username = user['username']
+    updates = [(username, subject, level_name, 'completed')]
+    next_level = f"level{int(level_name.replace('level', '')) + 1}"
+    if expand_progress(user.get('progress'), course_config).get(subject, {}).get(next_level) == 'locked':
+        updates.append((username, subject, next_level, 'unlocked'))
+    return updates
+
+
+def _flush_pending_completions():
+    """
+    Writes every queued completion to users.json in one pass, then resolves each
+    completion's future with the user as written. On failure the batch stays queued.
+    """
+    with _pending_completions_lock:
+        batch = list(_pending_completions)
+    if not batch:
+        return
+    course_config = load_course_config()
+    results = []
+    with update_json(USERS_FILE_PATH) as doc:
+        users_by_name = {u['username']: u for u in doc.data.get('users', [])}
+        for submission_id, username, subject, level_name, future in batch:
+            # One bad entry must not hold back the rest of the queue: it fails alone and is dropped.
+            try:
+                user = users_by_name.get(username)
+                if user:
+                    # Applied one completion at a time so the next-level check sees earlier ones.
+                    apply_progress_updates(doc.data['users'], _completion_updates(user, subject, level_name, course_config), course_config)
+                    # Snapshot inside the lock: the dicts belong to the document being written.
+                    user = user_for_response(user, course_config)
+                results.append((submission_id, future, user, None))
+            except Exception as e:
+                print(f"Error applying the completion of {subject}/{level_name} for '{username}', dropping it: {e}")
+                results.append((submission_id, future, None, e))
+    with _pending_completions_lock:
+        del _pending_completions[:len(batch)]
+    for submission_id, future, user, error in results:
+        try:
+            delete_state("pending_completions", submission_id)
+        except Exception as e:
+            print(f"Warning: Could not clear the pending completion of submission {submission_id}: {e}")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(user)
+    print(f"[SUBMIT] Wrote {len(batch)} progress update(s) to users.json")
+
+
+def _owner_token():
+    """
+    Owner of this process's "pending_completions" records. The pid alone is not enough:
+    a restarted server in a container often gets the same pid as the one that died.
+    """
+    global _process_token
+    if _process_token is None or not _process_token.startswith(f"{os.getpid()}:"):
+        _process_token = f"{os.getpid()}:{uuid.uuid4().hex}"
+    return _process_token
 
+
+def _recover_pending_completions():
+    """
+    Queues the recorded completions of workers that are gone (their process has exited, or
+    this is a restarted server with the same pid), taking them over for this process.
+    """
+    with _pending_completions_lock:
+        queued = {entry[0] for entry in _pending_completions}
+    recovered = 0
+    for submission_id, record in get_states("pending_completions").items():
+        owner = record.get('owner', '')
+        if submission_id in queued or owner == _owner_token():
+            continue
+        owner_pid = int(owner.split(':')[0]) if owner.split(':')[0].isdigit() else None
+        if owner_pid != os.getpid() and pid_alive(owner_pid):
+            continue
+        # Nobody waits on the future; the student sees the progress on the next login.
+        _queue_level_completion(submission_id, record['username'], record['subject'], record['level'])
+        recovered += 1
+    if recovered:
+        print(f"[SUBMIT] Recovered {recovered} unwritten progress update(s) from stopped workers")
+
+
+def _progress_writer_loop():
+    next_recovery = 0
+    while True:
+        if time.monotonic() >= next_recovery:
+            next_recovery = time.monotonic() + PROGRESS_RECOVERY_INTERVAL_SECONDS
+            try:
+                _recover_pending_completions()
+            except Exception as e:
+                print(f"Warning: Could not recover pending progress updates: {e}")
+        if not _progress_flush_needed.wait(timeout=max(0, next_recovery - time.monotonic())):
+            continue
+        # Give concurrent submits a moment to join the same users.json write.
+        time.sleep(PROGRESS_FLUSH_INTERVAL_SECONDS)
+        _progress_flush_needed.clear()
+        try:
+            _flush_pending_completions()
+        except Exception as e:
+            print(f"Error writing submission progress updates, retrying: {e}")
+            time.sleep(PROGRESS_RETRY_SECONDS)
+            _progress_flush_needed.set()
+
+
+@evaluation_bp.before_app_request
+def _ensure_progress_writer():
+    # Started by the first request of each worker rather than at import (serve.py imports
+    # the app before forking), so a restarted worker recovers lost completions promptly.
+    global _progress_writer
+    if _progress_writer is not None and _progress_writer[0] == os.getpid():
+        return
+    with _pending_completions_lock:
+        if _progress_writer is None or _progress_writer[0] != os.getpid():
+            thread = threading.Thread(target=_progress_writer_loop, name="progress-writer", daemon=True)
+            _progress_writer = (os.getpid(), thread)
+            thread.start()
+
+
+def _queue_level_completion(submission_id, username, subject, level_name):
+    """Queues a passed level for the progress writer; the Future resolves to the written user."""
+    future = Future()
+    with _pending_completions_lock:
+        _pending_completions.append((submission_id, username, subject, level_name, future))
+    _ensure_progress_writer()
+    _progress_flush_needed.set()
+    return future
+
+
+def _set_submission_status(submission_id, **fields):
+    now = time.time()
+    with _submission_status_lock:
+        expired = [sid for sid, entry in _submission_status.items()
+                   if now - entry['updatedAt'] > SUBMISSION_STATUS_TTL_SECONDS]
+        for sid in expired:
+            del _submission_status[sid]
+        entry = _submission_status.setdefault(submission_id, {'submissionId': submission_id})
+        entry.update(fields, updatedAt=now)
+        snapshot = dict(entry)
+    # The student may poll a different server worker than the one running the submission.
+    try:
+        put_state("submissions", submission_id, snapshot, SUBMISSION_STATUS_TTL_SECONDS)
+    except Exception as e:
+        print(f"Warning: Could not publish status of submission {submission_id}: {e}")
+
+
+def _measure_performance(kernel, subject, level, answers, student_dir):
+    """Re-runs every answer once on the first test case input to record time and peak memory."""
+    try:
+        questions_by_id = {q['id']: q for q in read_json(QUESTIONS_BASE_PATH / subject / f"level{level}" / "questions.json")}
+    except Exception:
+        questions_by_id = {}
+
+    performance_metrics = []
     for answer in answers:
         q_id = answer.get('questionId')
         code = answer.get('code', 'pass')
         exec_time, peak_mem = 0.0, 0.0
+        q_data = questions_by_id.get(q_id)
+        first_test_case_input = (q_data.get("test_cases") or [{}])[0].get("input", "") if q_data else ""
 
-        try:
-            q_path = QUESTIONS_BASE_PATH / subject / f"level{level}" / "questions.json"
-            with open(q_path, 'r', encoding='utf-8') as f: all_q = json.load(f)
-            q_data = next((q for q in all_q if q['id'] == q_id), None)
-            first_test_case_input = q_data.get("test_cases", [{}])[0].get("input", "") if q_data else ""
-        except Exception:
-            first_test_case_input = ""
-        
         if subject.lower().replace(" ", "") == 'rprogramming':
             start_time = time.monotonic()
             _, _ = run_r_script(code, user_input=first_test_case_input)
@@ -777,9 +1000,9 @@ def submit_answers():
             exec_time = (end_time - start_time) * 1000
             # Memory tracking is not implemented for R subprocesses
             peak_mem = 0.0
-        
-        elif session_id in USER_KERNELS:
-            _km, kc = USER_KERNELS[session_id]
+
+        elif kernel is not None:
+            _km, kc = kernel
             perf_prefix = "import tracemalloc; tracemalloc.start();"
             perf_suffix = """
 peak_mem = tracemalloc.get_traced_memory()[1] / 1024
@@ -787,61 +1010,307 @@ tracemalloc.stop()
 print(f"__PERF_RESULT__:{peak_mem:.2f}")
 """
             full_perf_code = f"{perf_prefix}\n{code}\n{perf_suffix}"
-            
+
             start_time = time.monotonic()
             stdout, _ = run_code_on_kernel(kc, full_perf_code, user_input=first_test_case_input, working_dir=student_dir)
             end_time = time.monotonic()
-            
+
             exec_time = (end_time - start_time) * 1000
-            
+
             for line in stdout.splitlines():
                 if line.startswith("__PERF_RESULT__:"):
                     try:
                         peak_mem = float(line.split(":")[1])
                     except (ValueError, IndexError):
                         pass
-        else:
-            print(f"Warning: Session {session_id} not found for submission. Skipping performance tests for Python.")
 
         performance_metrics.append({
             "questionId": q_id,
             "execution_time_ms": f"{exec_time:.2f}",
             "peak_memory_kib": f"{peak_mem:.2f}"
         })
+    return performance_metrics
+
+
+def _process_submission(submission_id, kernel, username, subject, level, answers):
+    """Background phase of /submit: performance runs, kernel hand-off for shutdown, stored metrics."""
+    _set_submission_status(submission_id, status='running')
+    performance_metrics, status = [], 'completed'
+    try:
+        if kernel is None and subject.lower().replace(" ", "") != 'rprogramming':
+            print(f"Warning: No session kernel for submission {submission_id}. Skipping performance tests for Python.")
+        performance_metrics = _measure_performance(kernel, subject, level, answers, USER_GENERATED_PATH / username)
+    except Exception as e:
+        print(f"Error measuring performance for submission {submission_id}: {e}")
+        status = 'failed'
+    finally:
+        # The kernel ran this student's code, so it is shut down (on the kernel shutdown
+        # queue; this worker moves on immediately) rather than recycled.
+        release_kernel(kernel)
+
+    try:
+        with update_json(SUBMISSIONS_PATH / f"{username}.json", default=[], reset_invalid=True) as doc:
+            stored = next((sub for sub in doc.data if sub.get('submissionId') == submission_id), None)
+            if stored is not None:
+                stored['performanceStatus'] = status
+                stored['performance_metrics'] = performance_metrics
+    except Exception as e:
+        print(f"Error storing performance metrics for submission {submission_id}: {e}")
+    _set_submission_status(submission_id, status=status, performance_metrics=performance_metrics)
 
-    all_passed = all(ans.get('passed', False) for ans in answers)
+
+@evaluation_bp.route('/submit', methods=['POST'])
+def submit_answers():
+    """
+    Stores the submission and its progress, then returns. `updatedUser` is the user as
+    written to users.json (None if the write is still being retried after
+    PROGRESS_WRITE_TIMEOUT_SECONDS); `performance_metrics` is empty and arrives via the
+    `statusUrl` once the background run has finished.
+    """
+    data = request.get_json()
+    session_id, username, subject, level = data.get('sessionId'), data.get('username'), data.get('subject'), data.get('level')
+    answers = data.get('answers', [])
+    if not all([username, subject, level]):
+        return jsonify({'error': 'Username, subject, and level are required.'}), 400
+    if not str(level).isdigit() or int(level) < 1:
+        return jsonify({'error': 'Level must be a positive integer.'}), 400
+    if not isinstance(answers, list) or not all(isinstance(ans, dict) for ans in answers):
+        return jsonify({'error': 'Answers must be a list of objects.'}), 400
+    level = int(level)
+
+    # A submission without answers has passed nothing.
+    all_passed = bool(answers) and all(ans.get('passed', False) for ans in answers)
     status = 'passed' if all_passed else 'failed'
-    submission = { 'subject': subject, 'level': f"level{level}", 'status': status, 'timestamp': datetime.now().isoformat(), 'answers': answers }
+    submission_id = uuid.uuid4().hex
+    submission = {
+        'submissionId': submission_id, 'subject': subject, 'level': f"level{level}", 'status': status,
+        'timestamp': datetime.now().isoformat(), 'answers': answers, 'performanceStatus': 'pending'
+    }
     user_submission_file = SUBMISSIONS_PATH / f"{username}.json"
-    try:
-        with open(user_submission_file, 'r+', encoding='utf-8') as f:
-            user_submissions = json.load(f); user_submissions.append(submission); f.seek(0); json.dump(user_submissions, f, indent=2)
-    except (FileNotFoundError, json.JSONDecodeError):
-        with open(user_submission_file, 'w', encoding='utf-8') as f: json.dump([submission], f, indent=2)
-    
+    with update_json(user_submission_file, default=[], reset_invalid=True) as doc:
+        doc.data.append(submission)
+
     updated_user = None
     if all_passed:
-        with open(USERS_FILE_PATH, 'r+', encoding='utf-8') as f:
-            users_json = json.load(f)
-            user = next((u for u in users_json['users'] if u['username'] == username), None)
-            if user:
-                if subject not in user['progress']: user['progress'][subject] = {}
-                user['progress'][subject][f"level{level}"] = 'completed'
-                next_level = f"level{int(level) + 1}"
-                if (f"level{int(level) + 1}" in user.get('progress', {}).get(subject, {}) and 
-                    user['progress'][subject][next_level] == 'locked'):
-                    user['progress'][subject][next_level] = 'unlocked'
-                updated_user = {k: v for k, v in user.items() if k != 'password'}
-            f.seek(0); json.dump(users_json, f, indent=2); f.truncate()
-
-    if session_id in USER_KERNELS:
-        km, kc = USER_KERNELS.pop(session_id)
-        if kc.is_alive(): kc.stop_channels()
-        if km.is_alive(): km.shutdown_kernel()
-        
+        # Recorded before the submit is acknowledged, so a worker dying before the write loses nothing.
+        put_state("pending_completions", submission_id,
+                  {'owner': _owner_token(), 'username': username, 'subject': subject, 'level': f"level{level}"},
+                  PENDING_COMPLETION_TTL_SECONDS)
+        completion = _queue_level_completion(submission_id, username, subject, f"level{level}")
+        try:
+            updated_user = completion.result(timeout=PROGRESS_WRITE_TIMEOUT_SECONDS)
+        except FuturesTimeoutError:
+            # Still queued: the writer keeps retrying, the student sees it on the next login.
+            print(f"Warning: Progress for '{username}' not yet written after {PROGRESS_WRITE_TIMEOUT_SECONDS}s")
+
+    # The kernel leaves the session table now so the student can't keep using it.
+    kernel = USER_KERNELS.pop(session_id, None) if session_id else None
+    _set_submission_status(submission_id, status='queued', username=username, performance_metrics=[])
+    _submission_executor.submit(_process_submission, submission_id, kernel, username, subject, level, answers)
+
     return jsonify({
-        'success': True, 
-        'message': "Submission received.", 
+        'success': True,
+        'message': "Submission received.",
+        'submissionId': submission_id,
+        'statusUrl': f"/api/evaluate/submit/{submission_id}?username={quote(username)}",
         'updatedUser': updated_user,
-        'performance_metrics': performance_metrics  
-    }), 200
\ No newline at end of file
+        'performance_metrics': []
+    })
+
+
+@evaluation_bp.route('/submit/<submission_id>', methods=['GET'])
+def get_submission_status(submission_id):
+    """Status of a submission's background phase, with its performance metrics once done."""
+    with _submission_status_lock:
+        entry = dict(_submission_status.get(submission_id) or {})
+    if not entry:
+        entry = get_state("submissions", submission_id) or {}
+    if entry:
+        entry.pop('username', None)
+        return jsonify(entry)
+
+    # Not in memory (e.g. after a restart): fall back to the stored submission.
+    username = request.args.get('username')
+    if username:
+        try:
+            stored = next((sub for sub in read_json(SUBMISSIONS_PATH / f"{username}.json", default=[])
+                           if sub.get('submissionId') == submission_id), None)
+        except json.JSONDecodeError:
+            stored = None
+        if stored:
+            return jsonify({
+                'submissionId': submission_id,
+                'status': stored.get('performanceStatus', 'completed'),
+                'performance_metrics': stored.get('performance_metrics', []),
+            })
+    return jsonify({'error': f'Submission {submission_id} not found.'}), 404
+
+
+# --- BULK VALIDATION (admin) ---
+# Runs every question's reference solution through the same graders students face, on a
+# pool of kernels, and records isValidated for the whole bank in one write. A question's
+# reference solution is its `solution_code` field or the solution.py next to its datasets
+# (e.g. datasets/ml/level_1/M_001/solution.py); questions without one are skipped.
+BULK_VALIDATION_KERNELS = int(os.environ.get("BULK_VALIDATION_KERNELS", "4"))
+BULK_VALIDATION_TIMEOUT_SECONDS = int(os.environ.get("BULK_VALIDATION_TIMEOUT_SECONDS", "300"))
+BULK_VALIDATION_PATH = USER_GENERATED_PATH / "_bulk_validation"
+
+
+def _reference_solution(subject, level, question):
+    if question.get('solution_code'):
+        return question['solution_code']
+    candidates = [DATASETS_BASE_PATH / subject / f"level_{level}" / str(question.get('id')) / "solution.py"]
+    for dataset_path in (question.get('datasets') or {}).values():
+        if isinstance(dataset_path, str) and dataset_path:
+            candidates.append(resolve_data_path(dataset_path).parent / "solution.py")
+    for candidate in candidates:
+        if candidate.is_file():
+            return localize_data_paths(candidate.read_text(encoding='utf-8'))
+    return None
+
+
+def _with_local_solution_files(part_data):
+    """A copy of the part whose solution_file path(s) point at this machine's data directory."""
+    part_data = dict(part_data)
+    solution_files = part_data.get('solution_file')
+    if isinstance(solution_files, list):
+        part_data['solution_file'] = [str(resolve_data_path(f)) for f in solution_files]
+    elif isinstance(solution_files, str) and solution_files:
+        part_data['solution_file'] = str(resolve_data_path(solution_files))
+    return part_data
+
+
+def _validate_with_reference(subject, level, question):
+    """Grades one question's reference solution; returns its report entry."""
+    started = time.monotonic()
+    style = _validation_style(subject.lower().replace(" ", ""), str(level))
+    report = {'questionId': question.get('id'), 'title': question.get('title', ''), 'status': 'skipped',
+              'message': '', 'runSeconds': 0.0, 'seconds': 0.0, 'parts': []}
+    code = _reference_solution(subject, level, question)
+    if code is None:
+        report['message'] = 'No reference solution found.'
+        return report
+
+    work_dir = Path(tempfile.mkdtemp(dir=BULK_VALIDATION_PATH, prefix=f"{question.get('id')}-"))
+    kernel = None
+    try:
+        if style in ('r', 'test_cases'):
+            if style == 'r':
+                run = lambda user_input: run_r_script(code, user_input=user_input)
+            else:
+                kernel = acquire_kernel()
+                run = lambda user_input: run_code_on_kernel(kernel[1], code, user_input=user_input, working_dir=work_dir,
+                                                            timeout=BULK_VALIDATION_TIMEOUT_SECONDS)
+            test_cases = question.get('test_cases', [])
+            results, _stdout, stderr = _grade_test_cases(run, test_cases, "R" if style == 'r' else "PYTHON", "BULK")
+            report['runSeconds'] = round(time.monotonic() - started, 3)
+            passed = bool(results) and all(results)
+            report['message'] = (f"{sum(results)}/{len(test_cases)} test case(s) passed"
+                                 + (f": {_simplify_python_error(stderr)}" if stderr else ""))
+        else:
+            if subject.lower().replace(" ", "") == 'speechrecognition':
+                is_valid, error_message = _validate_input_file(question, code)
+                if not is_valid:
+                    report.update(status='failed', message=error_message)
+                    return report
+            kernel = acquire_kernel()
+            stdout, stderr = run_code_on_kernel(kernel[1], code, working_dir=work_dir, timeout=BULK_VALIDATION_TIMEOUT_SECONDS)
+            report['runSeconds'] = round(time.monotonic() - started, 3)
+            parts = question.get('parts') or [question]
+            for part in parts:
+                part_started = time.monotonic()
+                if stderr:
+                    part_passed, message = False, _simplify_python_error(stderr)
+                else:
+                    part_passed, message = _grade_part_output(_with_local_solution_files(part), stdout, work_dir, "BULK")
+                report['parts'].append({'partId': part.get('part_id'), 'passed': bool(part_passed), 'message': message,
+                                        'seconds': round(time.monotonic() - part_started, 3)})
+            passed = all(p['passed'] for p in report['parts'])
+            report['message'] = f"{sum(p['passed'] for p in report['parts'])}/{len(parts)} part(s) passed"
+        report['status'] = 'passed' if passed else 'failed'
+    except Exception as e:
+        report.update(status='error', message=str(e))
+    finally:
+        if kernel is not None:
+            release_kernel(kernel)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        report['seconds'] = round(time.monotonic() - started, 3)
+    return report
+
+
+def _apply_validation_results(question, report):
+    # Same fields as /api/admin/update-validation-status: multi-part questions are
+    # marked per part, and their own flag follows from the parts (see is_validated).
+    if question.get('parts') and report['parts'] and report['parts'][0]['partId'] is not None:
+        by_part = {p['partId']: p['passed'] for p in report['parts']}
+        for part in question['parts']:
+            if part.get('part_id') in by_part:
+                part['isValidated'] = by_part[part.get('part_id')]
+        question['isValidated'] = is_validated(question)
+    else:
+        question['isValidated'] = report['status'] == 'passed'
+
+
+def _run_bulk_validation(job, subject, level, question_ids, dry_run):
+    started = time.monotonic()
+    questions_file = QUESTIONS_BASE_PATH / subject / f"level{level}" / "questions.json"
+    questions = read_json(questions_file)
+    if question_ids:
+        questions = [q for q in questions if str(q.get('id')) in question_ids]
+    BULK_VALIDATION_PATH.mkdir(parents=True, exist_ok=True)
+    job.update(message=f"Validating {len(questions)} questions...", total=len(questions), done=0)
+
+    reports = [None] * len(questions)
+    counts = {'passed': 0, 'failed': 0, 'skipped': 0, 'error': 0}
+    with ThreadPoolExecutor(max_workers=max(1, min(BULK_VALIDATION_KERNELS, len(questions))),
+                            thread_name_prefix="bulk-validate") as pool:
+        futures = {pool.submit(_validate_with_reference, subject, level, q): i for i, q in enumerate(questions)}
+        for done, future in enumerate(as_completed(futures), 1):
+            report = future.result()
+            reports[futures[future]] = report
+            counts[report['status']] += 1
+            job.update(message=f"Validated {done} of {len(questions)} questions...", done=done, **counts)
+
+    graded = {str(r['questionId']): r for r in reports if r['status'] in ('passed', 'failed')}
+    if graded and not dry_run:
+        # One read-modify-write for the whole bank.
+        with update_json(questions_file, default=[], ensure_ascii=False) as doc:
+            for question in doc.data:
+                report = graded.get(str(question.get('id')))
+                if report:
+                    _apply_validation_results(question, report)
+
+    return {
+        'message': (f"Validated {subject}/level{level}: {counts['passed']} passed, {counts['failed']} failed, "
+                    f"{counts['skipped']} without a reference solution, {counts['error']} errors."),
+        'subject': subject,
+        'level': str(level),
+        'dryRun': dry_run,
+        **counts,
+        'totalSeconds': round(time.monotonic() - started, 3),
+        'questions': reports,
+    }
+
+
+@evaluation_bp.route('/validate/bulk', methods=['POST'])
+def validate_question_bank():
+    """
+    Admin only (X-Admin-Validation: true). Body: {subject, level, questionIds?, dryRun?}.
+    Starts a job that validates the level's questions against their reference solutions;
+    poll GET /api/admin/jobs/<job_id> for progress and the per-question timing report.
+    """
+    if request.headers.get('X-Admin-Validation', 'false').lower() != 'true':
+        return jsonify({'error': 'Bulk validation is only available to admins.'}), 403
+    data = request.get_json(silent=True) or {}
+    subject, level = data.get('subject'), data.get('level')
+    if not subject or not level:
+        return jsonify({'error': 'subject and level are required.'}), 400
+    if not (QUESTIONS_BASE_PATH / subject / f"level{level}" / "questions.json").exists():
+        return jsonify({'error': f"No questions found for {subject}/level{level}."}), 404
+    question_ids = {str(q) for q in data.get('questionIds') or []}
+    job = start_job("Bulk validation", _run_bulk_validation, subject, str(level), question_ids, bool(data.get('dryRun')))
+    return jsonify({
+        'message': 'Bulk validation started.',
+        'jobId': job.id,
+        'statusUrl': f"/api/admin/jobs/{job.id}",
+    }), 202
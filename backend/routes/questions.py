@@ -6,6 +6,10 @@ import json
 from pathlib import Path
 from flask import Blueprint, jsonify, request
 import random
+from utils.storage import read_json, update_json
+from utils.question_counts import get_question_counts
+from utils.compression import catalog_response
+from utils.listing import cached_index
 
 # --- Flask Blueprint Setup ---
 questions_bp = Blueprint('questions_api', __name__)
@@ -23,13 +27,13 @@ def get_all_subjects_and_levels():
     GET all subjects and their levels from the central course_config.json file.
     """
     try:
-        with open(COURSE_CONFIG_PATH, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        structure = {
-            subject: details.get("levels", [])
-            for subject, details in config.items() if isinstance(details, dict)
-        }
-        return jsonify(structure), 200
+        def build_structure():
+            config = read_json(COURSE_CONFIG_PATH)
+            return {
+                subject: details.get("levels", [])
+                for subject, details in config.items() if isinstance(details, dict)
+            }
+        return catalog_response(("questions/structure",), [COURSE_CONFIG_PATH], build_structure)
     except Exception as e:
         print(f"Error fetching question structure: {e}")
         return jsonify({"message": "Failed to fetch question structure."}), 500
@@ -57,39 +61,32 @@ def get_questions_for_level(subject, level):
         # ========================================================
         # ========================================================
 
-        # Check if file is empty
-        if questions_file_path.stat().st_size == 0:
-            return jsonify([]), 200
-
-        with open(questions_file_path, 'r', encoding='utf-8') as f:
-            try:
-                all_questions = json.load(f)
-            except json.JSONDecodeError:
-                # If JSON parsing fails (e.g., empty file), return empty array
-                print(f"Warning: Invalid JSON in {questions_file_path}, returning empty array.")
-                return jsonify([]), 200
-
-        if not all_questions:
-            return jsonify([]), 200
-
-        # --- Load the course config to get the question limit ---
-        with open(COURSE_CONFIG_PATH, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        # --- The question limit comes from the course config, re-read only when it changes ---
+        config = cached_index(("course_config",), [COURSE_CONFIG_PATH], lambda: read_json(COURSE_CONFIG_PATH))
 
         # Correctly read the level-specific limit from the config object
         limit = config.get(subject, {}).get('question_limit', {}).get(level_name)
 
-        # For ML, the limit is the number of projects (usually 1)
-        # For other subjects, it's the number of questions to sample.
-        if limit and isinstance(limit, int) and limit > 0:
-            if len(all_questions) > limit:
-                selected_questions = random.sample(all_questions, limit)
-                print(f"Sampled {limit} of {len(all_questions)} questions for {subject}/{level_name}.")
-                return jsonify(selected_questions), 200
-       
-        # If no limit is set, or if the limit is >= the number of questions, return all
-        print(f"Returning all {len(all_questions)} questions for {subject}/{level_name}.")
-        return jsonify(all_questions), 200
+        # Parsed once per version of the file; neither path below re-reads questions.json.
+        load_questions = lambda: read_json(questions_file_path, default=[])
+        try:
+            # For ML, the limit is the number of projects (usually 1)
+            # For other subjects, it's the number of questions to sample.
+            if limit and isinstance(limit, int) and limit > 0:
+                all_questions = cached_index(("questions", subject, level_name), [questions_file_path], load_questions)
+                if len(all_questions) > limit:
+                    selected_questions = random.sample(all_questions, limit)
+                    print(f"Sampled {limit} of {len(all_questions)} questions for {subject}/{level_name}.")
+                    return jsonify(selected_questions), 200
+
+            # If no limit is set, or if the limit is >= the number of questions, return all.
+            # The whole bank is the same for every student, so its serialized body is reused.
+            print(f"Returning all questions for {subject}/{level_name}.")
+            return catalog_response(("questions", subject, level_name), [questions_file_path], load_questions)
+        except json.JSONDecodeError:
+            # If JSON parsing fails, return empty array
+            print(f"Warning: Invalid JSON in {questions_file_path}, returning empty array.")
+            return jsonify([]), 200
 
     except FileNotFoundError:
         print(f"Question file not found for {subject}/{level_name} at path: {questions_file_path}")
@@ -116,20 +113,12 @@ def add_new_question():
     file_path = QUESTIONS_BASE_PATH / subject / f"level{level}" / "questions.json"
 
     try:
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        questions = []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                questions = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            pass
-       
-        if any(q.get('id') == new_question.get('id') for q in questions):
-            return jsonify({"message": f"Question with ID '{new_question['id']}' already exists."}), 409
+        with update_json(file_path, default=[], reset_invalid=True) as doc:
+            questions = doc.data
+            if any(q.get('id') == new_question.get('id') for q in questions):
+                return jsonify({"message": f"Question with ID '{new_question['id']}' already exists."}), 409
 
-        questions.append(new_question)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(questions, f, indent=2)
+            questions.append(new_question)
 
         return jsonify({"message": "Question added successfully."}), 201
 
@@ -149,11 +138,10 @@ def get_all_questions_for_admin(subject, level):
     print(f"ADMIN FETCH: Attempting to read all questions from: {questions_file_path}")
 
     try:
-        with open(questions_file_path, 'r', encoding='utf-8') as f:
-            all_questions = json.load(f)
-       
-        print(f"ADMIN FETCH: Success! Found {len(all_questions)} questions.")
-        return jsonify(all_questions), 200
+        response = catalog_response(("questions/all", subject, level_name), [questions_file_path],
+                                    lambda: read_json(questions_file_path))
+        print(f"ADMIN FETCH: Success! Served {questions_file_path}.")
+        return response
 
     except FileNotFoundError:
         print(f"ADMIN FETCH: File not found for {subject}/{level_name}")
@@ -173,43 +161,26 @@ def get_subject_question_counts():
         if not COURSE_CONFIG_PATH.exists():
             return jsonify({"message": "Course configuration file not found."}), 404
            
-        with open(COURSE_CONFIG_PATH, 'r', encoding='utf-8') as f:
-            course_config = json.load(f)
+        course_config = read_json(COURSE_CONFIG_PATH)
        
+        subjects = {
+            subject: config for subject, config in course_config.items() if isinstance(config, dict)
+        }
+
+        # Counts come from the precomputed index instead of parsing every questions.json
+        counts = get_question_counts({
+            subject: config.get("levels", []) for subject, config in subjects.items()
+        })
+
         result = {}
-       
-        for subject, config in course_config.items():
-            if not isinstance(config, dict):
-                continue
-               
-            subject_data = {
+
+        for subject, config in subjects.items():
+            level_counts = counts.get(subject, {})
+            result[subject] = {
                 "title": config.get("title", subject.replace("_", " ").title()),
-                "levels": {},
-                "total_questions": 0
+                "levels": level_counts,
+                "total_questions": sum(level_counts.values())
             }
-           
-            # Get all levels for this subject
-            levels = config.get("levels", [])
-            for level_name in levels:
-                questions_file_path = QUESTIONS_BASE_PATH / subject / level_name / "questions.json"
-               
-                question_count = 0
-                if questions_file_path.exists():
-                    try:
-                        # Check if file is not empty
-                        if questions_file_path.stat().st_size > 0:
-                            with open(questions_file_path, 'r', encoding='utf-8') as f:
-                                questions = json.load(f)
-                                if isinstance(questions, list):
-                                    question_count = len(questions)
-                    except (json.JSONDecodeError, Exception) as e:
-                        print(f"Warning: Could not read questions for {subject}/{level_name}: {e}")
-                        question_count = 0
-               
-                subject_data["levels"][level_name] = question_count
-                subject_data["total_questions"] += question_count
-           
-            result[subject] = subject_data
        
         return jsonify(result), 200
        
@@ -4,6 +4,7 @@ import json
 from pathlib import Path
 from flask import Blueprint, jsonify, request
 import os
+from utils.storage import read_json, update_json
 
 # --- Flask Blueprint Setup ---
 # Using a unique name is good practice
@@ -32,25 +33,24 @@ def get_aggregated_submissions():
                 continue
 
             username = user_file.stem
-            with open(user_file, "r", encoding="utf-8") as f:
-                try:
-                    user_submissions = json.load(f)
-                except json.JSONDecodeError:
-                    print(f"Warning: Skipping malformed JSON file for {username}")
-                    continue
+            try:
+                user_submissions = read_json(user_file, default=[])
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping malformed JSON file for {username}")
+                continue
 
-                for sub in user_submissions:
-                    subject, level = sub.get("subject"), sub.get("level")
-                    if not subject or not level:
-                        continue
+            for sub in user_submissions:
+                subject, level = sub.get("subject"), sub.get("level")
+                if not subject or not level:
+                    continue
 
-                    subject_group = aggregated.setdefault(subject, {})
-                    level_list = subject_group.setdefault(level, [])
-                    level_list.append({
-                        "username": username,
-                        "status": sub.get("status", "unknown"),
-                        "timestamp": sub.get("timestamp"),
-                    })
+                subject_group = aggregated.setdefault(subject, {})
+                level_list = subject_group.setdefault(level, [])
+                level_list.append({
+                    "username": username,
+                    "status": sub.get("status", "unknown"),
+                    "timestamp": sub.get("timestamp"),
+                })
 
         for subject in aggregated:
             for level in aggregated[subject]:
@@ -74,15 +74,6 @@ def add_submission():
         return jsonify({"message": "Username required"}), 400
 
     student_file_path = SUBMISSIONS_PATH / f"{username}.json"
-    submissions = []
-
-    if student_file_path.exists() and os.path.getsize(student_file_path) > 0:
-        with open(student_file_path, "r", encoding="utf-8") as f:
-            try:
-                submissions = json.load(f)
-            except json.JSONDecodeError:
-                print(f"Warning: Overwriting malformed JSON for user {username}")
-                submissions = []
 
     # --- Small Improvement: Ensure all data, including answers, is saved ---
     new_submission = {
@@ -92,11 +83,11 @@ def add_submission():
         "timestamp": data.get("timestamp"),
         "answers": data.get("answers", []) # Added this line
     }
-    submissions.append(new_submission)
     # --- End Improvement ---
 
-    with open(student_file_path, "w", encoding="utf-8") as f:
-        json.dump(submissions, f, indent=2)
+    # A malformed file is replaced rather than failing the submission
+    with update_json(student_file_path, default=[], reset_invalid=True) as doc:
+        doc.data.append(new_submission)
 
     return jsonify({"message": "Submission saved"}), 201
 
@@ -116,8 +107,7 @@ def get_student_submissions(username):
         return jsonify([]), 200
 
     try:
-        with open(student_file_path, "r", encoding="utf-8") as f:
-            submissions = json.load(f)
+        submissions = read_json(student_file_path, default=[])
         return jsonify(submissions)
     except json.JSONDecodeError:
         print(f"Error: Malformed JSON in file for user {username}")
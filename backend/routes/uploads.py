@@ -0,0 +1,75 @@
+# backend/routes/uploads.py
+
+from flask import Blueprint, jsonify, request
+from utils.chunked_uploads import (
+    UploadError,
+    create_upload,
+    get_upload_status,
+    write_chunk,
+    finish_upload,
+    abort_upload,
+)
+
+# --- Flask Blueprint Setup ---
+# Registered under /api/admin/uploads. Large dataset files are sent here in chunks
+# first; the add-question routes then reference the finished upload by its ID.
+uploads_bp = Blueprint("uploads_bp", __name__)
+
+
+def _error_response(e):
+    return jsonify({"message": str(e)}), e.status_code
+
+
+# --- Routes ---
+
+@uploads_bp.route("", methods=["POST"])
+def start_upload():
+    """
+    Body: {"filename", "size", "chunkSize"?, "sha256"?}. Answers with the uploadId and the
+    chunk size to use; chunk i covers bytes [i * chunkSize, (i + 1) * chunkSize).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        status = create_upload(data.get("filename"), data.get("size"), data.get("chunkSize"), data.get("sha256"))
+    except UploadError as e:
+        return _error_response(e)
+    status["chunkUrl"] = f"/api/admin/uploads/{status['uploadId']}/chunks/<index>"
+    return jsonify(status), 201
+
+
+@uploads_bp.route("/<upload_id>/chunks/<int:index>", methods=["PUT"])
+def put_chunk(upload_id, index):
+    """Raw chunk bytes as the request body, optionally with an X-Chunk-SHA256 header."""
+    try:
+        status = write_chunk(upload_id, index, request.stream, request.headers.get("X-Chunk-SHA256"))
+    except UploadError as e:
+        return _error_response(e)
+    return jsonify(status), 200
+
+
+@uploads_bp.route("/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Lists the chunks still missing, so an interrupted upload can be resumed."""
+    try:
+        return jsonify(get_upload_status(upload_id)), 200
+    except UploadError as e:
+        return _error_response(e)
+
+
+@uploads_bp.route("/<upload_id>/finish", methods=["POST"])
+def complete_upload(upload_id):
+    try:
+        status = finish_upload(upload_id)
+    except UploadError as e:
+        return _error_response(e)
+    return jsonify(status), 200
+
+
+@uploads_bp.route("/<upload_id>", methods=["DELETE"])
+def cancel_upload(upload_id):
+    try:
+        get_upload_status(upload_id)
+    except UploadError as e:
+        return _error_response(e)
+    abort_upload(upload_id)
+    return jsonify({"message": "Upload cancelled."}), 200
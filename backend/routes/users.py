@@ -1,7 +1,9 @@
 import json
 from pathlib import Path
 from flask import Blueprint, jsonify, request
-import bcrypt
+from utils.password_pool import hash_password
+from utils.storage import read_json, update_json
+from utils.listing import cached_index, wants_listing, listing_params, listing_response, intersect
 
 # --- Flask Blueprint Setup ---
 users_bp = Blueprint('users', __name__)
@@ -13,23 +15,29 @@ COURSE_CONFIG_PATH = BASE_DIR / "data" / "course_config.json"
 
 def load_data_from_file(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f: return json.load(f)
+        return read_json(file_path)
     except (FileNotFoundError, json.JSONDecodeError):
         return {"users": []} if 'users' in str(file_path) else {}
 
-def save_users_to_file(data):
-    with open(USERS_FILE_PATH, 'w', encoding='utf-8') as f: json.dump(data, f, indent=4)
+def update_users_file():
+    """Read-copy-update of users.json under the shared writer lock."""
+    return update_json(USERS_FILE_PATH, default={"users": []}, indent=4)
 
 def create_default_progress():
-    course_config = load_data_from_file(COURSE_CONFIG_PATH)
-    default_progress = {}
-    for subject_key, details in course_config.items():
-        if isinstance(details, dict) and 'levels' in details:
-            levels = details.get("levels", [])
-            if levels:
-                subject_progress = {lvl: "unlocked" if i == 0 else "locked" for i, lvl in enumerate(levels)}
-                default_progress[subject_key] = subject_progress
-    return default_progress
+    # Compact progress (see utils/progressHelper.py): an empty dict means every level of
+    # every course is at its default, derived from course_config when the user is read.
+    return {}
+
+def build_users_index():
+    """Username and role of every user (never the password hash), plus positions by role."""
+    users = [{"username": u.get("username"), "role": u.get("role")}
+             for u in load_data_from_file(USERS_FILE_PATH).get("users", [])]
+    by_role = {}
+    for position, user in enumerate(users):
+        by_role.setdefault(user["role"], []).append(position)
+    return {"users": users, "by_role": by_role, "usernames": [str(u["username"] or "").lower() for u in users]}
+
+USER_LISTING_FILTERS = ("role", "q")
 
 # --- Route for GET (all users) and POST (new user) ---
 @users_bp.route('/', methods=['GET', 'POST'])
@@ -39,38 +47,41 @@ def handle_users():
         new_user_data = request.get_json()
         if not all(k in new_user_data for k in ['username', 'password']):
             return jsonify({"message": "Username and password are required"}), 400
-        users_data = load_data_from_file(USERS_FILE_PATH)
-        users_list = users_data.get("users", [])
-        if any(user['username'] == new_user_data['username'] for user in users_list):
+        if any(user['username'] == new_user_data['username'] for user in load_data_from_file(USERS_FILE_PATH).get("users", [])):
             return jsonify({"message": "A user with this username already exists"}), 409
-        password_bytes = new_user_data['password'].encode('utf-8')
-        salt = bcrypt.gensalt()
-        hashed_password_bytes = bcrypt.hashpw(password_bytes, salt)
+        # Hash outside the lock (on the hashing pool); the file must not stay locked meanwhile.
         new_user = {
             "username": new_user_data['username'],
-            "password": hashed_password_bytes.decode('utf-8'),
+            "password": hash_password(new_user_data['password']),
             "role": new_user_data.get('role', 'student'),
             "progress": create_default_progress()
         }
-        users_list.append(new_user)
-        users_data['users'] = users_list
-        save_users_to_file(users_data)
+        with update_users_file() as doc:
+            users_list = doc.data.setdefault("users", [])
+            if any(user['username'] == new_user['username'] for user in users_list):
+                return jsonify({"message": "A user with this username already exists"}), 409
+            users_list.append(new_user)
         return jsonify({"message": "User created successfully"}), 201
     if request.method == 'GET':
-        users_data = load_data_from_file(USERS_FILE_PATH)
-        sanitized_users = [{"username": u.get("username"), "role": u.get("role")} for u in users_data.get("users", [])]
-        return jsonify(sanitized_users)
+        # Optional listing parameters (see utils/listing.py): page, pageSize, fields, role, q
+        index = cached_index(("users",), [USERS_FILE_PATH], build_users_index)
+        if not wants_listing(request.args, USER_LISTING_FILTERS):
+            return jsonify(index["users"])
+        try:
+            params = listing_params(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        role_positions = index["by_role"].get(request.args['role'], []) if 'role' in request.args else None
+        search = request.args.get('q', '').strip().lower()
+        search_positions = [i for i, name in enumerate(index["usernames"]) if search in name] if search else None
+        return jsonify(listing_response(index["users"], intersect(role_positions, search_positions), params))
 
 # --- FIX: Combined route for PUT (Update) and DELETE ---
 @users_bp.route('/<string:username>', methods=['PUT', 'DELETE'])
 def manage_specific_user(username):
     """Handles updating (PUT) or deleting (DELETE) a specific user."""
-    users_data = load_data_from_file(USERS_FILE_PATH)
-    users_list = users_data.get("users", [])
-    
-    user_index = next((i for i, user in enumerate(users_list) if user['username'] == username), None)
-
-    if user_index is None:
+    users_list = load_data_from_file(USERS_FILE_PATH).get("users", [])
+    if not any(user['username'] == username for user in users_list):
         return jsonify({"message": "User not found"}), 404
 
     # --- Logic for DELETE request ---
@@ -78,26 +89,28 @@ def manage_specific_user(username):
         if username.lower() == 'admin':
             return jsonify({"message": "The primary 'admin' user cannot be deleted."}), 403
         
-        users_list.pop(user_index)
-        users_data['users'] = users_list
-        save_users_to_file(users_data)
+        with update_users_file() as doc:
+            doc.data['users'] = [user for user in doc.data.get("users", []) if user['username'] != username]
         return jsonify({"message": f"User '{username}' was deleted successfully."}), 200
 
     # --- Logic for PUT request ---
     if request.method == 'PUT':
-        user_to_update = users_list[user_index]
         update_data = request.get_json()
         if not update_data:
             return jsonify({"message": "Request body cannot be empty"}), 400
         
-        user_to_update['progress'] = create_default_progress()
-        if 'role' in update_data:
-            user_to_update['role'] = update_data['role']
+        hashed_password = None
         if 'password' in update_data and update_data['password']:
-            password_bytes = update_data['password'].encode('utf-8')
-            salt = bcrypt.gensalt()
-            hashed_password_bytes = bcrypt.hashpw(password_bytes, salt)
-            user_to_update['password'] = hashed_password_bytes.decode('utf-8')
+            hashed_password = hash_password(update_data['password'])
+
+        with update_users_file() as doc:
+            user_to_update = next((user for user in doc.data.get("users", []) if user['username'] == username), None)
+            if user_to_update is None:
+                return jsonify({"message": "User not found"}), 404
+            user_to_update['progress'] = create_default_progress()
+            if 'role' in update_data:
+                user_to_update['role'] = update_data['role']
+            if hashed_password:
+                user_to_update['password'] = hashed_password
 
-        save_users_to_file(users_data)
         return jsonify({"message": f"User '{username}' updated successfully. Progress has been reset."}), 200
\ No newline at end of file
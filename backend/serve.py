@@ -0,0 +1,150 @@
+# backend/serve.py
+"""
+Production entry point: several waitress worker processes sharing one listening socket.
+
+    cd backend
+    python serve.py                            # WEB_WORKERS workers on port 3007
+    python serve.py --workers 4 --threads 16 --port 3007
+
+The parent binds the socket once and forks the workers; each new connection goes to
+whichever worker accepts it first. Kernel sessions, admin jobs and submission status
+are shared through utils/kernel_registry.py, so any worker can serve any request. The
+parent restarts workers that die and stops them all on SIGINT/SIGTERM.
+
+`python app.py` still runs Flask's single-process development server.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", str(min(4, os.cpu_count() or 1))))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", "8"))
+WORKER_STOP_GRACE_SECONDS = 10
+# A worker that dies sooner than this after starting is restarted with a delay.
+WORKER_MIN_UPTIME_SECONDS = 5
+
+
+def bind_socket(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def run_worker(index, sock, threads):
+    """Body of one worker process. Starts its kernel pool, then serves until told to stop."""
+    from waitress import serve
+    from app import app
+    from utils.kernels import prewarm
+    from utils.workspace import start_periodic_gc
+    from utils.lazy import preload
+
+    # SystemExit instead of the default SIGTERM death, so atexit shuts the kernels down.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl+C
+    prewarm()
+    if index == 0:
+        start_periodic_gc()  # one collector for the whole server is enough
+    threading.Thread(target=preload, name="lazy-preload", daemon=True).start()
+    print(f"[SERVER] Worker {index} (pid {os.getpid()}) ready")
+    serve(app, sockets=[sock], threads=threads, ident="AIPZ")
+
+
+def _spawn(index, sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(index, sock, threads)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 0
+        except BaseException as e:
+            print(f"[SERVER] Worker {index} crashed: {e}")
+            code = 1
+        finally:
+            # atexit handlers (kernel shutdown) only run via sys.exit, not os._exit.
+            sys.exit(code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend with multiple worker processes.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "3007")))
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--threads", type=int, default=WEB_THREADS, help="request threads per worker")
+    args = parser.parse_args()
+
+    # Import once before forking: workers start faster and import errors show up here.
+    import app  # noqa: F401
+    from utils.kernel_registry import clear_stale_sessions
+
+    stale = clear_stale_sessions()
+    if stale:
+        print(f"[SERVER] Forgot {stale} session(s) whose kernels are gone")
+    sock = bind_socket(args.host, args.port)
+    print(f"✅ Backend server running on http://{args.host}:{args.port} "
+          f"({args.workers} workers x {args.threads} threads)")
+
+    if not hasattr(os, "fork") or args.workers <= 1:
+        run_worker(0, sock, args.threads)
+        return
+
+    stopping = threading.Event()
+
+    def _stop(signum, _frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    workers = {}  # pid -> (index, started_at)
+    for index in range(args.workers):
+        workers[_spawn(index, sock, args.threads)] = (index, time.monotonic())
+
+    while not stopping.is_set():
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid == 0 or pid not in workers:
+            stopping.wait(0.5)
+            continue
+        index, started_at = workers.pop(pid)
+        print(f"[SERVER] Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+        if time.monotonic() - started_at < WORKER_MIN_UPTIME_SECONDS:
+            stopping.wait(1)  # don't spin if a worker fails on startup
+        if not stopping.is_set():
+            workers[_spawn(index, sock, args.threads)] = (index, time.monotonic())
+
+    print("[SERVER] Stopping workers...")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + WORKER_STOP_GRACE_SECONDS
+    while workers and time.monotonic() < deadline:
+        try:
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            workers.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
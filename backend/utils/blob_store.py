@@ -0,0 +1,181 @@
+# backend/utils/blob_store.py
+"""
+Content-addressed store for dataset files (train/test CSVs, images, audio, solutions).
+
+Every file is kept once under data/blobs/sha256/<ab>/<digest>, and the paths questions
+refer to (data/datasets/<subject>/level_N/<ID>/...) are hardlinks to that blob. Uploading
+the same file again, or reusing it in another subject, costs no extra disk space and no
+extra page cache, while every existing path keeps working unchanged.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from utils.dataset_cache import SHARED_DATASETS_PATH
+
+BASE_DATA_PATH = Path(__file__).resolve().parent.parent / "data"
+BLOB_STORE_PATH = BASE_DATA_PATH / "blobs" / "sha256"
+DATASETS_BASE_PATH = BASE_DATA_PATH / "datasets"
+_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(digest):
+    return BLOB_STORE_PATH / digest[:2] / digest
+
+
+def _hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _adopt_temp_file(temp_path, digest):
+    """Moves a fully written temp file into the store unless that blob already exists."""
+    target = blob_path(digest)
+    if target.exists():
+        os.remove(temp_path)
+        try:
+            os.utime(target)  # stored again: not unreferenced, whatever sweep_unreferenced_blobs() sees
+        except OSError:
+            pass
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(temp_path, 0o444)  # blobs are shared by every link; never edit in place
+        os.replace(temp_path, target)
+    return digest
+
+
+def store_stream(stream):
+    """Copies a binary stream into the store while hashing it; returns the sha256 digest."""
+    BLOB_STORE_PATH.mkdir(parents=True, exist_ok=True)
+    sha = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=BLOB_STORE_PATH, prefix=".upload.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+                sha.update(chunk)
+                out.write(chunk)
+        return _adopt_temp_file(temp_path, sha.hexdigest())
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def store_file(path):
+    """Adds an existing file to the store (copying it) and returns its digest."""
+    with open(path, 'rb') as f:
+        return store_stream(f)
+
+
+def adopt_file(path, digest=None):
+    """
+    Moves a file that is no longer needed at its own path (e.g. an assembled chunked
+    upload) into the store without copying it. Must be on the same filesystem as the store.
+    """
+    BLOB_STORE_PATH.mkdir(parents=True, exist_ok=True)
+    return _adopt_temp_file(path, digest or _hash_file(path))
+
+
+def link_blob(digest, dest_path):
+    """
+    Makes dest_path a hardlink to the blob, replacing whatever was there. Falls back to a
+    copy when the destination is on another filesystem.
+    """
+    dest_path = Path(dest_path)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    source = blob_path(digest)
+    temp_link = dest_path.with_name(f".{dest_path.name}.{digest[:8]}.tmp")
+    if temp_link.exists():
+        os.remove(temp_link)
+    try:
+        os.link(source, temp_link)
+    except OSError:
+        shutil.copyfile(source, temp_link)
+    os.replace(temp_link, dest_path)
+    return dest_path
+
+
+def store_upload(file_storage):
+    """
+    Stores an uploaded werkzeug FileStorage in the blob store and returns its digest.
+    Finished chunked uploads (utils/chunked_uploads.py) are already in the store.
+    """
+    return getattr(file_storage, "digest", None) or store_stream(file_storage.stream)
+
+
+def save_upload(file_storage, dest_path):
+    """
+    store_upload() and a hardlink at dest_path (a drop-in replacement for
+    file_storage.save(dest_path)). Returns the digest.
+    """
+    digest = store_upload(file_storage)
+    link_blob(digest, dest_path)
+    return digest
+
+
+def deduplicate_tree(root=DATASETS_BASE_PATH, progress=None, skip=(SHARED_DATASETS_PATH,)):
+    """
+    Moves every regular file under root into the store and replaces it with a hardlink,
+    so identical files (e.g. the same images under two subjects) share one copy.
+    Directories in `skip` are left alone; by default that is the shared datasets
+    directory, which dataset_cache makes read-only. Returns {"files", "already_linked",
+    "freed_bytes"}.
+    """
+    skip = {Path(p).resolve() for p in skip}
+    summary = {"files": 0, "already_linked": 0, "freed_bytes": 0}
+    for dirpath, dirs, filenames in os.walk(root):
+        dirs[:] = [d for d in dirs if (Path(dirpath) / d).resolve() not in skip]
+        for name in filenames:
+            path = Path(dirpath) / name
+            if path.is_symlink() or name.startswith('.'):
+                continue
+            summary["files"] += 1
+            digest = _hash_file(path)
+            target = blob_path(digest)
+            if target.exists():
+                if os.path.samefile(target, path):
+                    summary["already_linked"] += 1
+                    continue
+                # An identical blob exists: this copy's space is freed once the link is made.
+                if os.stat(path).st_nlink == 1:
+                    summary["freed_bytes"] += path.stat().st_size
+            else:
+                store_file(path)
+            link_blob(digest, path)
+            if progress:
+                progress(summary)
+    return summary
+
+
+def sweep_unreferenced_blobs(min_age_seconds):
+    """
+    Removes blobs no dataset path links to any more (a link count of 1, i.e. only the
+    store's own entry) and leftover temp files. Only blobs untouched for min_age_seconds
+    are removed: an upload is stored before its question links it, and a finished
+    chunked upload may wait for its question until it expires.
+    Returns {"blobs", "freed_bytes"}.
+    """
+    summary = {"blobs": 0, "freed_bytes": 0}
+    if not BLOB_STORE_PATH.exists():
+        return summary
+    cutoff = time.time() - min_age_seconds
+    for dirpath, _dirs, filenames in os.walk(BLOB_STORE_PATH):
+        for name in filenames:
+            path = Path(dirpath) / name
+            try:
+                stat = path.stat()
+                # ctime also moves when a link to the blob is made or removed.
+                if stat.st_nlink != 1 or max(stat.st_mtime, stat.st_ctime) >= cutoff:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            summary["blobs"] += 1
+            summary["freed_bytes"] += stat.st_size
+    return summary
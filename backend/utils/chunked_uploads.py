@@ -0,0 +1,258 @@
+# backend/utils/chunked_uploads.py
+"""
+Resumable, chunked uploads for large dataset files (training CSVs, long .wav files, ...).
+
+The admin UI creates an upload (filename + size), PUTs the file in fixed-size chunks
+(each with an optional X-Chunk-SHA256 header) in any order, asks which chunks are still
+missing after an interruption, and finally finishes the upload. Chunks are written
+straight into data/uploads/<upload_id>/data.part at their offset, so nothing is held in
+memory; finishing moves the assembled file into the blob store (utils/blob_store.py).
+The add-question routes then take `<field>_upload_id` instead of the file itself.
+"""
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+
+from utils.storage import read_json, write_json, update_json
+from utils.blob_store import BASE_DATA_PATH, adopt_file
+
+UPLOADS_PATH = BASE_DATA_PATH / "uploads"
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_UPLOAD_BYTES = int(float(os.environ.get("MAX_UPLOAD_MB", "2048")) * 1024 * 1024)
+# Uploads (finished or not) are forgotten this long after their last chunk.
+UPLOAD_TTL_SECONDS = float(os.environ.get("UPLOAD_TTL_HOURS", "24")) * 3600
+
+_MANIFEST_FILE = "upload.json"
+_PART_FILE = "data.part"
+_READ_SIZE = 1024 * 1024
+_UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """A request the upload API has to refuse; status_code is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FinishedUpload:
+    """
+    A completed upload as seen by the add-question routes. It has the `filename` of a
+    werkzeug FileStorage, and blob_store.save_upload() links its `digest` directly.
+    """
+
+    def __init__(self, upload_id, filename, digest, size):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.digest = digest
+        self.size = size
+
+
+def _upload_dir(upload_id):
+    if not upload_id or not _UPLOAD_ID_PATTERN.match(str(upload_id)):
+        raise UploadError(f"Upload '{upload_id}' not found.", 404)
+    return UPLOADS_PATH / upload_id
+
+
+def _read_manifest(upload_id):
+    manifest_path = _upload_dir(upload_id) / _MANIFEST_FILE
+    try:
+        return read_json(manifest_path)
+    except FileNotFoundError:
+        raise UploadError(f"Upload '{upload_id}' not found.", 404)
+
+
+def _chunk_length(manifest, index):
+    start = index * manifest["chunkSize"]
+    return min(manifest["chunkSize"], manifest["size"] - start)
+
+
+def _status(manifest):
+    received = set(manifest["received"])
+    missing = [i for i in range(manifest["totalChunks"]) if i not in received]
+    return {
+        "uploadId": manifest["uploadId"],
+        "filename": manifest["filename"],
+        "size": manifest["size"],
+        "chunkSize": manifest["chunkSize"],
+        "totalChunks": manifest["totalChunks"],
+        "receivedChunks": len(received),
+        "missingChunks": missing,
+        "status": manifest["status"],
+        "digest": manifest.get("digest"),
+    }
+
+
+def _sweep_expired():
+    if not UPLOADS_PATH.exists():
+        return
+    cutoff = time.time() - UPLOAD_TTL_SECONDS
+    for upload_dir in UPLOADS_PATH.iterdir():
+        try:
+            if upload_dir.is_dir() and upload_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+        except OSError:
+            continue
+
+
+# --- Upload lifecycle ---
+
+def create_upload(filename, size, chunk_size=None, sha256=None):
+    """Registers a new upload and returns its status (including the uploadId)."""
+    filename = os.path.basename(str(filename or "")).strip()
+    if not filename:
+        raise UploadError("A filename is required.")
+    try:
+        size = int(size)
+        chunk_size = int(chunk_size or DEFAULT_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        raise UploadError("size and chunkSize must be integers.")
+    if size <= 0 or size > MAX_UPLOAD_BYTES:
+        raise UploadError(f"size must be between 1 byte and {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.", 413)
+    chunk_size = max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, chunk_size))
+
+    _sweep_expired()
+    upload_id = uuid.uuid4().hex
+    upload_dir = UPLOADS_PATH / upload_id
+    upload_dir.mkdir(parents=True)
+    # Reserve the full size up front so chunks can be written at their offsets in any order.
+    with open(upload_dir / _PART_FILE, 'wb') as f:
+        f.truncate(size)
+    now = time.time()
+    manifest = {
+        "uploadId": upload_id,
+        "filename": filename,
+        "size": size,
+        "chunkSize": chunk_size,
+        "totalChunks": (size + chunk_size - 1) // chunk_size,
+        "sha256": (sha256 or "").lower() or None,
+        "received": [],
+        "status": "uploading",
+        "digest": None,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    write_json(upload_dir / _MANIFEST_FILE, manifest)
+    return _status(manifest)
+
+
+def get_upload_status(upload_id):
+    """Which chunks have arrived; a client resumes by sending the missingChunks."""
+    return _status(_read_manifest(upload_id))
+
+
+def write_chunk(upload_id, index, stream, sha256=None):
+    """
+    Streams one chunk from `stream` to a temp file, checks its length (and, when given,
+    its sha256) and only then copies it to its offset in the part file. The copy happens
+    under the manifest lock, so it can't interleave with finish_upload() hashing and
+    adopting the part file. A chunk that fails its checks counts as missing, even if an
+    earlier copy had arrived, and has to be sent again. Re-sending a good chunk is harmless.
+    """
+    manifest = _read_manifest(upload_id)
+    if manifest["status"] != "uploading":
+        raise UploadError("This upload is already finished.", 409)
+    if not 0 <= index < manifest["totalChunks"]:
+        raise UploadError(f"Chunk index must be between 0 and {manifest['totalChunks'] - 1}.")
+
+    upload_dir = _upload_dir(upload_id)
+    expected_length = _chunk_length(manifest, index)
+    chunk_path = upload_dir / f".chunk.{index}.{uuid.uuid4().hex}.tmp"
+    try:
+        digest = hashlib.sha256()
+        written = 0
+        error = None
+        with open(chunk_path, 'wb') as f:
+            while True:
+                data = stream.read(min(_READ_SIZE, expected_length + 1 - written))
+                if not data:
+                    break
+                written += len(data)
+                if written > expected_length:
+                    error = UploadError(f"Chunk {index} is larger than the expected {expected_length} bytes.")
+                    break
+                digest.update(data)
+                f.write(data)
+        if error is None and written != expected_length:
+            error = UploadError(f"Chunk {index} has {written} bytes, expected {expected_length}.")
+        if error is None and sha256 and digest.hexdigest() != sha256.lower():
+            error = UploadError(f"Chunk {index} failed its checksum; send it again.", 422)
+
+        try:
+            with update_json(upload_dir / _MANIFEST_FILE) as doc:
+                if doc.data["status"] != "uploading":
+                    raise UploadError("This upload is already finished.", 409)
+                if error is not None:
+                    if index in doc.data["received"]:
+                        doc.data["received"].remove(index)
+                        doc.data["updatedAt"] = time.time()
+                else:
+                    _copy_chunk(chunk_path, upload_dir / _PART_FILE, index * manifest["chunkSize"])
+                    if index not in doc.data["received"]:
+                        doc.data["received"].append(index)
+                        doc.data["received"].sort()
+                    doc.data["updatedAt"] = time.time()
+                    return _status(doc.data)
+        except FileNotFoundError:
+            raise UploadError(f"Upload '{upload_id}' not found.", 404)
+        raise error
+    finally:
+        if chunk_path.exists():
+            os.remove(chunk_path)
+
+
+def _copy_chunk(chunk_path, part_path, offset):
+    fd = os.open(part_path, os.O_WRONLY)
+    try:
+        with open(chunk_path, 'rb') as f:
+            for data in iter(lambda: f.read(_READ_SIZE), b''):
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+    finally:
+        os.close(fd)
+
+
+def finish_upload(upload_id):
+    """
+    Checks that every chunk arrived (and the whole-file sha256, if one was given when the
+    upload was created) and moves the file into the blob store. Idempotent.
+    """
+    upload_dir = _upload_dir(upload_id)
+    _read_manifest(upload_id)  # 404 for unknown uploads
+    with update_json(upload_dir / _MANIFEST_FILE) as doc:
+        manifest = doc.data
+        if manifest["status"] == "finished":
+            return _status(manifest)
+        status = _status(manifest)
+        if status["missingChunks"]:
+            raise UploadError(f"{len(status['missingChunks'])} chunk(s) are still missing.", 409)
+
+        part_path = upload_dir / _PART_FILE
+        sha = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for data in iter(lambda: f.read(_READ_SIZE), b''):
+                sha.update(data)
+        digest = sha.hexdigest()
+        if manifest.get("sha256") and manifest["sha256"] != digest:
+            raise UploadError("The assembled file does not match the sha256 given when the upload was created.", 422)
+
+        adopt_file(part_path, digest)
+        manifest.update(status="finished", digest=digest, updatedAt=time.time())
+        return _status(manifest)
+
+def abort_upload(upload_id):
+    shutil.rmtree(_upload_dir(upload_id), ignore_errors=True)
+
+
+def get_finished_upload(upload_id):
+    """Returns a FinishedUpload for a question route, or raises UploadError."""
+    manifest = _read_manifest(upload_id)
+    if manifest["status"] != "finished":
+        raise UploadError(f"Upload '{upload_id}' has not been finished yet.", 409)
+    return FinishedUpload(upload_id, manifest["filename"], manifest["digest"], manifest["size"])
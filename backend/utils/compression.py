@@ -0,0 +1,131 @@
+# backend/utils/compression.py
+"""
+Response compression and cached catalog bodies.
+
+init_app() compresses every JSON/text response of at least COMPRESSION_MIN_BYTES with
+Brotli (if the `brotli` package is installed) or gzip, whichever the client prefers.
+Question lists compress 5-10x; files sent with send_file (images, wav, the frontend
+bundle) are left alone.
+
+Catalog endpoints (question banks, courses) only change when an admin writes the files
+they are read from, so catalog_response() keeps their serialized body, and each
+compressed variant of it, until one of those files changes:
+
+    return catalog_response(("questions", subject, level), [questions_file],
+                            lambda: read_json(questions_file, default=[]))
+
+The files' (inode, size, mtime) is the cache key, so a write by any worker invalidates
+every worker's copy on the next request.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import Response, jsonify, request
+
+from utils.metrics import span
+from utils.storage import file_signature
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+# Catalog bodies are compressed once, so they can afford the strongest settings.
+CATALOG_GZIP_LEVEL = 9
+CATALOG_BROTLI_QUALITY = 11
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/javascript", "image/svg+xml"}
+ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def _compress(data, encoding, catalog=False):
+    with span("response_compress"):
+        if encoding == "br":
+            return brotli.compress(data, quality=CATALOG_BROTLI_QUALITY if catalog else BROTLI_QUALITY)
+        return gzip.compress(data, compresslevel=CATALOG_GZIP_LEVEL if catalog else GZIP_LEVEL, mtime=0)
+
+
+# --- Catalog bodies ---
+
+class CachedBody:
+    """One serialized JSON body and its compressed variants, made on first use."""
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        """The body in `encoding`, or None if it is too small to be worth compressing."""
+        if len(self.body) < COMPRESSION_MIN_BYTES:
+            return None
+        with self._lock:
+            if encoding not in self._encoded:
+                self._encoded[encoding] = _compress(self.body, encoding, catalog=True)
+            return self._encoded[encoding]
+
+
+_catalog = {}  # key -> (signature of the source files, CachedBody)
+_catalog_lock = threading.Lock()
+
+
+def catalog_response(key, sources, build):
+    """
+    A JSON response for build()'s result, re-serialized only when one of the `sources`
+    files has changed. The response carries a weak ETag (one per content, shared by all
+    encodings) and answers If-None-Match with 304.
+    """
+    # Taken before build() reads the files: a write in between only causes a rebuild.
+    signature = tuple(file_signature(p) for p in sources)
+    with _catalog_lock:
+        cached = _catalog.get(key)
+    if cached is None or cached[0] != signature:
+        cached = (signature, CachedBody(jsonify(build()).get_data()))
+        with _catalog_lock:
+            _catalog[key] = cached
+    body = cached[1]
+    response = Response(body.body, mimetype="application/json")
+    response.set_etag(body.etag, weak=True)
+    response.cache_control.no_cache = True  # always revalidate; an unchanged catalog costs a 304
+    response.precompressed = body
+    return response.make_conditional(request)
+
+
+# --- Response compression ---
+
+def _compressible(response):
+    if response.status_code < 200 or response.status_code >= 300 or response.status_code == 206:
+        return False
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return False
+    mimetype = response.mimetype or ""
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def init_app(app):
+    """Compresses large text responses according to the request's Accept-Encoding."""
+
+    @app.after_request
+    def _compress_response(response):
+        if not _compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if not encoding:
+            return response
+        precompressed = getattr(response, "precompressed", None)
+        if precompressed is not None:
+            body = precompressed.encoded(encoding)
+        else:
+            data = response.get_data()
+            body = _compress(data, encoding) if len(data) >= COMPRESSION_MIN_BYTES else None
+        if body is None:
+            return response
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        return response
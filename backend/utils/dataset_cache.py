@@ -0,0 +1,187 @@
+# backend/utils/dataset_cache.py
+"""
+Columnar, memory-mappable copies of the question datasets (train.csv, test.csv, ...).
+
+Every student's kernel used to parse the same CSVs on its own. Here each CSV is
+converted once into one .npy file per column (text columns become integer codes plus
+a category list), stored under data/dataset_cache/. Kernels open those files with
+mmap, so every session shares one page-cache copy and a load takes milliseconds.
+The maps are copy-on-write: a kernel may modify its DataFrame, and only the pages it
+writes become private to it.
+
+This module is also loaded into every kernel (see utils/kernels.py), where it provides
+`load_dataset(path)`, so it must only depend on numpy, pandas and the standard library.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+
+BASE_DATA_PATH = Path(__file__).resolve().parent.parent / "data"
+DATASET_CACHE_PATH = BASE_DATA_PATH / "dataset_cache"
+SHARED_DATASETS_PATH = BASE_DATA_PATH / "datasets" / "shared"
+# Folders that frameworks download into the student's working directory (e.g.
+# torchvision's ./data/MNIST) and that can be shared read-only between students.
+SHARED_STUDENT_DATA = ["MNIST"]
+
+_META_FILE = "meta.json"
+# A quoted path into some machine's backend/data directory inside a piece of code
+_FOREIGN_DATA_PATH_IN_CODE = re.compile(r"""(?<=["'])[^"'\n]*?[/\\]backend[/\\]data[/\\]""")
+_FORMAT_VERSION = 1
+# Shared folders already made read-only by this process
+_protected_shared_data = set()
+
+
+def resolve_data_path(path):
+    """
+    Maps a dataset path stored in questions.json to a file on this machine. Questions
+    created on another machine keep that machine's absolute path, so anything under
+    ".../backend/data/" is looked up in our own data directory instead.
+    """
+    path = Path(path)
+    if path.exists():
+        return path
+    parts = path.parts
+    for i in range(len(parts) - 1):
+        if parts[i] == "backend" and parts[i + 1] == "data":
+            local = BASE_DATA_PATH.joinpath(*parts[i + 2:])
+            if local.exists():
+                return local
+    return path
+
+
+def localize_data_paths(code):
+    """
+    Rewrites quoted ".../backend/data/..." paths in code (e.g. a reference solution written
+    on another machine) to point into our own data directory.
+    """
+    return _FOREIGN_DATA_PATH_IN_CODE.sub(lambda _m: str(BASE_DATA_PATH) + os.sep, code)
+
+
+def _cache_dir_for(csv_path):
+    stat = csv_path.stat()
+    key = f"{csv_path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{_FORMAT_VERSION}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return DATASET_CACHE_PATH / f"{csv_path.stem}-{digest}"
+
+
+def build_dataset_cache(csv_path):
+    """Converts a CSV into the columnar cache (if not done already) and returns the cache dir."""
+    csv_path = resolve_data_path(csv_path)
+    cache_dir = _cache_dir_for(csv_path)
+    if (cache_dir / _META_FILE).exists():
+        return cache_dir
+
+    # numpy and pandas are imported here rather than at module level so that the web
+    # app can import this module without paying for them at startup.
+    import numpy as np
+    import pandas as pd
+
+    frame = pd.read_csv(csv_path)
+    DATASET_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+    build_dir = Path(tempfile.mkdtemp(dir=DATASET_CACHE_PATH, prefix=f".{cache_dir.name}."))
+    try:
+        columns = []
+        for index, name in enumerate(frame.columns):
+            series = frame[name]
+            entry = {"name": name, "file": f"{index}.npy"}
+            if series.dtype.kind in "biuf":
+                np.save(build_dir / entry["file"], series.to_numpy())
+                entry["kind"] = "numeric"
+            elif series.dtype.kind == "M":
+                np.save(build_dir / entry["file"], series.to_numpy())
+                entry["kind"] = "datetime"
+            else:
+                # Text columns: int32 codes (-1 = missing) that can be memory-mapped,
+                # plus the distinct values, which are small.
+                codes, categories = pd.factorize(series)
+                np.save(build_dir / entry["file"], codes.astype(np.int32))
+                entry["kind"] = "categorical"
+                entry["categories"] = categories.tolist()
+            columns.append(entry)
+        meta = {"version": _FORMAT_VERSION, "source": str(csv_path), "rows": len(frame), "columns": columns}
+        with open(build_dir / _META_FILE, "w", encoding="utf-8") as f:
+            json.dump(meta, f, default=str)
+        try:
+            os.rename(build_dir, cache_dir)
+        except OSError:
+            # Someone else finished the same conversion first; theirs is identical.
+            shutil.rmtree(build_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    return cache_dir
+
+
+def load_dataset(path, as_frame=True):
+    """
+    Loads a question dataset CSV through the columnar cache.
+
+        train = load_dataset("/.../datasets/ml/level_1/M_002/train.csv")
+
+    Returns a pandas DataFrame equal to pd.read_csv(path), or {column: numpy array} with
+    as_frame=False. Either way numeric columns are copy-on-write memory maps of the cache,
+    shared with every other kernel until written to; text columns are decoded into
+    object arrays.
+    """
+    import numpy as np
+    import pandas as pd
+
+    cache_dir = build_dataset_cache(path)
+    with open(cache_dir / _META_FILE, encoding="utf-8") as f:
+        meta = json.load(f)
+    data = {}
+    for entry in meta["columns"]:
+        values = np.load(cache_dir / entry["file"], mmap_mode="c")
+        if entry["kind"] == "categorical":
+            categories = np.array(entry["categories"] + [np.nan], dtype=object)
+            values = categories[values]  # code -1 picks the trailing NaN
+        data[entry["name"]] = values
+    if not as_frame:
+        return data
+    # copy=False keeps one block per column instead of consolidating them into a copy.
+    return pd.DataFrame(data, columns=[entry["name"] for entry in meta["columns"]], copy=False)
+
+
+def _make_read_only(tree):
+    """chmods a shared folder to 0555 (directories) / 0444 (files) so no kernel can change it."""
+    for root, dirs, files in os.walk(tree):
+        for name in files:
+            path = os.path.join(root, name)
+            if not os.path.islink(path):
+                os.chmod(path, 0o444)
+        for name in dirs:
+            path = os.path.join(root, name)
+            if not os.path.islink(path):
+                os.chmod(path, 0o555)
+    os.chmod(tree, 0o555)
+
+
+def link_shared_student_data(student_dir):
+    """
+    Points <student_dir>/data/<name> at the shared copy in data/datasets/shared/<name>
+    (e.g. MNIST), so students don't each download and keep their own copy. The shared
+    copy is made read-only first. An existing folder in the student's directory is left
+    alone.
+    """
+    for name in SHARED_STUDENT_DATA:
+        shared = SHARED_DATASETS_PATH / name
+        if not shared.is_dir():
+            continue
+        if name not in _protected_shared_data:
+            try:
+                _make_read_only(shared)
+                _protected_shared_data.add(name)
+            except OSError as e:
+                print(f"Warning: Could not make shared dataset {name} read-only: {e}")
+        link = Path(student_dir) / "data" / name
+        if link.exists() or link.is_symlink():
+            continue
+        try:
+            link.parent.mkdir(parents=True, exist_ok=True)
+            link.symlink_to(shared, target_is_directory=True)
+        except OSError as e:
+            print(f"Warning: Could not link shared dataset {name} into {student_dir}: {e}")
@@ -0,0 +1,243 @@
+# backend/utils/fork_kernel_server.py
+"""
+Fork-server kernels: one template interpreter imports the heavy libraries once and
+every exam kernel is fork()ed from it.
+
+The library pages (numpy, pandas, sklearn, ...) are shared copy-on-write between all
+forked kernels instead of being loaded again by each ipykernel process, and a kernel
+starts in milliseconds because nothing has to be imported. Enable it with
+KERNEL_PROVISIONER=fork; utils/kernels.py then creates ForkedKernelManager instances
+instead of plain KernelManagers.
+
+There is a single template per server process, not one per subject: /session/start only
+carries a sessionId and kernels come from a shared warm pool, so the template preloads the
+union of what the subjects need (FORK_TEMPLATE_PRELOAD_MODULES; add e.g. librosa on a
+server that runs Speech Recognition exams). Libraries outside that list are imported by
+the kernel on first use, as with the "local" provisioner, and are not shared.
+
+The template is this file run as a script. It talks to the server over a unix socket:
+one JSON line in ({"argv", "cwd", "env"}), one JSON line out ({"pid"} or {"error"}).
+"""
+import atexit
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from jupyter_client.manager import KernelManager
+
+# Threaded BLAS/OpenMP pools don't survive fork(); keep them single-threaded in the
+# template (and therefore in every forked kernel).
+_SINGLE_THREAD_ENV = {
+    "OPENBLAS_NUM_THREADS": "1",
+    "OMP_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "NUMEXPR_NUM_THREADS": "1",
+}
+FORK_TEMPLATE_PRELOAD_MODULES = [m for m in os.environ.get(
+    "FORK_TEMPLATE_PRELOAD_MODULES", "numpy,pandas,scipy,sklearn,matplotlib").split(",") if m]
+TEMPLATE_START_TIMEOUT_SECONDS = 120
+FORK_REQUEST_TIMEOUT_SECONDS = 30
+
+
+# --- Template side (runs in the template interpreter) ---
+
+def _child_main(request):
+    """Runs in the forked child: becomes an ipykernel process for one session."""
+    os.setsid()
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    env = dict(request.get("env") or {})
+    env.update(_SINGLE_THREAD_ENV)
+    # ipykernel watches JPY_PARENT_PID and exits when that process goes away.
+    env["JPY_PARENT_PID"] = str(os.getppid())
+    os.environ.clear()
+    os.environ.update(env)
+    if request.get("cwd"):
+        os.chdir(request["cwd"])
+    from ipykernel.kernelapp import IPKernelApp
+    IPKernelApp.launch_instance(argv=request["argv"])
+
+
+def _handle_request(conn, listener):
+    with conn, conn.makefile('rwb') as stream:
+        try:
+            request = json.loads(stream.readline())
+            pid = os.fork()
+        except Exception as e:
+            stream.write((json.dumps({"error": str(e)}) + "\n").encode())
+            stream.flush()
+            return
+        if pid == 0:
+            listener.close()
+            try:
+                _child_main(request)
+            finally:
+                os._exit(0)
+        stream.write((json.dumps({"pid": pid}) + "\n").encode())
+        stream.flush()
+
+
+def serve(socket_path):
+    """Template main loop: preload libraries, then fork a kernel per request."""
+    os.environ.update(_SINGLE_THREAD_ENV)
+    for name in FORK_TEMPLATE_PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except Exception as e:
+            print(f"[FORK SERVER] Could not preload {name}: {e}", file=sys.stderr)
+    # Imported (but not started) here so the forked kernels share its pages too.
+    import ipykernel.kernelapp  # noqa: F401
+
+    # Forked kernels are reaped automatically; the server checks liveness by pid.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    server_pid = os.getppid()
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(64)
+    listener.settimeout(1.0)
+    print(f"[FORK SERVER] Template ready (pid {os.getpid()}), preloaded: {', '.join(FORK_TEMPLATE_PRELOAD_MODULES)}")
+    sys.stdout.flush()
+    while os.getppid() == server_pid:
+        try:
+            conn, _ = listener.accept()
+        except socket.timeout:
+            continue
+        conn.settimeout(None)
+        _handle_request(conn, listener)
+    # The Flask server went away: stop forking. Running kernels notice on their own.
+    listener.close()
+
+
+# --- Server side (runs in the Flask process) ---
+
+_template = None
+_template_socket_path = None
+_template_lock = threading.Lock()
+
+
+def _ensure_template():
+    global _template, _template_socket_path
+    with _template_lock:
+        if _template is not None and _template.poll() is None:
+            return _template_socket_path
+        socket_dir = tempfile.mkdtemp(prefix="kernel-fork-")
+        _template_socket_path = os.path.join(socket_dir, "template.sock")
+        env = dict(os.environ, **_SINGLE_THREAD_ENV)
+        _template = subprocess.Popen([sys.executable, os.path.abspath(__file__), _template_socket_path], env=env)
+        deadline = time.monotonic() + TEMPLATE_START_TIMEOUT_SECONDS
+        while not os.path.exists(_template_socket_path):
+            if _template.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("The kernel fork server failed to start.")
+            time.sleep(0.05)
+        return _template_socket_path
+
+
+def fork_kernel_process(argv, cwd=None, env=None):
+    """Asks the template to fork a kernel started with ipykernel `argv`; returns its pid."""
+    socket_path = _ensure_template()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(FORK_REQUEST_TIMEOUT_SECONDS)
+        for attempt in range(20):
+            try:
+                client.connect(socket_path)
+                break
+            except ConnectionRefusedError:
+                # The socket file appears on bind(), a moment before the template listens.
+                if attempt == 19:
+                    raise
+                time.sleep(0.05)
+        with client.makefile('rwb') as stream:
+            stream.write((json.dumps({"argv": argv, "cwd": cwd, "env": env}) + "\n").encode())
+            stream.flush()
+            reply = json.loads(stream.readline() or "{}")
+    if "pid" not in reply:
+        raise RuntimeError(f"The kernel fork server could not start a kernel: {reply.get('error', 'no reply')}")
+    return reply["pid"]
+
+
+@atexit.register
+def stop_template():
+    global _template
+    with _template_lock:
+        if _template is not None and _template.poll() is None:
+            _template.terminate()
+        _template = None
+
+
+class ForkedProcess:
+    """
+    Just enough of subprocess.Popen for jupyter_client's LocalProvisioner to manage a
+    kernel that isn't our child. The template reaps it, so liveness is checked by pid.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+        self.stdin = self.stdout = self.stderr = None
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, 0)
+            except ProcessLookupError:
+                self.returncode = 0
+            except PermissionError:
+                pass
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() > deadline:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, signum):
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+def _ipykernel_argv(kernel_cmd):
+    # kernel_cmd is the kernelspec argv, e.g. [python, -m, ipykernel_launcher, -f, <file>];
+    # the forked child only needs the arguments for IPKernelApp.
+    if "ipykernel_launcher" in kernel_cmd:
+        return kernel_cmd[kernel_cmd.index("ipykernel_launcher") + 1:]
+    return kernel_cmd[kernel_cmd.index("-f"):]
+
+
+class ForkedKernelManager(KernelManager):
+    """A KernelManager whose kernel process is forked from the template interpreter."""
+
+    async def _async_launch_kernel(self, kernel_cmd, **kw):
+        cwd = str(kw.get("cwd") or os.getcwd())
+        pid = fork_kernel_process(_ipykernel_argv(kernel_cmd), cwd=cwd, env=kw.get("env"))
+        provisioner = self.provisioner
+        provisioner.process = ForkedProcess(pid)
+        provisioner.pid = pid
+        provisioner.pgid = pid  # the child calls setsid()
+        provisioner.cwd = cwd
+        self._reconcile_connection_info(provisioner.connection_info)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -0,0 +1,135 @@
+# backend/utils/jobs.py
+"""
+In-memory registry for long-running admin jobs (bulk imports and the like).
+
+A route starts a job with start_job(), answers 202 with the job ID right away and the
+admin UI polls GET /api/admin/jobs/<job_id> for progress. A job runs in the process that
+started it; its status is also written to the kernel registry database so the poll can be
+answered by any server worker (see serve.py). Finished jobs are forgotten after JOB_TTL_SECONDS.
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.kernel_registry import put_state, get_state
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_TTL_SECONDS = 60 * 60
+# Progress updates reach the other workers at most this often; start and finish always do.
+JOB_PUBLISH_INTERVAL_SECONDS = 0.5
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="admin-job")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class Job:
+    """Progress handle passed to the job function. All updates are thread-safe."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.message = "Waiting to start."
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._published_at = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, message=None, **progress):
+        with self._lock:
+            if message is not None:
+                self.message = message
+            self.progress.update(progress)
+            self.updated_at = time.time()
+        self._publish()
+
+    def _start(self):
+        with self._lock:
+            self.status = "running"
+            self.message = "Running."
+            self.updated_at = time.time()
+        self._publish(force=True)
+
+    def _finish(self, status, message, result=None, error=None):
+        with self._lock:
+            self.status = status
+            self.message = message
+            self.result = result
+            self.error = error
+            self.updated_at = time.time()
+        self._publish(force=True)
+
+    def _publish(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._published_at < JOB_PUBLISH_INTERVAL_SECONDS:
+            return
+        self._published_at = now
+        try:
+            put_state("jobs", self.id, self.to_dict(), JOB_TTL_SECONDS)
+        except Exception as e:
+            print(f"Warning: Could not publish status of job {self.id}: {e}")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "jobId": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "message": self.message,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "createdAt": self.created_at,
+                "updatedAt": self.updated_at,
+            }
+
+
+def _prune_finished_jobs():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with _jobs_lock:
+        for job_id in [j.id for j in _jobs.values()
+                       if j.status in ("completed", "failed") and j.updated_at < cutoff]:
+            del _jobs[job_id]
+
+
+def _run(job, fn, args, kwargs):
+    job._start()
+    try:
+        result = fn(job, *args, **kwargs)
+        message = result.get("message", "Done.") if isinstance(result, dict) else "Done."
+        job._finish("completed", message, result=result)
+    except Exception as e:
+        print(f"Error in {job.kind} job {job.id}: {e}")
+        traceback.print_exc()
+        job._finish("failed", f"{job.kind} failed: {e}", error=str(e))
+
+
+def start_job(kind, fn, *args, **kwargs):
+    """
+    Runs fn(job, *args, **kwargs) on the job executor and returns the Job.
+    Whatever fn returns becomes the job's `result`; a "message" key in it is shown to the admin.
+    """
+    _prune_finished_jobs()
+    job = Job(kind)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    job._publish(force=True)
+    _executor.submit(_run, job, fn, args, kwargs)
+    return job
+
+
+def get_job(job_id):
+    """Returns the job's status dict, or None if the ID is unknown (or expired)."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job:
+        return job.to_dict()
+    # Started by another server worker
+    return get_state("jobs", job_id)
@@ -0,0 +1,385 @@
+# backend/utils/kernel_registry.py
+"""
+Kernel sessions shared between server worker processes.
+
+Under `python app.py` there is one process and /session/start could keep the session's
+(km, kc) pair in a dict. serve.py runs several worker processes and any of them may get
+the next request for a session, so the session table lives in a small SQLite database
+instead (data/runtime/kernel_registry.sqlite3): session ID -> the kernel's connection
+info (ports and HMAC key, i.e. the content of its connection file) and pid. A worker that
+did not start the kernel attaches its own client over those ports; kernels accept any
+number of clients and every execution is matched to its reply by msg_id.
+
+Each worker keeps its own clients (and, for kernels it started, the KernelManager) in
+memory. When another worker ends or replaces a session, a sweep thread in every worker
+notices the missing or changed row within SESSION_SWEEP_INTERVAL_SECONDS and lets go of
+its side: clients are closed, and kernels this worker started are shut down and reaped.
+
+The same database holds small JSON status records (admin jobs, submission status) that
+a client may poll on any worker; see put_state() / get_state().
+"""
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils.lazy import lazy_import
+
+# Imported when a worker first attaches to another worker's kernel
+jupyter_blocking = lazy_import("jupyter_client.blocking")
+
+BASE_DATA_PATH = Path(__file__).resolve().parent.parent / "data"
+REGISTRY_PATH = Path(os.environ.get("KERNEL_REGISTRY_PATH", BASE_DATA_PATH / "runtime" / "kernel_registry.sqlite3"))
+KERNEL_ATTACH_TIMEOUT_SECONDS = 10
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.environ.get("SESSION_SWEEP_INTERVAL_SECONDS", "30"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kernel_sessions (
+    scope TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    connection_info TEXT NOT NULL,
+    connection_file TEXT,
+    kernel_pid INTEGER,
+    owner_pid INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (scope, session_id)
+);
+CREATE TABLE IF NOT EXISTS shared_state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _connect():
+    """A new autocommit connection; SQLite connections are not shared between threads."""
+    global _schema_ready
+    REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(REGISTRY_PATH, timeout=10, isolation_level=None)
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                _schema_ready = True
+    return conn
+
+
+def pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # An exited kernel whose owner hasn't reaped it yet still answers signal 0.
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+
+# --- Kernels owned by another worker ---
+
+class AttachedKernelManager:
+    """
+    Stands in for the KernelManager of a kernel another worker started, with the methods
+    utils/kernels.py calls. The kernel is only reachable by pid and over its ports.
+    """
+
+    def __init__(self, pid, connection_file=None):
+        self.pid = pid
+        self.connection_file = connection_file
+
+    def is_alive(self):
+        return pid_alive(self.pid)
+
+    def request_shutdown(self, restart=False):
+        self._signal(signal.SIGTERM)
+
+    def finish_shutdown(self, waittime=None, pollinterval=0.1, restart=False):
+        self._signal(signal.SIGKILL)
+
+    def shutdown_kernel(self, now=False, restart=False):
+        self._signal(signal.SIGKILL if now else signal.SIGTERM)
+
+    def cleanup_resources(self, restart=False):
+        if self.connection_file:
+            try:
+                os.remove(self.connection_file)
+            except OSError:
+                pass
+
+    def _signal(self, signum):
+        try:
+            if self.pid:
+                os.kill(self.pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def _connection_info(km):
+    info = dict(km.get_connection_info())
+    if isinstance(info.get("key"), bytes):
+        info["key"] = info["key"].decode("ascii")
+    return info
+
+
+def _kernel_pid(km):
+    return getattr(getattr(km, "provisioner", None), "pid", None) or getattr(km, "pid", None)
+
+
+def _attach(row):
+    info = json.loads(row["connection_info"])
+    kc = jupyter_blocking.BlockingKernelClient()
+    kc.load_connection_info(info)
+    kc.start_channels()
+    try:
+        kc.wait_for_ready(timeout=KERNEL_ATTACH_TIMEOUT_SECONDS)
+    except Exception:
+        kc.stop_channels()
+        raise
+    return AttachedKernelManager(row["kernel_pid"], row["connection_file"]), kc
+
+
+# --- Session tables ---
+
+_tables = []  # every SessionKernels of this process, for the sweep thread
+_sweep_thread = None
+_sweep_lock = threading.Lock()
+
+
+def _start_sweeper():
+    # Started by the first kernel a worker holds, not at import: serve.py imports the app
+    # before forking, and threads don't survive fork().
+    global _sweep_thread
+    with _sweep_lock:
+        if _sweep_thread is None or not _sweep_thread.is_alive():
+            _sweep_thread = threading.Thread(target=_sweep_loop, name="kernel-session-sweep", daemon=True)
+            _sweep_thread.start()
+
+
+def _sweep_loop():
+    while True:
+        time.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+        for table in list(_tables):
+            try:
+                table.prune()
+            except Exception as e:
+                print(f"Warning: Could not prune kernel sessions of {table.scope}: {e}")
+
+
+class SessionKernels:
+    """
+    The session ID -> (km, kc) table of one blueprint, backed by the registry. Supports
+    the dict operations the routes use (`in`, [], []=, pop, get), so a kernel registered
+    by one worker can be used and released from any other.
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+        # session_id -> (created_at, kernel) for kernels this process started or attached to
+        self._kernels = {}
+        self._lock = threading.Lock()
+        _tables.append(self)
+
+    def _row(self, conn, session_id):
+        conn.row_factory = sqlite3.Row
+        return conn.execute(
+            "SELECT * FROM kernel_sessions WHERE scope = ? AND session_id = ?", (self.scope, session_id)
+        ).fetchone()
+
+    def _lookup(self, session_id):
+        with self._lock:
+            conn = _connect()
+            try:
+                row = self._row(conn, session_id)
+                cached = self._kernels.get(session_id)
+                if cached and row is not None and cached[0] == row["created_at"]:
+                    return cached[1]
+                if cached:
+                    # The session ended or got a new kernel elsewhere (e.g. a reset).
+                    _discard(self._kernels.pop(session_id)[1])
+                if row is None:
+                    return None
+                if not pid_alive(row["kernel_pid"]):
+                    conn.execute("DELETE FROM kernel_sessions WHERE scope = ? AND session_id = ? AND created_at = ?",
+                                 (self.scope, session_id, row["created_at"]))
+                    return None
+            finally:
+                conn.close()
+            try:
+                kernel = _attach(row)
+            except Exception as e:
+                print(f"Warning: Could not attach to kernel for session {session_id}: {e}")
+                return None
+            self._kernels[session_id] = (row["created_at"], kernel)
+        _start_sweeper()
+        return kernel
+
+    def __contains__(self, session_id):
+        return self._lookup(session_id) is not None
+
+    def __getitem__(self, session_id):
+        kernel = self._lookup(session_id)
+        if kernel is None:
+            raise KeyError(session_id)
+        return kernel
+
+    def get(self, session_id, default=None):
+        kernel = self._lookup(session_id)
+        return default if kernel is None else kernel
+
+    def __setitem__(self, session_id, kernel):
+        km, _kc = kernel
+        created_at = time.time()
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO kernel_sessions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.scope, session_id, json.dumps(_connection_info(km)), getattr(km, "connection_file", None),
+                 _kernel_pid(km), os.getpid(), created_at),
+            )
+        finally:
+            conn.close()
+        with self._lock:
+            self._kernels[session_id] = (created_at, kernel)
+        _start_sweeper()
+
+    def pop(self, session_id, *default):
+        """Removes the session from the registry and returns its kernel for release."""
+        kernel = self._lookup(session_id)
+        # Forgotten locally before the row goes, so prune() never discards a popped kernel.
+        with self._lock:
+            self._kernels.pop(session_id, None)
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM kernel_sessions WHERE scope = ? AND session_id = ?", (self.scope, session_id))
+        finally:
+            conn.close()
+        if kernel is None:
+            if default:
+                return default[0]
+            raise KeyError(session_id)
+        return kernel
+
+
+    def prune(self):
+        """
+        Lets go of the kernels of sessions another worker has ended or given a new kernel
+        (their row is gone or has a different created_at). Returns how many.
+        """
+        with self._lock:
+            if not self._kernels:
+                return 0
+            conn = _connect()
+            try:
+                current = dict(conn.execute("SELECT session_id, created_at FROM kernel_sessions WHERE scope = ?",
+                                            (self.scope,)).fetchall())
+            finally:
+                conn.close()
+            gone = [sid for sid, (created_at, _kernel) in self._kernels.items() if current.get(sid) != created_at]
+            kernels = [self._kernels.pop(sid)[1] for sid in gone]
+        for kernel in kernels:
+            _discard(kernel)
+        return len(kernels)
+
+
+def _stop_client(kernel):
+    try:
+        kernel[1].stop_channels()
+    except Exception:
+        pass
+
+
+def _discard(kernel):
+    """Frees this worker's side of a kernel whose session now belongs to no one here."""
+    if isinstance(kernel[0], AttachedKernelManager):
+        # Only our client; the worker that started the kernel owns the process.
+        _stop_client(kernel)
+    else:
+        # Ours: the shutdown queue stops the client, ends the process if it is still
+        # running, reaps it and calls km.cleanup_resources(). Imported here because
+        # utils.kernels imports utils.metrics, which imports this module.
+        from utils.kernels import release_kernel
+        release_kernel(kernel)
+
+
+def clear_stale_sessions():
+    """Forgets sessions whose kernel process is gone (e.g. after a restart). Returns how many."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT scope, session_id, kernel_pid FROM kernel_sessions").fetchall()
+        stale = [(scope, sid) for scope, sid, pid in rows if not pid_alive(pid)]
+        conn.executemany("DELETE FROM kernel_sessions WHERE scope = ? AND session_id = ?", stale)
+    finally:
+        conn.close()
+    return len(stale)
+
+
+def registry_stats():
+    """Session counts per scope and per owning worker, for the admin dashboard."""
+    conn = _connect()
+    try:
+        by_scope = dict(conn.execute("SELECT scope, COUNT(*) FROM kernel_sessions GROUP BY scope").fetchall())
+        by_worker = {str(pid): n for pid, n in
+                     conn.execute("SELECT owner_pid, COUNT(*) FROM kernel_sessions GROUP BY owner_pid").fetchall()}
+    finally:
+        conn.close()
+    return {"sessions": sum(by_scope.values()), "sessions_by_scope": by_scope, "sessions_by_worker": by_worker}
+
+
+# --- Shared status records ---
+
+def put_state(namespace, key, value, ttl_seconds):
+    """Stores a JSON-serialisable value readable from every worker for ttl_seconds."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM shared_state WHERE namespace = ? AND expires_at < ?", (namespace, now))
+        conn.execute("INSERT OR REPLACE INTO shared_state VALUES (?, ?, ?, ?)",
+                     (namespace, key, json.dumps(value, default=str), now + ttl_seconds))
+    finally:
+        conn.close()
+
+
+def get_state(namespace, key):
+    """The value stored by put_state(), or None if unknown or expired."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT value FROM shared_state WHERE namespace = ? AND key = ? AND expires_at >= ?",
+                           (namespace, key, time.time())).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+
+def delete_state(namespace, key):
+    """Removes a record stored by put_state() (no-op if there is none)."""
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key))
+    finally:
+        conn.close()
+
+
+def get_states(namespace):
+    """{key: value} of every unexpired record in the namespace."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT key, value FROM shared_state WHERE namespace = ? AND expires_at >= ?",
+                            (namespace, time.time())).fetchall()
+    finally:
+        conn.close()
+    return {key: json.loads(value) for key, value in rows}
@@ -0,0 +1,326 @@
+# backend/utils/kernels.py
+"""
+Kernel lifecycle for the exam sessions.
+
+- acquire_kernel() hands out a ready (km, kc) pair, taken from a small warm pool when one
+  is available so /session/start doesn't wait for a kernel to boot.
+- release_kernel() never blocks the caller: it puts the kernel on a shutdown queue. A
+  background thread asks every queued kernel to shut down at once, gives them
+  KERNEL_SHUTDOWN_GRACE_SECONDS to exit and then SIGKILLs whatever is left.
+- reset_kernel() returns a session's kernel to the state it booted in (user globals,
+  builtins, working directory, sys.path, environment, student-imported modules) in
+  milliseconds, e.g. between questions.
+
+Only kernels that have never run student code are pooled. A kernel is never handed to
+another session, however well it was reset: student code can leave state behind that no
+reset sees (threads, open files, patched C-level state), and it must not reach the next
+student.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+from utils.lazy import lazy_import
+from utils.metrics import span, inc, register_gauges
+
+# Imported when the first kernel starts (see utils/lazy.py)
+jupyter_manager = lazy_import("jupyter_client.manager")
+
+# "fork" starts kernels from a preloaded template interpreter (see utils/fork_kernel_server.py)
+KERNEL_PROVISIONER = os.environ.get("KERNEL_PROVISIONER", "local")
+
+WARM_KERNEL_POOL_SIZE = int(os.environ.get("WARM_KERNEL_POOL_SIZE", "2"))
+KERNEL_READY_TIMEOUT_SECONDS = 60
+KERNEL_SHUTDOWN_GRACE_SECONDS = float(os.environ.get("KERNEL_SHUTDOWN_GRACE_SECONDS", "5"))
+KERNEL_RESET_TIMEOUT_SECONDS = 10
+# Imported once when a kernel boots and kept across resets.
+KERNEL_PRELOAD_MODULES = [m for m in os.environ.get("KERNEL_PRELOAD_MODULES", "numpy,pandas").split(",") if m]
+
+_warm_pool = deque()
+_warm_pool_lock = threading.Lock()
+_refill_lock = threading.Lock()
+
+_shutdown_queue = deque()
+_shutdown_queue_lock = threading.Lock()
+_shutdown_needed = threading.Event()
+_shutdown_thread = None
+
+_RESET_OK_MARKER = "__KERNEL_RESET_OK__"
+
+_DATASET_CACHE_MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset_cache.py")
+
+# Runs once in every new kernel: preloads the shared libraries and the load_dataset()
+# helper, then records what a clean kernel looks like. The snapshot lives on the sys
+# module so clearing globals keeps it.
+_BOOTSTRAP_CODE = """
+import builtins as _b, os as _os, sys as _sys, importlib as _il, importlib.util as _ilu
+def _kernel_preload(names):
+    for name in names:
+        try:
+            _il.import_module(name)
+        except Exception as e:
+            print(f"Could not preload {{name}}: {{e}}", file=_sys.stderr)
+_kernel_preload({preload!r})
+try:
+    _spec = _ilu.spec_from_file_location("dataset_cache", {dataset_cache!r})
+    _module = _ilu.module_from_spec(_spec)
+    _spec.loader.exec_module(_module)
+    _sys.modules["dataset_cache"] = _module
+    _b.load_dataset = _module.load_dataset
+    del _spec, _module
+except Exception as _e:
+    print(f"Could not load the dataset helper: {{_e}}", file=_sys.stderr)
+_sys._kernel_clean_state = {{
+    "builtins": dict(vars(_b)),
+    "cwd": _os.getcwd(),
+    "path": list(_sys.path),
+    "environ": dict(_os.environ),
+    "modules": set(_sys.modules),
+}}
+del _b, _os, _sys, _il, _ilu, _kernel_preload
+"""
+
+# Brings a used kernel back to the snapshot taken by _BOOTSTRAP_CODE. Modules that live
+# outside the interpreter's own library directories (i.e. the student's own .py files)
+# are unloaded; installed libraries stay imported, since C extensions such as numpy
+# cannot be safely imported a second time in one process.
+_RESET_CODE = """
+def _kernel_reset():
+    import builtins, gc, os, sys, sysconfig
+    state = sys._kernel_clean_state
+    get_ipython().reset(new_session=False)
+    for name in list(vars(builtins)):
+        if name not in state["builtins"]:
+            delattr(builtins, name)
+    for name, value in state["builtins"].items():
+        setattr(builtins, name, value)
+    os.chdir(state["cwd"])
+    sys.path[:] = state["path"]
+    os.environ.clear()
+    os.environ.update(state["environ"])
+    library_dirs = tuple(os.path.realpath(p) for p in {{
+        sysconfig.get_paths()["stdlib"], sysconfig.get_paths()["platstdlib"],
+        sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"], sys.prefix, sys.base_prefix,
+    }})
+    for name in list(sys.modules):
+        if name in state["modules"]:
+            continue
+        origin = getattr(sys.modules.get(name), "__file__", None)
+        if origin and not os.path.realpath(origin).startswith(library_dirs):
+            del sys.modules[name]
+    if "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close("all")
+    gc.collect()
+    print("{marker}")
+_kernel_reset()  # the reset also removes _kernel_reset itself from the namespace
+"""
+
+
+def _execute(kc, code, timeout):
+    """Runs code on a kernel and returns (stdout, stderr); stderr notes a timeout."""
+    msg_id = kc.execute(code, store_history=False)
+    stdout, stderr = [], []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            msg = kc.get_iopub_msg(timeout=1)
+        except Empty:
+            continue
+        if msg.get('parent_header', {}).get('msg_id') != msg_id:
+            continue
+        msg_type, content = msg['header']['msg_type'], msg.get('content', {})
+        if msg_type == 'stream':
+            (stdout if content.get('name') == 'stdout' else stderr).append(content.get('text', ''))
+        elif msg_type == 'error':
+            stderr.append('\n'.join(content.get('traceback', [])))
+        elif msg_type == 'status' and content.get('execution_state') == 'idle':
+            return "".join(stdout), "".join(stderr)
+    stderr.append(f"Timed out after {timeout} seconds.")
+    return "".join(stdout), "".join(stderr)
+
+
+# --- Starting kernels ---
+
+def start_new_kernel():
+    """Boots a fresh kernel and returns a connected (km, kc) pair."""
+    if KERNEL_PROVISIONER == "fork":
+        from utils.fork_kernel_server import ForkedKernelManager
+        km = ForkedKernelManager()
+    else:
+        km = jupyter_manager.KernelManager()
+    km.start_kernel()
+    try:
+        kc = km.client()
+        kc.start_channels()
+        kc.wait_for_ready(timeout=KERNEL_READY_TIMEOUT_SECONDS)
+        _, stderr = _execute(kc, _BOOTSTRAP_CODE.format(preload=KERNEL_PRELOAD_MODULES, dataset_cache=_DATASET_CACHE_MODULE_PATH), KERNEL_READY_TIMEOUT_SECONDS)
+        if stderr:
+            print(f"Warning: Kernel bootstrap reported: {stderr[:300]}")
+    except Exception:
+        if km.is_alive(): km.shutdown_kernel(now=True)
+        raise
+    return km, kc
+
+
+def _is_usable(kernel):
+    km, kc = kernel
+    try:
+        return km.is_alive() and kc.is_alive()
+    except Exception:
+        return False
+
+
+def _refill_warm_pool():
+    # Only one refill runs at a time; the others return immediately.
+    if not _refill_lock.acquire(blocking=False):
+        return
+    try:
+        while True:
+            with _warm_pool_lock:
+                if len(_warm_pool) >= WARM_KERNEL_POOL_SIZE:
+                    return
+            try:
+                kernel = start_new_kernel()
+            except Exception as e:
+                print(f"Warning: Could not start a kernel for the warm pool: {e}")
+                return
+            with _warm_pool_lock:
+                _warm_pool.append(kernel)
+    finally:
+        _refill_lock.release()
+
+
+def prewarm():
+    """Fills the warm pool in the background (no-op when WARM_KERNEL_POOL_SIZE is 0)."""
+    if WARM_KERNEL_POOL_SIZE > 0:
+        threading.Thread(target=_refill_warm_pool, name="kernel-prewarm", daemon=True).start()
+
+
+def acquire_kernel():
+    """Returns a ready (km, kc) pair, preferring an idle kernel from the warm pool."""
+    with span("kernel_acquire"):
+        kernel = None
+        while kernel is None:
+            with _warm_pool_lock:
+                if not _warm_pool:
+                    break
+                candidate = _warm_pool.popleft()
+            if _is_usable(candidate):
+                kernel = candidate
+            else:
+                release_kernel(candidate)
+        prewarm()
+        inc("aipz_kernel_acquire_total", source="warm" if kernel is not None else "cold")
+        return kernel if kernel is not None else start_new_kernel()
+
+
+# --- Resetting and releasing kernels ---
+
+def reset_kernel(kernel, timeout=KERNEL_RESET_TIMEOUT_SECONDS):
+    """
+    Clears everything student code left behind in the kernel: user globals, patched
+    builtins (e.g. the mocked input()), cwd, sys.path, environment variables and modules
+    imported from the student's own files. Returns True if the kernel is clean again.
+    """
+    km, kc = kernel
+    try:
+        if not _is_usable(kernel):
+            return False
+        with span("kernel_reset"):
+            stdout, stderr = _execute(kc, _RESET_CODE.format(marker=_RESET_OK_MARKER), timeout)
+    except Exception as e:
+        print(f"Warning: Kernel reset failed: {e}")
+        return False
+    if _RESET_OK_MARKER not in stdout:
+        print(f"Warning: Kernel reset failed: {stderr[:300]}")
+        return False
+    return True
+
+
+def release_kernel(kernel):
+    """
+    Gives a used kernel back. It goes on the shutdown queue and this call returns without
+    waiting for it to exit; the warm pool is refilled with fresh kernels by acquire_kernel().
+    """
+    if kernel is None:
+        return
+    _queue_shutdown(kernel)
+
+
+def _queue_shutdown(kernel):
+    global _shutdown_thread
+    with _shutdown_queue_lock:
+        _shutdown_queue.append(kernel)
+        if _shutdown_thread is None:
+            _shutdown_thread = threading.Thread(target=_shutdown_loop, name="kernel-shutdown", daemon=True)
+            _shutdown_thread.start()
+    _shutdown_needed.set()
+
+
+def _shutdown_batch(kernels, grace_seconds):
+    for km, kc in kernels:
+        try:
+            if kc.is_alive(): kc.stop_channels()
+        except Exception as e:
+            print(f"Warning: Could not stop kernel channels: {e}")
+        try:
+            if km.is_alive(): km.request_shutdown()
+        except Exception as e:
+            print(f"Warning: Could not request kernel shutdown: {e}")
+
+    deadline = time.monotonic() + grace_seconds
+    pending = [km for km, _kc in kernels]
+    while pending and time.monotonic() < deadline:
+        time.sleep(0.1)
+        pending = [km for km in pending if km.is_alive()]
+
+    for km, _kc in kernels:
+        try:
+            if km.is_alive():
+                # Past the deadline: finish_shutdown with no wait time SIGKILLs the process.
+                km.finish_shutdown(waittime=0)
+            km.cleanup_resources()
+        except Exception as e:
+            print(f"Warning: Could not clean up kernel: {e}")
+    print(f"[KERNELS] Shut down {len(kernels)} kernel(s), {len(pending)} needed SIGKILL")
+
+
+def _shutdown_loop():
+    while True:
+        _shutdown_needed.wait()
+        _shutdown_needed.clear()
+        with _shutdown_queue_lock:
+            batch = list(_shutdown_queue)
+            _shutdown_queue.clear()
+        if batch:
+            try:
+                _shutdown_batch(batch, KERNEL_SHUTDOWN_GRACE_SECONDS)
+            except Exception as e:
+                print(f"Error shutting down kernels: {e}")
+
+
+def get_kernel_pool_stats():
+    with _warm_pool_lock:
+        warm = len(_warm_pool)
+    with _shutdown_queue_lock:
+        queued = len(_shutdown_queue)
+    return {"warm_kernels": warm, "warm_pool_size": WARM_KERNEL_POOL_SIZE, "shutdown_queue": queued}
+
+
+register_gauges("aipz_kernel_pool", get_kernel_pool_stats)
+
+
+@atexit.register
+def _shutdown_everything():
+    # On server exit: kill idle and queued kernels right away instead of leaking processes.
+    with _warm_pool_lock:
+        kernels = list(_warm_pool)
+        _warm_pool.clear()
+    with _shutdown_queue_lock:
+        kernels.extend(_shutdown_queue)
+        _shutdown_queue.clear()
+    if kernels:
+        _shutdown_batch(kernels, grace_seconds=0)
@@ -0,0 +1,83 @@
+# backend/utils/lazy.py
+"""
+Deferred imports for the heavy dependencies (pandas, numpy, cv2, scikit-image, scipy,
+jupyter_client). Importing them all eagerly made `import app` take over a second, most
+of it spent on modules a login or /api/courses request never touches.
+
+    pd = lazy_import("pandas")      # nothing is imported yet
+    pd.read_csv(path)               # pandas is imported here, once per process
+
+Type annotations that name these modules must be strings (or live under
+typing.TYPE_CHECKING), otherwise defining the function triggers the import.
+"""
+import importlib
+import os
+import threading
+
+# Set EAGER_IMPORTS=1 to import everything at startup again (e.g. to surface a broken
+# install immediately instead of on the first grading request).
+EAGER_IMPORTS = os.environ.get("EAGER_IMPORTS", "0") == "1"
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+class LazyModule:
+    """A stand-in for a module that imports the real one on first attribute access."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            # importlib holds a per-module lock, so concurrent first uses import it once.
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_import(name):
+    """Returns a LazyModule for `name` (or the module itself when EAGER_IMPORTS=1)."""
+    if EAGER_IMPORTS:
+        return importlib.import_module(name)
+    module = LazyModule(name)
+    with _registry_lock:
+        _registry.append(module)
+    return module
+
+
+def preload(names=None):
+    """
+    Imports the deferred modules now (all of them, or only those named), e.g. from a
+    background thread once the server is accepting requests. Returns the names loaded.
+    """
+    with _registry_lock:
+        modules = list(_registry)
+    loaded = []
+    for module in modules:
+        name = module.__dict__["_name"]
+        if names is None or name in names:
+            module._load()
+            loaded.append(name)
+    return loaded
+
+
+def loaded_modules():
+    """{module name: bool} for every deferred module, for the startup benchmark."""
+    with _registry_lock:
+        return {m.__dict__["_name"]: m.__dict__["_module"] is not None for m in _registry}
@@ -0,0 +1,105 @@
+# backend/utils/listing.py
+"""
+Server-side pagination, filtering and field projection for the admin listings
+(/api/admin/students, /api/users/, /api/admin/questions/all/<subject>/<level>).
+
+Without listing parameters these endpoints still return their plain JSON list. With
+?page= and/or ?pageSize= they return one page:
+
+    {"items": [...], "total": 1234, "page": 2, "pageSize": 50}
+
+?fields=username,role keeps only those keys of each item (with or without paging).
+Filters are per endpoint and are answered from an index built once per version of the
+underlying files:
+
+    index = cached_index(("students",), [USERS_FILE_PATH, COURSE_CONFIG_PATH], build_students_index)
+
+The files' signatures are the cache key (see utils/storage.file_signature), so a write
+by any worker rebuilds the index on the next listing request.
+"""
+import threading
+
+from utils.storage import file_signature
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_indexes = {}  # key -> (signature of the source files, index)
+_indexes_lock = threading.Lock()
+
+
+def cached_index(key, sources, build):
+    """build()'s result, rebuilt only when one of the `sources` files has changed."""
+    # Taken before build() reads the files: a write in between only causes a rebuild.
+    signature = tuple(file_signature(p) for p in sources)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+    if cached is None or cached[0] != signature:
+        cached = (signature, build())
+        with _indexes_lock:
+            _indexes[key] = cached
+    return cached[1]
+
+
+def wants_listing(args, filters=()):
+    """True if the query string asks for paging, projection or one of `filters`."""
+    return any(name in args for name in ("page", "pageSize", "fields", *filters))
+
+
+def listing_params(args):
+    """page, pageSize and fields from the query string. Raises ValueError on bad values."""
+    try:
+        page = int(args.get("page", 1))
+        page_size = int(args.get("pageSize", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("page and pageSize must be integers.")
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page must be >= 1 and pageSize between 1 and {MAX_PAGE_SIZE}.")
+    fields = [f.strip() for f in args.get("fields", "").split(",") if f.strip()]
+    return {
+        "paginated": "page" in args or "pageSize" in args,
+        "page": page,
+        "page_size": page_size,
+        "fields": fields or None,
+    }
+
+
+def parse_bool(value):
+    """'true'/'1'/'yes' -> True, 'false'/'0'/'no' -> False, anything else -> ValueError."""
+    lowered = str(value).strip().lower()
+    if lowered in ("true", "1", "yes"):
+        return True
+    if lowered in ("false", "0", "no"):
+        return False
+    raise ValueError(f"Expected true or false, got '{value}'.")
+
+
+def intersect(*position_lists):
+    """Positions present in every non-None list, in ascending order (None = no filter)."""
+    lists = [p for p in position_lists if p is not None]
+    if not lists:
+        return None
+    result = set(lists[0])
+    for positions in lists[1:]:
+        result.intersection_update(positions)
+    return sorted(result)
+
+
+def listing_response(records, positions, params):
+    """
+    The JSON body for the records at `positions` (None = all of them, in order): a page
+    envelope or a plain list, with each item projected to the requested fields. Index
+    records are shared, so projection always builds new dicts.
+    """
+    total = len(records) if positions is None else len(positions)
+    if params["paginated"]:
+        start = (params["page"] - 1) * params["page_size"]
+        window = range(start, min(start + params["page_size"], total))
+    else:
+        window = range(total)
+    items = [records[i if positions is None else positions[i]] for i in window]
+    if params["fields"]:
+        items = [{f: item[f] for f in params["fields"] if f in item} for item in items]
+    if params["paginated"]:
+        return {"items": items, "total": total, "page": params["page"], "pageSize": params["page_size"]}
+    return items
@@ -0,0 +1,177 @@
+# backend/utils/media.py
+"""
+Index of the dataset files served by /api/media (question images, wav files, CSV previews).
+
+Every student's exam page fetches the same few images, so each requested `path` is
+resolved, checked against the datasets directory and hashed once per process:
+
+    media = lookup(request.args["path"])   # {"path", "etag", "size", "mtime"}
+
+Later requests for the same path cost one os.stat() (to notice a re-uploaded file)
+instead of resolve() and the parent walk. The sha256 of the content is the strong ETag,
+so conditional GETs answer 304 and the browser keeps its copy across page renders.
+
+Previews don't need the full-resolution file: thumbnail() resizes an image to one of
+THUMBNAIL_WIDTHS as WebP or JPEG, once, into data/derivatives/ keyed by the source's
+hash and the width, so every worker and every later request reuses the same file.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from utils.dataset_cache import resolve_data_path
+from utils.lazy import lazy_import
+from utils.metrics import register_gauges, span
+
+# Only needed once a thumbnail is generated
+PIL_Image = lazy_import("PIL.Image")
+
+BASE_DATA_PATH = Path(__file__).resolve().parent.parent / "data"
+# The single directory /api/media may serve from; anything else is refused.
+SAFE_MEDIA_DIRECTORY = (BASE_DATA_PATH / "datasets").resolve()
+MEDIA_INDEX_MAX_ENTRIES = int(os.environ.get("MEDIA_INDEX_MAX_ENTRIES", "4096"))
+_CHUNK_SIZE = 1024 * 1024
+
+DERIVATIVES_PATH = BASE_DATA_PATH / "derivatives"
+# Requested widths are rounded up to one of these, so a handful of files serve every layout.
+THUMBNAIL_WIDTHS = (160, 320, 640, 960, 1280)
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "80"))
+# format -> (Pillow format, mimetype, suffixes of files already in that format)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp", (".webp",)),
+    "jpeg": ("JPEG", "image/jpeg", (".jpg", ".jpeg")),
+}
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp", ".tif", ".tiff"}
+
+_index = OrderedDict()  # requested path string -> entry, least recently used first
+_lock = threading.Lock()
+
+
+# --- Path index ---
+
+def _signature(stat):
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _resolve(requested):
+    """The real file behind a requested path; raises PermissionError outside the datasets."""
+    # Paths stored in questions.json may point into another machine's backend/data.
+    path = resolve_data_path(requested).resolve()
+    if SAFE_MEDIA_DIRECTORY not in path.parents:
+        raise PermissionError(requested)
+    return path
+
+
+def lookup(requested):
+    """
+    Returns {"path", "etag", "size", "mtime"} for a requested media path. Raises
+    PermissionError if it is outside the datasets directory, FileNotFoundError if missing.
+    """
+    with _lock:
+        entry = _index.get(requested)
+        if entry is not None:
+            _index.move_to_end(requested)
+    if entry is not None:
+        try:
+            stat = os.stat(entry["path"])
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and _signature(stat) == entry["signature"]:
+            return entry
+        # Replaced (re-uploaded, relinked) or deleted since it was indexed: start over.
+        with _lock:
+            _index.pop(requested, None)
+
+    path = _resolve(requested)
+    if not path.is_file():
+        raise FileNotFoundError(requested)
+    stat = path.stat()
+    entry = {"path": path, "etag": _hash_file(path), "size": stat.st_size, "mtime": stat.st_mtime,
+             "signature": _signature(stat)}
+    with _lock:
+        _index[requested] = entry
+        while len(_index) > MEDIA_INDEX_MAX_ENTRIES:
+            _index.popitem(last=False)
+    return entry
+
+
+# --- Thumbnails ---
+
+def thumbnail_width(requested_width):
+    """The smallest THUMBNAIL_WIDTHS bucket at least as wide as requested (or the largest)."""
+    return next((w for w in THUMBNAIL_WIDTHS if w >= requested_width), THUMBNAIL_WIDTHS[-1])
+
+
+def _source_width(entry):
+    if "width" not in entry:
+        try:
+            with PIL_Image.open(entry["path"]) as im:  # reads the header only
+                entry["width"] = im.width
+        except Exception:
+            entry["width"] = None
+    return entry["width"]
+
+
+def _render_thumbnail(source, target, width, fmt):
+    pil_format = THUMBNAIL_FORMATS[fmt][0]
+    with PIL_Image.open(source) as im:
+        height = max(1, round(im.height * width / im.width))
+        im.draft("RGB", (width, height))  # JPEG sources decode at a reduced scale directly
+        im = im.convert("RGBA" if fmt == "webp" and "A" in im.getbands() else "RGB")
+        im = im.resize((width, height), PIL_Image.LANCZOS, reducing_gap=3.0)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target.parent, prefix=".thumb.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                im.save(out, pil_format, quality=THUMBNAIL_QUALITY, method=4 if fmt == "webp" else 0,
+                        optimize=fmt == "jpeg")
+            # Two workers rendering the same thumbnail both produce a complete file.
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def thumbnail(entry, requested_width, fmt="webp"):
+    """
+    {"path", "etag", "mtime", "mimetype"} of the lookup() entry resized to
+    thumbnail_width(requested_width) pixels wide in fmt ("webp" or "jpeg"). A narrower
+    image is only re-encoded (e.g. a PNG to WebP). Returns None when the file is not an
+    image, or is already that narrow and in that format, so the original is served.
+    """
+    suffix = entry["path"].suffix.lower()
+    if suffix not in IMAGE_SUFFIXES or fmt not in THUMBNAIL_FORMATS:
+        return None
+    source_width = _source_width(entry)
+    if not source_width:
+        return None
+    width = min(thumbnail_width(requested_width), source_width)
+    if width == source_width and suffix in THUMBNAIL_FORMATS[fmt][2]:
+        return None
+    digest = entry["etag"]
+    target = DERIVATIVES_PATH / digest[:2] / f"{digest}-w{width}.{fmt}"
+    if not target.exists():
+        with span("thumbnail_render"):
+            _render_thumbnail(entry["path"], target, width, fmt)
+    return {"path": target, "etag": f"{digest}-w{width}-{fmt}", "mtime": entry["mtime"],
+            "mimetype": THUMBNAIL_FORMATS[fmt][1]}
+
+
+def index_stats():
+    with _lock:
+        return {"entries": len(_index), "bytes": sum(e["size"] for e in _index.values())}
+
+
+register_gauges("aipz_media_index", index_stats)
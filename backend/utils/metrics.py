@@ -0,0 +1,256 @@
+# backend/utils/metrics.py
+"""
+Latency histograms, counters and log verbosity for the backend.
+
+    with span("kernel_execute"):
+        ...
+
+    @timed("csv_compare")
+    def compare_csvs(...): ...
+
+Every span lands in the aipz_stage_duration_seconds histogram under its `stage` label
+(question_load, kernel_acquire, kernel_queue_wait, kernel_execute, output_parse,
+csv_compare, ssim_compare, json_write, ...). init_app() adds per-endpoint request
+timings, and modules with pool statistics register them as gauges. GET
+/api/admin/metrics renders everything in the Prometheus text format.
+
+Each server worker (serve.py) keeps its own numbers and publishes a snapshot to the
+kernel registry database every METRICS_PUBLISH_INTERVAL_SECONDS; the endpoint merges
+the snapshots of all live workers, so a scrape can land on any of them.
+
+LOG_LEVEL (debug, info, warning, error; default info) sets how much the grading code
+prints. The step-by-step validation banners are debug output.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.kernel_registry import put_state, get_states
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "info").lower()
+_LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+_log_threshold = _LOG_LEVELS.get(LOG_LEVEL, 20)
+
+METRICS_PUBLISH_INTERVAL_SECONDS = float(os.environ.get("METRICS_PUBLISH_INTERVAL_SECONDS", "5"))
+# Upper bounds (seconds) of the histogram buckets; the +Inf bucket is implicit.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_HISTOGRAM = "aipz_stage_duration_seconds"
+REQUEST_HISTOGRAM = "aipz_request_duration_seconds"
+
+_DESCRIPTIONS = {
+    STAGE_HISTOGRAM: ("histogram", "Time spent in each stage of grading and request handling."),
+    REQUEST_HISTOGRAM: ("histogram", "Time to answer an API request, by route."),
+    "aipz_kernel_acquire_total": ("counter", "Kernels handed out, by whether the warm pool had one ready."),
+}
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count], sum
+_counters = {}  # (name, labels) -> value
+_gauge_sources = {}  # prefix -> callable returning {key: number}
+_publisher = None
+
+
+# --- Logging ---
+
+def log_debug(*args, **kwargs):
+    """print() that only prints when LOG_LEVEL=debug."""
+    if _log_threshold <= 10:
+        print(*args, **kwargs)
+
+
+def log_warning(*args, **kwargs):
+    if _log_threshold <= 30:
+        print(*args, **kwargs)
+
+
+def log_error(*args, **kwargs):
+    if _log_threshold <= 40:
+        print(*args, **kwargs)
+
+
+# --- Recording ---
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Records one duration (in seconds) in the histogram `name`."""
+    key = _key(name, labels)
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        entry[0][index] += 1
+        entry[1] += seconds
+    _ensure_publisher()
+
+
+def observe_stage(stage, seconds):
+    observe(STAGE_HISTOGRAM, seconds, stage=stage)
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _ensure_publisher()
+
+
+@contextmanager
+def span(stage, **labels):
+    """Times the block (also when it raises) into the stage histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(STAGE_HISTOGRAM, time.perf_counter() - started, stage=stage, **labels)
+
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_gauges(prefix, source):
+    """
+    Exposes source() -> {key: number} as gauges named <prefix>_<key>, read at scrape time
+    (e.g. register_gauges("aipz_kernel_pool", get_kernel_pool_stats)).
+    """
+    _gauge_sources[prefix] = source
+
+
+def init_app(app):
+    """Times every request into the request histogram, labelled by route and status."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request_time(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule else "unmatched"
+            observe(REQUEST_HISTOGRAM, time.perf_counter() - started,
+                    route=rule, method=request.method, status=response.status_code)
+        return response
+
+
+# --- Snapshots shared between workers ---
+
+def _collect_gauges():
+    gauges = []
+    for prefix, source in list(_gauge_sources.items()):
+        try:
+            values = source()
+        except Exception as e:
+            log_warning(f"Warning: Could not collect {prefix} gauges: {e}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges.append([f"{prefix}_{key}", {}, value])
+    return gauges
+
+
+def snapshot():
+    """This process's metrics as a JSON-serialisable dict."""
+    with _lock:
+        histograms = [[name, dict(labels), list(entry[0]), entry[1]] for (name, labels), entry in _histograms.items()]
+        counters = [[name, dict(labels), value] for (name, labels), value in _counters.items()]
+    return {"pid": os.getpid(), "histograms": histograms, "counters": counters, "gauges": _collect_gauges()}
+
+
+def _publish():
+    put_state("metrics", str(os.getpid()), snapshot(), METRICS_PUBLISH_INTERVAL_SECONDS * 3)
+
+
+def _publish_loop():
+    while True:
+        time.sleep(METRICS_PUBLISH_INTERVAL_SECONDS)
+        try:
+            _publish()
+        except Exception as e:
+            log_warning(f"Warning: Could not publish metrics: {e}")
+
+
+def _ensure_publisher():
+    global _publisher
+    # Per process: a worker forked from a parent that had one starts its own.
+    if _publisher is not None and _publisher[0] == os.getpid():
+        return
+    with _lock:
+        if _publisher is None or _publisher[0] != os.getpid():
+            thread = threading.Thread(target=_publish_loop, name="metrics-publisher", daemon=True)
+            _publisher = (os.getpid(), thread)
+            thread.start()
+
+
+def _merged_snapshots():
+    _publish()
+    histograms, counters, gauges = {}, {}, []
+    for pid, snap in sorted(get_states("metrics").items()):
+        for name, labels, buckets, total in snap["histograms"]:
+            entry = histograms.setdefault(_key(name, labels), [[0] * len(buckets), 0.0])
+            entry[0] = [a + b for a, b in zip(entry[0], buckets)]
+            entry[1] += total
+        for name, labels, value in snap["counters"]:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snap["gauges"]:
+            gauges.append((name, dict(labels, worker=pid), value))
+    return histograms, counters, gauges
+
+
+# --- Prometheus text format ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _header(lines, seen, name, default_type):
+    if name in seen:
+        return
+    seen.add(name)
+    metric_type, help_text = _DESCRIPTIONS.get(name, (default_type, name.replace("_", " ")))
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+
+
+def render_prometheus():
+    """All workers' metrics in the Prometheus text exposition format (version 0.0.4)."""
+    histograms, counters, gauges = _merged_snapshots()
+    lines, seen = [], set()
+    for (name, labels), (buckets, total) in sorted(histograms.items()):
+        _header(lines, seen, name, "histogram")
+        cumulative = 0
+        for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], buckets):
+            cumulative += count
+            lines.append(f"{name}_bucket{_label_text(labels + (('le', str(bound)),))} {cumulative}")
+        lines.append(f"{name}_sum{_label_text(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_label_text(labels)} {cumulative}")
+    for (name, labels), value in sorted(counters.items()):
+        _header(lines, seen, name, "counter")
+        lines.append(f"{name}{_label_text(labels)} {value}")
+    for name, labels, value in sorted(gauges, key=lambda g: (g[0], g[1]["worker"])):
+        _header(lines, seen, name, "gauge")
+        lines.append(f"{name}{_label_text(sorted(labels.items()))} {value}")
+    return "\n".join(lines) + "\n"
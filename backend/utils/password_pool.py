@@ -0,0 +1,170 @@
+# backend/utils/password_pool.py
+"""
+bcrypt hashing and verification on a dedicated process pool.
+
+A bcrypt check costs 100-250 ms of CPU. Running it on the request thread means a
+login storm at exam start occupies every server thread, and /run and /validate
+requests queue behind it. Here the work is handed to a pool with one process per
+core, so at most that many checks run at once and the request threads just wait
+on a future. Queue and run times are tracked for the admin metrics.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from utils.metrics import register_gauges
+
+# Cost factor for new hashes. Defaults to the cost existing users were created with
+# (see hash_password.py). Raising it is opt-in: hashes with a lower cost are then
+# transparently re-hashed on the next successful login. Stronger hashes are kept as
+# they are, so lowering this never weakens stored passwords.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "10"))
+HASH_POOL_SIZE = int(os.environ.get("HASH_POOL_SIZE", str(os.cpu_count() or 2)))
+VERIFY_TIMEOUT_SECONDS = 30
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "queue_wait_ms_total": 0.0,
+    "run_ms_total": 0.0,
+    "queue_wait_ms_max": 0.0,
+}
+
+
+# --- Worker-side functions (run inside the pool processes) ---
+
+def _timed_checkpw(password, hashed):
+    start = time.perf_counter()
+    result = bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _timed_hashpw(password, rounds):
+    start = time.perf_counter()
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+    return hashed, (time.perf_counter() - start) * 1000
+
+
+# --- Pool management ---
+
+def _mp_context():
+    # Never fork the multi-threaded server process itself. A forkserver starts from a
+    # clean interpreter that only preloads this module; spawn is the portable fallback.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=HASH_POOL_SIZE, mp_context=_mp_context())
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _submit(fn, *args):
+    submitted_at = time.perf_counter()
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["in_flight"] += 1
+        _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+    future = _get_pool().submit(fn, *args)
+
+    def _record(done_future):
+        total_ms = (time.perf_counter() - submitted_at) * 1000
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+            if done_future.exception() is not None:
+                _stats["failed"] += 1
+                return
+            _, run_ms = done_future.result()
+            wait_ms = max(0.0, total_ms - run_ms)
+            _stats["completed"] += 1
+            _stats["run_ms_total"] += run_ms
+            _stats["queue_wait_ms_total"] += wait_ms
+            _stats["queue_wait_ms_max"] = max(_stats["queue_wait_ms_max"], wait_ms)
+
+    future.add_done_callback(_record)
+    return future
+
+
+# --- Public API ---
+
+def verify_password(password, hashed, timeout=VERIFY_TIMEOUT_SECONDS):
+    """Checks `password` against a stored bcrypt hash on the pool. Returns a bool."""
+    result, _ = _submit(_timed_checkpw, password, hashed).result(timeout=timeout)
+    return result
+
+
+def hash_password(password, rounds=None):
+    """Hashes one password on the pool and returns the hash as a str."""
+    hashed, _ = _submit(_timed_hashpw, password, rounds or BCRYPT_ROUNDS).result()
+    return hashed
+
+
+def hash_password_async(password, rounds=None):
+    """Like hash_password() but returns a Future resolving to the hash str."""
+    future = _submit(_timed_hashpw, password, rounds or BCRYPT_ROUNDS)
+    return _MappedFuture(future)
+
+
+def needs_rehash(hashed):
+    """True when a stored hash was made with a cost factor below BCRYPT_ROUNDS."""
+    try:
+        # Format: $2b$<cost>$<salt+hash>
+        return int(hashed.split('$')[2]) < BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return False
+
+
+def get_pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    completed = stats["completed"] or 1
+    stats["pool_size"] = HASH_POOL_SIZE
+    stats["bcrypt_rounds"] = BCRYPT_ROUNDS
+    stats["queued"] = max(0, stats["in_flight"] - HASH_POOL_SIZE)
+    stats["queue_wait_ms_avg"] = stats["queue_wait_ms_total"] / completed
+    stats["run_ms_avg"] = stats["run_ms_total"] / completed
+    return stats
+
+
+register_gauges("aipz_password_pool", get_pool_stats)
+
+
+class _MappedFuture:
+    """Minimal wrapper exposing the hash part of a (hash, run_ms) pool result."""
+
+    def __init__(self, future):
+        self._future = future
+
+    def result(self, timeout=None):
+        return self._future.result(timeout=timeout)[0]
+
+    def add_done_callback(self, fn):
+        self._future.add_done_callback(lambda _f: fn(self))
+
+    def exception(self, timeout=None):
+        return self._future.exception(timeout=timeout)
@@ -1,9 +1,11 @@
 # backend/utils/progress_helper.py
 import os
 from pathlib import Path
+from utils.storage import read_json
 
 # Base path for questions folder
 QUESTIONS_BASE_PATH = Path(__file__).resolve().parent.parent / "data" / "questions"
+COURSE_CONFIG_PATH = Path(__file__).resolve().parent.parent / "data" / "course_config.json"
 
 
 def build_initial_progress():
@@ -39,3 +41,181 @@ def build_initial_progress():
         print("Error building initial progress:", e)
 
     return initial_progress
+
+
+# ---------------------------------------------------------------------------
+# Compact progress representation
+#
+# users.json stores progress as {subject: "CUL..."}: one character per level,
+# where character i is the status of level{i+1}. Levels that are missing from
+# the string (and subjects missing from the dict) have the default status, so
+# a brand-new user stores {} and adding a subject or a level to course_config
+# never touches users.json. For subjects in course_config, trailing default
+# characters are stripped; for other subjects the string keeps one character per
+# known level, since there is no config to derive the level list from.
+#
+# Older records still hold the nested {subject: {"level1": "unlocked", ...}}
+# form; every function here accepts both, and every write stores the compact one.
+# API responses keep the nested form via expand_progress().
+# ---------------------------------------------------------------------------
+
+STATUS_CODES = {"locked": "L", "unlocked": "U", "completed": "C"}
+CODE_STATUSES = {code: status for status, code in STATUS_CODES.items()}
+
+
+def _level_number(level_name):
+    try:
+        return int(str(level_name).replace("level", ""))
+    except ValueError:
+        return None
+
+
+def _default_code(index):
+    return "U" if index == 0 else "L"
+
+
+def _strip_defaults(codes):
+    codes = list(codes)
+    while codes and codes[-1] == _default_code(len(codes) - 1):
+        codes.pop()
+    return "".join(codes)
+
+
+def _subject_codes(value):
+    """Returns the code string for one subject, whichever form it is stored in."""
+    if isinstance(value, str):
+        return value
+    if not isinstance(value, dict):
+        return ""
+    numbered = {}
+    for level_name, status in value.items():
+        number = _level_number(level_name)
+        if number and number > 0:
+            numbered[number] = STATUS_CODES.get(status, "L")
+    if not numbered:
+        return ""
+    return "".join(numbered.get(i + 1, _default_code(i)) for i in range(max(numbered)))
+
+
+def _configured_levels(course_config):
+    return {
+        subject: details.get("levels", [])
+        for subject, details in (course_config or {}).items()
+        if isinstance(details, dict) and details.get("levels")
+    }
+
+
+def compact_progress(progress, course_config=None):
+    """
+    Converts a progress object (nested, compact or mixed) to the stored compact form.
+    Subjects that are configured in course_config and are entirely at their default
+    status are dropped, since expand_progress() derives them anyway.
+    """
+    configured = _configured_levels(course_config)
+    compact = {}
+    for subject, value in (progress or {}).items():
+        codes = _subject_codes(value)
+        if subject in configured:
+            codes = _strip_defaults(codes)
+            if not codes:
+                continue
+        compact[subject] = codes or _default_code(0)
+    return compact
+
+
+def expand_progress(progress, course_config=None):
+    """
+    Builds the nested {subject: {levelN: status}} view used by the API and frontend.
+    Configured subjects are always present; subjects only found in the stored
+    progress (e.g. removed from course_config) are kept as stored.
+    """
+    configured = _configured_levels(course_config)
+    progress = progress or {}
+    expanded = {}
+
+    for subject in list(configured) + [s for s in progress if s not in configured]:
+        codes = _subject_codes(progress.get(subject, ""))
+        level_names = list(configured.get(subject, []))
+        for i in range(len(codes)):
+            if f"level{i + 1}" not in level_names:
+                level_names.append(f"level{i + 1}")
+        if not level_names:
+            level_names = ["level1"]
+
+        subject_progress = {}
+        for level_name in level_names:
+            number = _level_number(level_name)
+            index = number - 1 if number else 0
+            code = codes[index] if index < len(codes) else _default_code(index)
+            subject_progress[level_name] = CODE_STATUSES[code]
+        expanded[subject] = subject_progress
+
+    return expanded
+
+
+def get_level_status(progress, subject, level_name):
+    codes = _subject_codes((progress or {}).get(subject, ""))
+    number = _level_number(level_name)
+    index = number - 1 if number else 0
+    return CODE_STATUSES[codes[index] if index < len(codes) else _default_code(index)]
+
+
+def set_level_status(progress, subject, level_name, status):
+    """
+    Sets one level's status in a stored progress dict (in place). The subject is stored
+    as a code string afterwards; run compact_progress() before saving to drop defaults.
+    Raises ValueError for statuses other than locked/unlocked/completed.
+    """
+    if status not in STATUS_CODES:
+        raise ValueError(f"Unknown progress status '{status}'.")
+    number = _level_number(level_name)
+    if not number or number < 1:
+        raise ValueError(f"Invalid level name '{level_name}'.")
+
+    codes = list(_subject_codes(progress.get(subject, "")))
+    while len(codes) < number:
+        codes.append(_default_code(len(codes)))
+    codes[number - 1] = STATUS_CODES[status]
+    progress[subject] = "".join(codes)
+    return progress
+
+
+def apply_progress_updates(users, updates, course_config=None):
+    """
+    Applies many (username, subject, level_name, status) updates to a users list in one
+    pass, so callers can batch them into a single users.json write. Touched users are
+    converted to the compact form. Returns the set of usernames that were changed.
+    """
+    users_by_name = {user.get("username"): user for user in users}
+    changed = set()
+    for username, subject, level_name, status in updates:
+        user = users_by_name.get(username)
+        if user is None:
+            continue
+        progress = user.get("progress")
+        if not isinstance(progress, dict) or not all(isinstance(v, str) for v in progress.values()):
+            progress = user["progress"] = compact_progress(progress, course_config)
+        if get_level_status(progress, subject, level_name) != status:
+            set_level_status(progress, subject, level_name, status)
+            changed.add(username)
+    for user in users:
+        if user.get("username") in changed:
+            user["progress"] = compact_progress(user["progress"], course_config)
+    return changed
+
+
+def load_course_config():
+    try:
+        return read_json(COURSE_CONFIG_PATH, default={})
+    except Exception as e:
+        print("Error reading course config for progress defaults:", e)
+        return {}
+
+
+def user_for_response(user, course_config=None):
+    """Copy of a stored user record without the password and with expanded progress."""
+    if course_config is None:
+        course_config = load_course_config()
+    public_user = {k: v for k, v in user.items() if k != "password"}
+    public_user["progress"] = expand_progress(user.get("progress"), course_config)
+    return public_user
@@ -0,0 +1,91 @@
+# backend/utils/question_counts.py
+import json
+from pathlib import Path
+from utils.storage import read_json, update_json, file_signature, add_write_hook
+
+# Base paths for the questions folder and the counts index that sits next to it
+BASE_DATA_PATH = Path(__file__).resolve().parent.parent / "data"
+QUESTIONS_BASE_PATH = BASE_DATA_PATH / "questions"
+QUESTION_COUNTS_PATH = BASE_DATA_PATH / "question_counts.json"
+
+
+def _update_index():
+    return update_json(QUESTION_COUNTS_PATH, default={}, reset_invalid=True)
+
+
+def _count_questions_on_disk(questions_file_path):
+    """Fallback used only when the index has no entry or the file changed behind our back."""
+    try:
+        questions = read_json(questions_file_path, default=[])
+        return len(questions) if isinstance(questions, list) else 0
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not count questions in {questions_file_path}: {e}")
+        return 0
+
+
+def record_question_count(subject, level_name, count):
+    """
+    Stores the number of questions for subject/level in the counts index, with the
+    signature of the questions.json file as it is now. Called by _record_written_count
+    while the file's writer lock is held, so the signature belongs to the counted write.
+    """
+    questions_file_path = QUESTIONS_BASE_PATH / subject / level_name / "questions.json"
+    signature = file_signature(questions_file_path)
+    entry = {"count": int(count)}
+    if signature:
+        entry["signature"] = list(signature)
+    with _update_index() as doc:
+        doc.data.setdefault(subject, {})[level_name] = entry
+
+
+def _record_written_count(path, data):
+    """Write hook (see utils/storage.py): keeps the index in step with every questions.json write."""
+    if path.name != "questions.json":
+        return
+    try:
+        subject, level_name, _ = path.resolve().relative_to(QUESTIONS_BASE_PATH.resolve()).parts
+    except ValueError:  # not data/questions/<subject>/<level>/questions.json
+        return
+    record_question_count(subject, level_name, len(data) if isinstance(data, list) else 0)
+
+
+add_write_hook(_record_written_count)
+
+
+def get_question_counts(levels_by_subject):
+    """
+    Returns {subject: {level_name: count}} for the given {subject: [level_name, ...]} mapping.
+
+    Counts come from the index. A questions.json file is only parsed when its entry is
+    missing or its signature no longer matches (e.g. the file was edited by hand), and the
+    recomputed count is written back so the next call is a pure index read.
+    """
+    index = read_json(QUESTION_COUNTS_PATH, default={})
+    if not isinstance(index, dict):
+        index = {}
+    stale_entries = {}
+    counts = {}
+
+    for subject, levels in levels_by_subject.items():
+        counts[subject] = {}
+        for level_name in levels:
+            questions_file_path = QUESTIONS_BASE_PATH / subject / level_name / "questions.json"
+            signature = file_signature(questions_file_path)
+            entry = index.get(subject, {}).get(level_name)
+
+            if signature is None:
+                count = 0
+            elif entry and entry.get("signature") == list(signature):
+                count = entry.get("count", 0)
+            else:
+                count = _count_questions_on_disk(questions_file_path)
+                stale_entries[(subject, level_name)] = {"count": count, "signature": list(signature)}
+
+            counts[subject][level_name] = count
+
+    if stale_entries:
+        with _update_index() as doc:
+            for (subject, level_name), entry in stale_entries.items():
+                doc.data.setdefault(subject, {})[level_name] = entry
+
+    return counts
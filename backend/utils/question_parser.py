@@ -0,0 +1,357 @@
+# backend/utils/question_parser.py
+"""
+Vectorized parsers for question-bank spreadsheets (Excel or CSV).
+
+Every parser reads the sheet once, converts the columns it needs in one pass and builds
+the question list from plain Python lists instead of walking the sheet row by row with
+iterrows(). The test-case columns (t1_input, t1_output, t2_input, ...) are stacked into
+one long table and grouped back per question, and multi-part questions are grouped by
+id with groupby. The routes in routes/admin.py write the result to questions.json.
+
+Values are converted exactly as the old row-by-row parsers did (str(value).strip(), so
+e.g. an empty output cell still becomes "nan"), so re-importing a bank gives the same JSON.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils.storage import write_json
+from utils.lazy import lazy_import
+from utils.dataset_cache import BASE_DATA_PATH, resolve_data_path
+
+# Imported on the first question-bank upload, not when the app starts
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+_FLOAT_PART_FIELDS = ["expected_value", "similarity_threshold", "tolerance"]
+_PATH_PART_FIELDS = ["solution_file", "train_file", "test_file", "student_file"]
+PATH_CHECK_WORKERS = int(os.environ.get("PATH_CHECK_WORKERS", "8"))
+
+
+# --- Column helpers ---
+
+def read_sheet(input_file):
+    """
+    Reads an uploaded question bank; .csv files are read as CSV, everything else as Excel.
+    A DataFrame that was already read is returned as is, so every parser accepts either.
+    """
+    if isinstance(input_file, pd.DataFrame):
+        return input_file
+    if str(input_file).lower().endswith(".csv"):
+        return pd.read_csv(input_file, on_bad_lines="skip")
+    return pd.read_excel(input_file)
+
+
+def _as_text(values):
+    """str(value).strip() for every value of a column or array."""
+    return pd.Series(values, dtype=object).map(str).str.strip()
+
+
+def _text(df, column, default=""):
+    """The column as stripped strings (missing cells become "nan"), or `default` if absent."""
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return pd.Series(_as_text(df[column].to_numpy(dtype=object)).to_numpy(), index=df.index)
+
+
+def _optional_text(df, column):
+    """Stripped strings with None for empty cells (and for every row if the column is absent)."""
+    if column not in df.columns:
+        return [None] * len(df)
+    values = df[column].to_numpy(dtype=object)
+    present = pd.notna(values)
+    text = np.full(len(values), None, dtype=object)
+    text[present] = _as_text(values[present]).to_numpy()
+    return text.tolist()
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _optional_float(df, column):
+    if column not in df.columns:
+        return [None] * len(df)
+    return [None if pd.isna(v) else _to_float(v) for v in df[column].tolist()]
+
+
+# --- Test-case columns (t1_input / t1_output, ...) ---
+
+def sequential_case_columns(df):
+    """t1_input, t2_input, ... up to the first missing number (the NLP layout)."""
+    columns, i = [], 1
+    while f"t{i}_input" in df.columns:
+        columns.append((f"t{i}_input", f"t{i}_output"))
+        i += 1
+    return columns
+
+
+def numbered_case_columns(df):
+    """
+    Every column containing "_input", in sheet order, mapped to t<digits>_input (the Deep
+    Learning layout, which tolerates gaps in the numbering).
+    """
+    columns = []
+    for column in df.columns:
+        if "_input" not in str(column):
+            continue
+        digits = "".join(filter(str.isdigit, str(column)))
+        if digits and f"t{digits}_input" in df.columns:
+            columns.append((f"t{digits}_input", f"t{digits}_output"))
+    return columns
+
+
+def collect_test_cases(df, case_columns):
+    """
+    Returns one list of {"input", "output"} per row of df. The input columns are stacked
+    into a (rows x cases) table; the filled cells, taken in row-major order, already come
+    out grouped by row and ordered by test-case number.
+    """
+    rows = len(df)
+    if not case_columns or rows == 0:
+        return [[] for _ in range(rows)]
+    blank = np.full(rows, "", dtype=object)
+    inputs = np.column_stack([df[i].to_numpy(dtype=object) for i, _o in case_columns])
+    outputs = np.column_stack([df[o].to_numpy(dtype=object) if o in df.columns else blank
+                               for _i, o in case_columns])
+    filled = pd.notna(inputs)
+    row_numbers, _case_numbers = np.nonzero(filled)
+    long = pd.DataFrame({
+        "row": row_numbers,
+        "input": _as_text(inputs[filled]).to_numpy(),
+        "output": _as_text(outputs[filled]).to_numpy(),
+    })
+    long["case"] = [{"input": i, "output": o} for i, o in zip(long["input"], long["output"])]
+    cases_by_row = long.groupby("row", sort=False)["case"].agg(list)
+    result = [[] for _ in range(rows)]
+    for row, cases in cases_by_row.items():
+        result[row] = cases
+    return result
+
+
+def _test_case_questions(df, case_columns):
+    ids = _text(df, "id")
+    keep = (ids != "").to_numpy()
+    titles, descriptions = _text(df, "title")[keep], _text(df, "description")[keep]
+    test_cases = [cases for cases, k in zip(collect_test_cases(df, case_columns), keep) if k]
+    return [
+        {"id": qid, "title": title, "description": description, "test_cases": cases}
+        for qid, title, description, cases in zip(ids[keep], titles, descriptions, test_cases)
+    ]
+
+
+# --- Parsers (each returns the list of questions) ---
+
+def parse_nlp_questions(input_file):
+    """Columns: id, title, description, t1_input, t1_output, t2_input, ..."""
+    df = read_sheet(input_file)
+    return _test_case_questions(df, sequential_case_columns(df))
+
+
+def parse_deep_learning_questions(input_file):
+    """Like NLP, but the tN_input columns may be numbered with gaps or in any order."""
+    df = read_sheet(input_file)
+    return _test_case_questions(df, numbered_case_columns(df))
+
+
+def parse_ml_questions(input_file):
+    """
+    One row per part: id, title, description, train_dataset, test_dataset, part_id, type,
+    part_description and the optional grading fields. Rows of a question are grouped by id.
+    """
+    df = read_sheet(input_file)
+    ids = _text(df, "id")
+    df, ids = df[ids != ""], ids[ids != ""]
+    if df.empty:
+        return []
+
+    first = (~ids.duplicated()).to_numpy()
+    tasks = {
+        qid: {"id": qid, "title": title, "description": description, "datasets": {}, "parts": []}
+        for qid, title, description in zip(ids[first], _text(df, "title")[first], _text(df, "description")[first])
+    }
+
+    # A later row's dataset path overrides an earlier one, so keep the last filled value.
+    for key, column in (("train", "train_dataset"), ("test", "test_dataset")):
+        paths = pd.Series(_optional_text(df, column), index=df.index, dtype=object).dropna()
+        for qid, path in paths.groupby(ids.loc[paths.index], sort=False).last().items():
+            tasks[qid]["datasets"][key] = path
+
+    part_ids = _text(df, "part_id")
+    has_part = (part_ids != "").to_numpy()
+    if has_part.any():
+        parts_df = df[has_part]
+        optional = {field: _optional_text(parts_df, field)
+                    for field in ["expected_text", "evaluation_label", "placeholder_filename", "solution_file", "key_columns"]}
+        floats = {field: _optional_float(parts_df, field) for field in _FLOAT_PART_FIELDS}
+        parts = []
+        for n, (part_id, part_type, description) in enumerate(zip(
+                part_ids[has_part], _text(parts_df, "type"), _text(parts_df, "part_description"))):
+            part = {"part_id": part_id, "type": part_type, "description": description}
+            for field, values in optional.items():
+                if values[n] is None:
+                    continue
+                if field == "key_columns":
+                    part[field] = [c.strip() for c in values[n].split(",") if c.strip()]
+                else:
+                    part[field] = values[n]
+            for field, values in floats.items():
+                if values[n] is not None:
+                    part[field] = values[n]
+            parts.append(part)
+        grouped = pd.Series(parts, index=parts_df.index, dtype=object).groupby(ids[has_part], sort=False).agg(list)
+        for qid, question_parts in grouped.items():
+            tasks[qid]["parts"] = question_parts
+    return list(tasks.values())
+
+
+def parse_ds_questions(input_file):
+    """One row per test case: id, title, description, input, output. Sorted by id."""
+    df = read_sheet(input_file)
+    df = df[df["id"].notna()]
+    if df.empty:
+        return []
+    cases = [{"input": i, "output": o} for i, o in zip(df["input"].map(str), df["output"].map(str))]
+    cases_by_id = pd.Series(cases, index=df.index, dtype=object).groupby(df["id"]).agg(list)
+    first_rows = df.drop_duplicates("id").set_index("id", drop=False).loc[cases_by_id.index]
+    return [
+        {"id": str(qid), "title": str(title), "description": str(description), "test_cases": question_cases}
+        for qid, title, description, question_cases in zip(
+            first_rows["id"], first_rows["title"], first_rows["description"], cases_by_id)
+    ]
+
+
+def parse_speech_recognition_questions(input_file, datasets_path):
+    """
+    One question per row: S.No, Scenario, Task, Input File, Output File (comma-separated).
+    File names are resolved under <datasets_path>/Speech-Recognition/{input,solution}.
+    """
+    df = read_sheet(input_file)
+    input_dir = Path(datasets_path) / "Speech-Recognition" / "input"
+    solution_dir = Path(datasets_path) / "Speech-Recognition" / "solution"
+    tasks = []
+    for number, scenario, task_text, input_name, outputs in zip(
+            _text(df, "S.No"), _text(df, "Scenario"), _text(df, "Task"),
+            _text(df, "Input File"), _text(df, "Output File")):
+        input_path = str((input_dir / input_name).resolve()) if input_name else ""
+        output_files = [str((solution_dir / f.strip()).resolve()) for f in outputs.split(",")] if outputs else []
+        tasks.append({
+            "id": number,
+            "title": scenario,
+            "description": task_text,
+            "datasets": {"input_file": input_path},
+            "parts": [{
+                "part_id": number,
+                "type": "csv_similarity",
+                "description": task_text,
+                "solution_file": output_files if len(output_files) > 1 else (output_files[0] if output_files else "")
+            }]
+        })
+    return tasks
+
+
+def parse_standard_questions(input_file):
+    """
+    The standardized multi-part layout (see utils/standard_parser.py): one row per part
+    with part_type, train_file, test_file, student_file, ... and "|"-separated key_columns.
+    """
+    df = read_sheet(input_file).fillna("")
+    if df.empty:
+        return []
+    optional = {field: df[field].tolist() for field in
+                ["expected_text", "train_file", "test_file", "student_file", "placeholder_filename", "solution_file"]}
+    parts = []
+    for n, (part_id, part_type, description, threshold, key_columns) in enumerate(zip(
+            df["part_id"].tolist(), df["part_type"].tolist(), df["part_description"].tolist(),
+            df["similarity_threshold"].tolist(), df["key_columns"].tolist())):
+        if not part_id:
+            parts.append(None)
+            continue
+        part = {"part_id": part_id, "type": part_type, "description": description}
+        if optional["expected_text"][n]: part["expected_text"] = optional["expected_text"][n]
+        if threshold: part["similarity_threshold"] = float(threshold)
+        for field in ["train_file", "test_file", "student_file", "placeholder_filename", "solution_file"]:
+            if optional[field][n]: part[field] = optional[field][n]
+        if key_columns: part["key_columns"] = [k.strip() for k in key_columns.split("|")]
+        parts.append(part)
+
+    groups = pd.Series(parts, index=df.index, dtype=object).groupby(df["id"])
+    firsts = df.drop_duplicates("id").set_index("id")
+    tasks = []
+    for qid, question_parts in groups.agg(list).items():
+        task = {"id": qid, "title": firsts.at[qid, "title"], "description": firsts.at[qid, "description"]}
+        question_parts = [p for p in question_parts if p is not None]
+        if question_parts:
+            task["parts"] = question_parts
+        tasks.append(task)
+    return tasks
+
+
+def write_questions(tasks, output_file, ensure_ascii=False):
+    """Writes a parsed question list in one atomic write."""
+    write_json(output_file, tasks, indent=2, ensure_ascii=ensure_ascii)
+    return len(tasks)
+
+
+# --- Checking a parsed bank ---
+
+def sheet_rows(df):
+    """Maps each question id to the spreadsheet row it starts on (row 1 is the header)."""
+    column = "id" if "id" in df.columns else "S.No" if "S.No" in df.columns else None
+    if column is None:
+        return {}
+    ids = _text(df, column)
+    first = ~ids.duplicated()
+    return {qid: int(position) + 2 for qid, position in zip(ids[first], np.flatnonzero(first.to_numpy()))}
+
+
+def referenced_paths(question):
+    """(field, path) for every dataset and solution file a parsed question points at."""
+    references = [(f"datasets.{key}", path) for key, path in (question.get("datasets") or {}).items() if path]
+    for part in question.get("parts") or []:
+        for field in _PATH_PART_FIELDS:
+            value = part.get(field)
+            for path in value if isinstance(value, list) else [value]:
+                if path:
+                    references.append((f"parts[{part.get('part_id')}].{field}", path))
+    return references
+
+
+def is_validated(question):
+    """
+    Whether a stored question counts as validated: a multi-part question when every one
+    of its parts is, any other question by its own isValidated flag.
+    """
+    parts = question.get("parts")
+    if parts:
+        return all(part.get("isValidated") is True for part in parts)
+    return question.get("isValidated") is True
+
+
+def _path_exists(path):
+    return resolve_data_path(path).exists() or (BASE_DATA_PATH / "datasets" / path).exists()
+
+
+def find_missing_paths(questions, rows=None, progress=None):
+    """
+    Checks every referenced file on a thread pool (each distinct path once) and returns
+    one error per missing reference: {"row", "questionId", "field", "path", "error"}.
+    progress(checked, total) is called as the checks complete.
+    """
+    rows = rows or {}
+    references = [(question.get("id"), field, str(path))
+                  for question in questions for field, path in referenced_paths(question)]
+    unique_paths = list(dict.fromkeys(path for _qid, _field, path in references))
+    exists = {}
+    with ThreadPoolExecutor(max_workers=PATH_CHECK_WORKERS) as pool:
+        for checked, (path, found) in enumerate(zip(unique_paths, pool.map(_path_exists, unique_paths)), 1):
+            exists[path] = found
+            if progress and (checked % 100 == 0 or checked == len(unique_paths)):
+                progress(checked, len(unique_paths))
+    return [
+        {"row": rows.get(qid), "questionId": qid, "field": field, "path": path, "error": "File not found"}
+        for qid, field, path in references if not exists[path]
+    ]
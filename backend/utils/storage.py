@@ -0,0 +1,198 @@
+# backend/utils/storage.py
+"""
+Shared helpers for every JSON file under backend/data (users.json, course_config.json,
+questions.json, submissions, ...).
+
+- Writers take an exclusive lock on a sidecar "<file>.lock", so two requests can never
+  interleave a read-modify-write on the same file (threads and processes alike).
+- Every write goes to a temp file in the same directory and is swapped in with
+  os.replace(), so a reader only ever sees the old or the new complete file.
+- Readers do not lock at all: they just open whatever file is currently in place,
+  which means a slow reader never holds up a writer.
+- Indexes derived from a file (e.g. utils/question_counts.py) register a write hook,
+  which runs after each write while the writer lock is still held, so the index is
+  updated in the same order as the writes themselves.
+"""
+import copy
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils.metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+# Mode of files written for the first time (mkstemp's 0600 would hide them from other users).
+NEW_FILE_MODE = 0o644
+_MISSING = object()
+
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+_write_hooks = []  # hook(path, data), called after every write under the writer lock
+
+
+def add_write_hook(hook):
+    """Registers hook(path, data) to run after every write, while `path` is still locked."""
+    if hook not in _write_hooks:
+        _write_hooks.append(hook)
+
+
+def _run_write_hooks(path, data):
+    for hook in _write_hooks:
+        try:
+            hook(Path(path), data)
+        except Exception as e:
+            # The write itself succeeded; a derived index can be rebuilt from the file.
+            print(f"Warning: Write hook {getattr(hook, '__name__', hook)} failed for {path}: {e}")
+
+
+def _thread_lock_for(path):
+    key = str(Path(path).resolve())
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.RLock()
+        return lock
+
+
+@contextmanager
+def locked(path):
+    """Holds the exclusive writer lock for `path` (in-process and, where available, flock)."""
+    path = Path(path)
+    thread_lock = _thread_lock_for(path)
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = path.with_name(path.name + ".lock")
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _dumps(data, indent, ensure_ascii):
+    return json.dumps(data, indent=indent, ensure_ascii=ensure_ascii)
+
+
+def _file_mode(path):
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        return NEW_FILE_MODE
+
+
+@timed("json_write")
+def _atomic_write_text(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file 0600; keep the replaced file's mode instead.
+        os.fchmod(fd, _file_mode(path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def read_json(path, default=_MISSING):
+    """
+    Reads a JSON file without taking any lock.
+
+    A missing or empty file returns a copy of `default` when one is given and raises
+    FileNotFoundError otherwise. Malformed JSON always raises json.JSONDecodeError.
+    """
+    text = _read_text(path)
+    if text is None or not text.strip():
+        if default is _MISSING:
+            raise FileNotFoundError(str(path))
+        return copy.deepcopy(default)
+    return json.loads(text)
+
+
+def file_signature(path):
+    """
+    (inode, size, mtime_ns) of a data file, or None if it is missing. Every write replaces
+    the file (os.replace), so a changed signature means changed content; caches derived
+    from a file use it to notice writes made by any worker.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def write_json(path, data, indent=2, ensure_ascii=True):
+    """Atomically replaces `path` with `data` while holding the writer lock."""
+    text = _dumps(data, indent, ensure_ascii)
+    with locked(path):
+        _atomic_write_text(path, text)
+        _run_write_hooks(path, data)
+
+
+class JsonDocument:
+    """The value handed out by update_json(). Mutate `.data` in place or assign a new value."""
+
+    def __init__(self, data):
+        self.data = data
+
+
+@contextmanager
+def update_json(path, default=_MISSING, indent=2, ensure_ascii=True, reset_invalid=False):
+    """
+    Read-copy-update of a JSON file under the writer lock.
+
+        with update_json(USERS_FILE_PATH, default={"users": []}) as doc:
+            doc.data["users"].append(new_user)
+
+    The new content is written atomically when the block exits normally. Nothing is
+    written if the block raises or leaves the data unchanged, so early `return`s for
+    404/409 responses are safe. With `reset_invalid=True` a malformed file is treated
+    like a missing one instead of raising.
+    """
+    with locked(path):
+        original_text = _read_text(path)
+        if original_text is None or not original_text.strip():
+            if default is _MISSING:
+                raise FileNotFoundError(str(path))
+            data = copy.deepcopy(default)
+        else:
+            try:
+                data = json.loads(original_text)
+            except json.JSONDecodeError:
+                if not reset_invalid or default is _MISSING:
+                    raise
+                data = copy.deepcopy(default)
+
+        doc = JsonDocument(data)
+        yield doc
+
+        new_text = _dumps(doc.data, indent, ensure_ascii)
+        if new_text != original_text:
+            _atomic_write_text(path, new_text)
+            _run_write_hooks(path, doc.data)
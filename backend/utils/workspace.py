@@ -0,0 +1,226 @@
+# backend/utils/workspace.py
+"""
+Per-student working directories (data/user_generated/<username>): disk quotas,
+garbage collection and usage reporting.
+
+- enforce_quota() runs before student code executes. A student over the quota first
+  gets their directory garbage-collected; if that isn't enough the run is refused.
+- collect_garbage() deletes files older than the TTL, except files whose name is
+  referenced by a question (placeholder_filename / solution_file), since those are
+  the outputs the graders read. Links to shared datasets are never touched.
+- A background thread runs the GC over every student directory periodically.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from utils.storage import read_json
+
+BASE_DATA_PATH = Path(__file__).resolve().parent.parent / "data"
+USER_GENERATED_PATH = BASE_DATA_PATH / "user_generated"
+QUESTIONS_BASE_PATH = BASE_DATA_PATH / "questions"
+
+WORKSPACE_QUOTA_BYTES = int(float(os.environ.get("WORKSPACE_QUOTA_MB", "500")) * 1024 * 1024)
+WORKSPACE_TTL_SECONDS = float(os.environ.get("WORKSPACE_TTL_HOURS", "72")) * 3600
+WORKSPACE_GC_INTERVAL_SECONDS = float(os.environ.get("WORKSPACE_GC_INTERVAL_MINUTES", "60")) * 60
+# Usage is re-measured at most this often per directory, not on every run.
+USAGE_CACHE_SECONDS = 15
+
+_usage_cache = {}
+_usage_cache_lock = threading.Lock()
+_gc_thread = None
+_gc_thread_lock = threading.Lock()
+
+
+# --- Measuring ---
+
+def _walk_files(directory):
+    """Yields (path, stat) for regular files below directory, without following symlinks."""
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_symlink():
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+
+def directory_usage(directory):
+    """Returns (total_bytes, file_count) for a directory; shared-dataset links count as 0."""
+    total, count = 0, 0
+    for _path, stat in _walk_files(directory):
+        total += stat.st_size
+        count += 1
+    return total, count
+
+
+def _cached_usage(directory):
+    key = str(directory)
+    now = time.monotonic()
+    with _usage_cache_lock:
+        cached = _usage_cache.get(key)
+        if cached and now - cached[0] < USAGE_CACHE_SECONDS:
+            return cached[1]
+    usage, _count = directory_usage(directory)
+    with _usage_cache_lock:
+        _usage_cache[key] = (now, usage)
+    return usage
+
+
+def _forget_usage(directory):
+    with _usage_cache_lock:
+        _usage_cache.pop(str(directory), None)
+
+
+# --- Garbage collection ---
+
+def referenced_filenames():
+    """File names graders read from student directories, collected from every question."""
+    names = set()
+    for questions_file in QUESTIONS_BASE_PATH.glob("*/level*/questions.json"):
+        try:
+            questions = read_json(questions_file, default=[])
+        except json.JSONDecodeError:
+            continue
+        for question in questions if isinstance(questions, list) else []:
+            for part in [question] + list(question.get('parts') or []):
+                if not isinstance(part, dict):
+                    continue
+                if part.get('placeholder_filename'):
+                    names.add(str(part['placeholder_filename']))
+                solution_files = part.get('solution_file') or []
+                if isinstance(solution_files, str):
+                    solution_files = [solution_files]
+                names.update(os.path.basename(str(f)) for f in solution_files)
+    return names
+
+
+def collect_garbage(student_dir, ttl_seconds=WORKSPACE_TTL_SECONDS, keep_names=None):
+    """
+    Deletes files in one student directory not modified for ttl_seconds, except files
+    named in keep_names (defaults to referenced_filenames()). Empty folders are removed.
+    Returns {"deleted_files", "freed_bytes"}.
+    """
+    student_dir = Path(student_dir)
+    if keep_names is None:
+        keep_names = referenced_filenames()
+    cutoff = time.time() - ttl_seconds
+    deleted, freed = 0, 0
+    for path, stat in list(_walk_files(student_dir)):
+        if os.path.basename(path) in keep_names or stat.st_mtime > cutoff:
+            continue
+        try:
+            os.remove(path)
+            deleted += 1
+            freed += stat.st_size
+        except OSError as e:
+            print(f"Warning: Could not delete {path}: {e}")
+    # Remove folders left empty, deepest first (never the student directory itself).
+    for root, dirs, _files in os.walk(student_dir, topdown=False):
+        for name in dirs:
+            folder = os.path.join(root, name)
+            if not os.path.islink(folder):
+                try:
+                    os.rmdir(folder)
+                except OSError:
+                    pass
+    _forget_usage(student_dir)
+    return {"deleted_files": deleted, "freed_bytes": freed}
+
+
+def collect_all_garbage(ttl_seconds=WORKSPACE_TTL_SECONDS, usernames=None):
+    """Runs collect_garbage() over every (or the given) student directory."""
+    keep_names = referenced_filenames()
+    summary = {"directories": 0, "deleted_files": 0, "freed_bytes": 0}
+    if not USER_GENERATED_PATH.exists():
+        return summary
+    for student_dir in USER_GENERATED_PATH.iterdir():
+        if not student_dir.is_dir() or (usernames and student_dir.name not in usernames):
+            continue
+        result = collect_garbage(student_dir, ttl_seconds, keep_names)
+        summary["directories"] += 1
+        summary["deleted_files"] += result["deleted_files"]
+        summary["freed_bytes"] += result["freed_bytes"]
+    return summary
+
+
+def _gc_loop():
+    while True:
+        time.sleep(WORKSPACE_GC_INTERVAL_SECONDS)
+        try:
+            summary = collect_all_garbage()
+            print(f"[WORKSPACE GC] Deleted {summary['deleted_files']} files, "
+                  f"freed {summary['freed_bytes'] / (1024 * 1024):.1f} MB")
+        except Exception as e:
+            print(f"Error during workspace garbage collection: {e}")
+
+
+def start_periodic_gc():
+    """Starts the background GC thread once per process."""
+    global _gc_thread
+    with _gc_thread_lock:
+        if _gc_thread is None and WORKSPACE_GC_INTERVAL_SECONDS > 0:
+            _gc_thread = threading.Thread(target=_gc_loop, name="workspace-gc", daemon=True)
+            _gc_thread.start()
+
+
+# --- Quota ---
+
+def enforce_quota(student_dir):
+    """
+    Called before executing student code in student_dir. Returns None if the run may go
+    ahead, or an error message for the student if the directory is over quota even
+    after garbage collection.
+    """
+    if WORKSPACE_QUOTA_BYTES <= 0:
+        return None
+    usage = _cached_usage(student_dir)
+    if usage <= WORKSPACE_QUOTA_BYTES:
+        return None
+    collect_garbage(student_dir)
+    usage = _cached_usage(student_dir)
+    if usage <= WORKSPACE_QUOTA_BYTES:
+        return None
+    return (f"Workspace quota exceeded: your files use {usage / (1024 * 1024):.0f} MB of the "
+            f"{WORKSPACE_QUOTA_BYTES / (1024 * 1024):.0f} MB allowed. Delete files you no longer need "
+            f"(e.g. downloaded datasets or temporary chunks) and run again.")
+
+
+def usage_report():
+    """Per-student disk usage, largest first, for the admin dashboard."""
+    students = []
+    if USER_GENERATED_PATH.exists():
+        for student_dir in USER_GENERATED_PATH.iterdir():
+            if not student_dir.is_dir():
+                continue
+            total, count, newest = 0, 0, None
+            for _path, stat in _walk_files(student_dir):
+                total += stat.st_size
+                count += 1
+                newest = stat.st_mtime if newest is None else max(newest, stat.st_mtime)
+            students.append({
+                "username": student_dir.name,
+                "bytes": total,
+                "files": count,
+                "lastModified": newest,
+                "overQuota": WORKSPACE_QUOTA_BYTES > 0 and total > WORKSPACE_QUOTA_BYTES,
+            })
+    students.sort(key=lambda s: s["bytes"], reverse=True)
+    return {
+        "quotaBytes": WORKSPACE_QUOTA_BYTES,
+        "ttlHours": WORKSPACE_TTL_SECONDS / 3600,
+        "totalBytes": sum(s["bytes"] for s in students),
+        "students": students,
+    }
@@ -1,8 +1,10 @@
 // frontend/src/components/PerformanceReportModal/PerformanceReportModal.jsx
 
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import Editor from '@monaco-editor/react';
 
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
+
 // --- NEW, GRANULAR THRESHOLDS ---
 // We now have a 'default' for each subject, and can override for specific question IDs.
 const PERFORMANCE_THRESHOLDS = {
@@ -85,6 +87,38 @@ const getLabelStyle = (label) => {
 
 // --- UPDATED MODAL COMPONENT ---
 const PerformanceReportModal = ({ report, onConfirm, subject }) => {
+  const [performance, setPerformance] = useState([]);
+  const [isMeasuring, setIsMeasuring] = useState(false);
+
+  // Metrics are measured after the submission is acknowledged; poll until they are ready.
+  useEffect(() => {
+    if (!report) return;
+    setPerformance(report.performance || []);
+    if (!report.statusUrl || (report.performance && report.performance.length > 0)) return;
+
+    let cancelled = false;
+    setIsMeasuring(true);
+    const poll = async () => {
+      while (!cancelled) {
+        try {
+          const res = await fetch(`${API_BASE_URL}${report.statusUrl}`);
+          const data = await res.json();
+          if (!res.ok || data.status === 'completed' || data.status === 'failed') {
+            if (!cancelled) setPerformance(data.performance_metrics || []);
+            break;
+          }
+        } catch (error) {
+          console.error("Failed to fetch performance report:", error);
+          break;
+        }
+        await new Promise((resolve) => setTimeout(resolve, 1500));
+      }
+      if (!cancelled) setIsMeasuring(false);
+    };
+    poll();
+    return () => { cancelled = true; };
+  }, [report]);
+
   if (!report) return null;
 
   const normalizedSubject = subject?.replace(/\s+/g, '').toLowerCase();
@@ -94,12 +128,13 @@ const PerformanceReportModal = ({ report, onConfirm, subject }) => {
       <div className="bg-white rounded-lg shadow-xl p-6 max-w-4xl w-full text-left flex flex-col max-h-[90vh]">
         <h2 className="text-2xl font-bold text-gray-800 mb-4">Exam Performance Report</h2>
         <p className="text-gray-600 mb-6">Here is a summary of your final code and its performance on a sample test case.</p>
+        {isMeasuring && <p className="text-sm text-blue-600 mb-4">Measuring performance of your submission...</p>}
         
         <div className="flex-grow overflow-y-auto pr-2">
           
         {report.answers.map((answer, index) => {
             const isAttempted = answer.code && answer.code.trim() !== "";
-            const perf = report.performance.find(p => p.questionId === answer.questionId) || {};
+            const perf = performance.find(p => p.questionId === answer.questionId) || {};
             const timeMs = parseFloat(perf.execution_time_ms);
             const memoryKiB = parseFloat(perf.peak_memory_kib);
             const { timeLabel, memoryLabel } = getPerformanceLabels(normalizedSubject, answer.questionId, timeMs, memoryKiB);
@@ -7,6 +7,7 @@ import {
   Alert,
   Card,
   FileUploader,
+  uploadInChunks,
 } from "./SharedComponents";
 import ViewQuestions from "./ViewQuestions";
 import { useNavigate, useLocation } from "react-router-dom";
@@ -548,7 +549,8 @@ const isPartsBasedQuestion =
         formData.append("description", description);
 
         if (speechInputFile) {
-          formData.append("input_file", speechInputFile);
+          // Audio files can be large: send them in resumable chunks first.
+          formData.append("input_file_upload_id", await uploadInChunks(speechInputFile));
         }
 
         const partsData = [
@@ -623,8 +625,9 @@ const isPartsBasedQuestion =
         formData.append("page_link_that_need_to_be_scrapped", pageLink);
 
         if (showDatasetUploads) {
-          if (trainFile) formData.append("train_file", trainFile);
-          if (testFile) formData.append("test_file", testFile);
+          // Datasets can be large: send them in resumable chunks first.
+          if (trainFile) formData.append("train_file_upload_id", await uploadInChunks(trainFile));
+          if (testFile) formData.append("test_file_upload_id", await uploadInChunks(testFile));
         }
 
         const partsData = parts.map((part, index) => {
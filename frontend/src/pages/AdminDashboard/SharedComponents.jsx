@@ -323,6 +323,61 @@ export const Card = ({ title, children, className = "" }) => {
   );
 };
 
+// Sends a large file to /api/admin/uploads in chunks (each with its SHA-256 when the
+// browser supports it), retrying failed chunks and resuming from the chunks the server
+// already has. Resolves to the upload ID that the add-question routes accept as
+// "<field>_upload_id".
+const CHUNK_UPLOAD_RETRIES = 3;
+
+const sha256Hex = async (blob) => {
+  if (!window.crypto?.subtle) return null;
+  const digest = await window.crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map((b) => b.toString(16).padStart(2, "0"))
+    .join("");
+};
+
+export const uploadInChunks = async (file, onProgress) => {
+  const res = await fetch(`${API_BASE_URL}/api/admin/uploads`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ filename: file.name, size: file.size }),
+  });
+  const upload = await res.json();
+  if (!res.ok) throw new Error(upload.message);
+
+  let missing = upload.missingChunks;
+  for (let attempt = 0; missing.length > 0; attempt++) {
+    if (attempt > CHUNK_UPLOAD_RETRIES) {
+      throw new Error(`Upload of ${file.name} failed after ${CHUNK_UPLOAD_RETRIES} retries.`);
+    }
+    for (const index of missing) {
+      const chunk = file.slice(index * upload.chunkSize, (index + 1) * upload.chunkSize);
+      const checksum = await sha256Hex(chunk);
+      try {
+        const chunkRes = await fetch(`${API_BASE_URL}/api/admin/uploads/${upload.uploadId}/chunks/${index}`, {
+          method: "PUT",
+          headers: checksum ? { "X-Chunk-SHA256": checksum } : {},
+          body: chunk,
+        });
+        const status = await chunkRes.json();
+        if (chunkRes.ok && onProgress) onProgress(status.receivedChunks / status.totalChunks);
+      } catch (error) {
+        // Network hiccup: the chunk is picked up again below.
+      }
+    }
+    const statusRes = await fetch(`${API_BASE_URL}/api/admin/uploads/${upload.uploadId}`);
+    const status = await statusRes.json();
+    if (!statusRes.ok) throw new Error(status.message);
+    missing = status.missingChunks;
+  }
+
+  const finishRes = await fetch(`${API_BASE_URL}/api/admin/uploads/${upload.uploadId}/finish`, { method: "POST" });
+  const finished = await finishRes.json();
+  if (!finishRes.ok) throw new Error(finished.message);
+  return upload.uploadId;
+};
+
 export const FileUploader = ({
   title,
   endpoint,
@@ -358,8 +413,24 @@ export const FileUploader = ({
         method: "POST",
         body: formData,
       });
-      const data = await res.json();
+      let data = await res.json();
       if (!res.ok) throw new Error(data.message);
+      // Long imports run as a background job: poll it until it finishes.
+      if (res.status === 202 && data.statusUrl) {
+        setMessage({ type: "success", text: data.message });
+        while (true) {
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          const jobRes = await fetch(`${API_BASE_URL}${data.statusUrl}`);
+          const job = await jobRes.json();
+          if (!jobRes.ok) throw new Error(job.message);
+          if (job.status === "failed") throw new Error(job.message);
+          if (job.status === "completed") {
+            data = job;
+            break;
+          }
+          setMessage({ type: "success", text: job.message });
+        }
+      }
       setMessage({ type: "success", text: data.message });
       if (onUploadComplete) onUploadComplete();
     } catch (error) {
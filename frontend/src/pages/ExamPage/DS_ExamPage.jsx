@@ -588,7 +588,8 @@ const DS_ExamPage = () => {
       
       setPerformanceReport({
         answers: answers,
-        performance: data.performance_metrics || []
+        performance: data.performance_metrics || [],
+        statusUrl: data.statusUrl
       });
 
     } catch (error) {
@@ -580,6 +580,7 @@ const DeepLearning_ExamPage = () => {
       setPerformanceReport({
         answers: answers,
         performance: data.performance_metrics || [],
+        statusUrl: data.statusUrl,
       });
     } catch (error) {
       console.error("Submission error:", error);
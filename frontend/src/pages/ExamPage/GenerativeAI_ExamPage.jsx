@@ -376,7 +376,8 @@ const GenerativeAI_ExamPage = () => {
       
       setPerformanceReport({
         answers: answers,
-        performance: data.performance_metrics || []
+        performance: data.performance_metrics || [],
+        statusUrl: data.statusUrl
       });
 
     } catch (error) {
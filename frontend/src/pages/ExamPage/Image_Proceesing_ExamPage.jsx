@@ -228,7 +228,8 @@ const Image_Proceesing_ExamPage = () => {
       }
       setPerformanceReport({
         answers: answers,
-        performance: data.performance_metrics || []
+        performance: data.performance_metrics || [],
+        statusUrl: data.statusUrl
       });
 
     } catch (error) {
@@ -321,7 +322,8 @@ const Image_Proceesing_ExamPage = () => {
             const firstQuestion = data[0];
             const imagePath = firstQuestion.datasets?.input_image;
             if (imagePath) {
-                const imageUrl = `${API_BASE_URL}/api/media?path=${encodeURIComponent(imagePath)}`;
+                // w=640: a preview-sized WebP/JPEG instead of the full-resolution file
+                const imageUrl = `${API_BASE_URL}/api/media?path=${encodeURIComponent(imagePath)}&w=640`;
                 setInputImageUrl(imageUrl);
             }
         }
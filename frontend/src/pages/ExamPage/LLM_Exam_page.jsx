@@ -178,7 +178,7 @@ const LLM_ExamPage = () => {
       if (!response.ok) throw new Error(`Server responded with status: ${response.status}`);
       const data = await response.json();
       if (data.updatedUser) { updateUserSession(data.updatedUser); }
-      setPerformanceReport({ answers: answers, performance: data.performance_metrics || [] });
+      setPerformanceReport({ answers: answers, performance: data.performance_metrics || [], statusUrl: data.statusUrl });
     } catch (error) {
       console.error("Submission error:", error);
       setSubmissionResult(`An error occurred during final submission: ${error.message}`);
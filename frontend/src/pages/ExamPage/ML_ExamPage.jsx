@@ -671,6 +671,7 @@ const ML_ExamPage = () => {
       setPerformanceReport({
         answers: answers,
         performance: data.performance_metrics || [],
+        statusUrl: data.statusUrl,
       });
     } catch (error) {
       console.error("Submission error:", error);
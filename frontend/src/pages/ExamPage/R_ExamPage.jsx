@@ -580,7 +580,8 @@ const R_ExamPage = () => {
       
       setPerformanceReport({
         answers: answers,
-        performance: data.performance_metrics || []
+        performance: data.performance_metrics || [],
+        statusUrl: data.statusUrl
       });
 
     } catch (error) {
@@ -365,7 +365,8 @@ const SpeechRecognition_ExamPage = () => {
     // Store the full report from the backend to show in the modal
     setPerformanceReport({
       answers: answers,
-      performance: data.performance_metrics || []
+      performance: data.performance_metrics || [],
+      statusUrl: data.statusUrl
     });
 
   } catch (error) {